@@ -0,0 +1,322 @@
+import streamlit as st
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import perf
+import utils
+
+# ================= DETECÇÃO DE ANOMALIAS (TAXA DE MALHA) ==================
+# Também a auditoria do sorteio da portaria (final do arquivo).
+# Para cada transportadora × operação o motor guarda média e variância móveis (Welford com peso
+# exponencial) da taxa diária de malha e a taxa esperada pelo volume (malha/total ponderados).
+# Cada dia novo é comparado com o estado ANTES de entrar nele e só então atualiza o estado.
+# Há um motor por versão dos dados, compartilhado entre as sessões. Os caminhos de gravação avisam o
+# motor (advance_engine): a versão nova parte de uma cópia do motor anterior e recebe só as linhas
+# acrescentadas; edições de dados antigos pedem um motor novo, montado do zero na primeira leitura.
+# Um dia é anômalo quando o desvio é grande em relação à variação habitual (z-score) E improvável
+# para o volume do dia (teste binomial exato), o que descarta dias de poucos veículos.
+MEIA_VIDA_DIAS = 30   # Peso de um dia cai pela metade após 30 dias de observações do grupo
+MIN_HISTORICO = 10    # Dias observados antes de o grupo poder gerar alertas
+ANOMALY_SHARED = 4    # Motores mantidos por processo (por versão dos dados)
+Z_LIMITE = 3.0
+ALPHA = 0.01          # Nível do teste binomial (unilateral, no sentido do desvio)
+GRUPOS = ['TRANSPORTADORA', 'OPERAÇÃO']
+COLUNAS_ANOMALIA = ['DATA', 'TRANSPORTADORA', 'OPERAÇÃO', 'MALHA', 'TOTAL', 'TAXA', 'TAXA_ESPERADA', 'Z', 'P_VALOR', 'DIRECAO']
+
+# --- BINOMIAL EXATA (SEM SCIPY) ---
+_log_fatorial = np.zeros(1)
+
+def _log_factorials(n):
+    """log(k!) para k = 0..n, por soma acumulada de logs (tabela ampliada sob demanda)."""
+    global _log_fatorial
+    if len(_log_fatorial) <= n:
+        _log_fatorial = np.concatenate([[0.0], np.cumsum(np.log(np.arange(1, 2 * n + 2, dtype="float64")))])
+    return _log_fatorial[:n + 1]
+
+def binomial_pmf(n, p):
+    """P(X = k), k = 0..n, para X ~ Binomial(n, p)."""
+    n = int(n)
+    k = np.arange(n + 1)
+    if p <= 0 or p >= 1:
+        return (k == (0 if p <= 0 else n)).astype("float64")
+    lf = _log_factorials(n)
+    return np.exp(lf[n] - lf[k] - lf[n - k] + k * np.log(p) + (n - k) * np.log1p(-p))
+
+def binomial_tail(k, n, p, upper=True):
+    """P(X >= k) (upper) ou P(X <= k) para X ~ Binomial(n, p)."""
+    pmf = binomial_pmf(n, p)
+    k = int(k)
+    return float(min(1.0, pmf[k:].sum() if upper else pmf[:k + 1].sum()))
+
+# --- MOTOR INCREMENTAL ---
+class AnomalyEngine:
+    """Estado móvel por grupo + lista de dias anômalos. Atualizado só com os dias novos de cada versão."""
+
+    def __init__(self, meia_vida=MEIA_VIDA_DIAS):
+        self.alpha = 1 - 0.5 ** (1 / meia_vida)
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.grupos = {}                    # (transportadora, operação) -> posição nos vetores de estado
+        self.n = np.zeros(0)                # dias observados
+        self.media = np.zeros(0)            # média móvel da taxa diária
+        self.var = np.zeros(0)              # variância móvel da taxa diária
+        self.malha = np.zeros(0)            # malha e total ponderados (taxa esperada pelo volume)
+        self.total = np.zeros(0)
+        self.ultima_data = None             # último dia já processado
+        self.ultimo_dia = None              # totais do último dia por grupo (linhas novas do mesmo dia o refazem)
+        self.antes_ultimo = None            # estado e nº de anomalias antes do último dia
+        self.anomalias = []
+
+    def copy(self):
+        """Cópia independente (o motor de uma versão compartilhada nunca é alterado)."""
+        with self._lock:
+            novo = AnomalyEngine.__new__(AnomalyEngine)
+            novo.__dict__.update(self.__dict__)
+            novo._lock = threading.Lock()
+            novo.grupos = dict(self.grupos)
+            novo.n, novo.media, novo.var, novo.malha, novo.total = (
+                v.copy() for v in (self.n, self.media, self.var, self.malha, self.total))
+            novo.anomalias = list(self.anomalias)
+        return novo
+
+    def _posicoes(self, chaves):
+        for chave in chaves:
+            if chave not in self.grupos:
+                self.grupos[chave] = len(self.grupos)
+        faltam = len(self.grupos) - len(self.n)
+        if faltam:
+            self.n, self.media, self.var, self.malha, self.total = (
+                np.concatenate([v, np.zeros(faltam)]) for v in (self.n, self.media, self.var, self.malha, self.total))
+        return np.array([self.grupos[c] for c in chaves], dtype=int)
+
+    def observe(self, novos):
+        """
+        Incorpora linhas NOVAS (num motor vazio, a base inteira); as já incorporadas não são relidas.
+        Dias posteriores ao último visto seguem do estado atual; linhas do próprio último dia refazem só
+        esse dia. Linhas de um dia anterior mudam o histórico: devolve False sem alterar o motor
+        (monte um motor novo com a base inteira). Caso contrário, devolve True.
+        """
+        if novos is None or novos.empty or 'DATA' not in novos.columns:
+            return True
+        with self._lock, perf.trace("anomalias.observe"):
+            diario = self._daily(novos)
+            if diario.empty:
+                return True
+            primeiro = diario.index.get_level_values(0)[0]
+            if self.ultima_data is not None and primeiro < self.ultima_data:
+                return False
+            if self.ultima_data is not None and primeiro == self.ultima_data:
+                # Volta ao estado anterior ao último dia e o processa de novo com as linhas recebidas
+                vetores, quantas = self.antes_ultimo
+                self.n, self.media, self.var, self.malha, self.total = (v.copy() for v in vetores)
+                del self.anomalias[quantas:]
+                diario = pd.concat([self.ultimo_dia, diario]).groupby(level=list(range(len(GRUPOS) + 1))).sum()
+            self._update(diario)
+        return True
+
+    @staticmethod
+    def _daily(linhas):
+        """Malha e total por dia × grupo (ordenados por dia), incluindo os de total zero."""
+        linhas = linhas.dropna(subset=['DATA'])
+        liberados = pd.to_numeric(linhas['LIBERADOS'], errors='coerce').fillna(0)
+        malha = pd.to_numeric(linhas['MALHA'], errors='coerce').fillna(0)
+        return (pd.DataFrame({'MALHA': malha, 'TOTAL': liberados + malha})
+                .groupby([linhas['DATA'].dt.normalize(), *(linhas[c].astype(str).str.strip() for c in GRUPOS)])
+                .sum())
+
+    def _update(self, diario):
+        # O último dia é processado por último, depois de guardar o estado (e os totais, antes do filtro de
+        # total zero: uma linha nova do mesmo dia pode torná-lo positivo)
+        dias = diario.index.get_level_values(0)
+        self.ultima_data = dias[-1]
+        ultimo = dias == self.ultima_data
+        self.ultimo_dia = diario[ultimo]
+        self._process(diario[~ultimo])
+        self.antes_ultimo = (tuple(v.copy() for v in (self.n, self.media, self.var, self.malha, self.total)), len(self.anomalias))
+        self._process(self.ultimo_dia)
+
+    def _process(self, diario):
+        diario = diario[diario['TOTAL'] > 0]
+        if diario.empty:
+            return
+        a = self.alpha
+        # Vetores ordenados por dia; cada dia é um trecho contíguo [inicio, fim)
+        dias = diario.index.get_level_values(0)
+        chaves = list(zip(*(diario.index.get_level_values(i) for i in range(1, len(GRUPOS) + 1))))
+        posicoes = self._posicoes(chaves)
+        malha_dia, total_dia = diario['MALHA'].to_numpy(dtype="float64"), diario['TOTAL'].to_numpy(dtype="float64")
+        cortes = np.flatnonzero(np.r_[True, dias[1:] != dias[:-1], True])
+        for inicio, fim in zip(cortes[:-1], cortes[1:]):
+            pos, k, n = posicoes[inicio:fim], malha_dia[inicio:fim], total_dia[inicio:fim]
+            taxa = k / n
+            media, var, contagem = self.media[pos], self.var[pos], self.n[pos]
+            esperada = np.where(self.total[pos] > 0, self.malha[pos] / np.maximum(self.total[pos], 1e-12), taxa)
+            z = np.where(var > 0, (taxa - media) / np.sqrt(np.maximum(var, 1e-12)), 0.0)
+            for i in np.flatnonzero((contagem >= MIN_HISTORICO) & (np.abs(z) >= Z_LIMITE)):
+                alta = taxa[i] > esperada[i]
+                p_valor = binomial_tail(k[i], n[i], esperada[i], upper=alta)
+                if p_valor < ALPHA:
+                    transportadora, operacao = chaves[inicio + i]
+                    self.anomalias.append((dias[inicio], transportadora, operacao, int(k[i]), int(n[i]), taxa[i] * 100,
+                                           esperada[i] * 100, z[i], p_valor, "alta" if alta else "baixa"))
+            # Welford com peso exponencial (no primeiro dia do grupo, o estado parte do próprio valor)
+            primeiro = contagem == 0
+            diff = taxa - media
+            incremento = a * diff
+            self.media[pos] = np.where(primeiro, taxa, media + incremento)
+            self.var[pos] = np.where(primeiro, 0.0, (1 - a) * (var + diff * incremento))
+            self.malha[pos] = np.where(primeiro, k, (1 - a) * self.malha[pos] + k)
+            self.total[pos] = np.where(primeiro, n, (1 - a) * self.total[pos] + n)
+            self.n[pos] = contagem + 1
+
+    def frame(self, start=None, end=None, transportadoras=None, operacoes=None):
+        """Dias anômalos (mais recentes primeiro), opcionalmente filtrados por período e grupos."""
+        with self._lock:
+            df = pd.DataFrame(self.anomalias, columns=COLUNAS_ANOMALIA)
+        if start is not None:
+            df = df[df['DATA'] >= pd.to_datetime(start)]
+        if end is not None:
+            df = df[df['DATA'] <= pd.to_datetime(end)]
+        if transportadoras is not None:
+            df = df[df['TRANSPORTADORA'].isin(list(map(str, transportadoras)))]
+        if operacoes is not None:
+            df = df[df['OPERAÇÃO'].isin(list(map(str, operacoes)))]
+        return df.sort_values('DATA', ascending=False, kind='mergesort').reset_index(drop=True)
+
+@st.cache_resource
+def _shared_engines():
+    return OrderedDict()
+
+def _remember(data_version, motor):
+    compartilhados = _shared_engines()
+    compartilhados[data_version] = motor
+    compartilhados.move_to_end(data_version)
+    while len(compartilhados) > ANOMALY_SHARED:
+        compartilhados.popitem(last=False)
+    return motor
+
+def get_engine(df, data_version):
+    """
+    Motor de df, compartilhado entre as sessões. Só é montado com a base inteira quando não há motor
+    para a versão (primeira leitura, edição de dados antigos, arquivo carregado e não salvo).
+    """
+    motor = _shared_engines().get(data_version)
+    if motor is None:
+        motor = AnomalyEngine()
+        motor.observe(df)
+    return _remember(data_version, motor)
+
+def advance_engine(old_version, new_version, novos=None):
+    """
+    Chamada pelos caminhos de gravação. novos: só as linhas acrescentadas (limpas como a base); o motor da
+    versão nova é uma cópia do anterior que processa apenas elas. novos=None sinaliza edição de dados
+    antigos (editor, importação com atualização ou substituição): nada é guardado e get_engine monta o
+    motor da versão nova do zero. Devolve o motor da versão nova ou None.
+    """
+    compartilhados = _shared_engines()
+    if new_version in compartilhados:
+        return _remember(new_version, compartilhados[new_version])
+    anterior = compartilhados.get(old_version)
+    if novos is None or anterior is None:
+        return None
+    motor = anterior.copy()
+    if not motor.observe(novos):
+        return None   # Linhas de dias já processados: o histórico mudou
+    return _remember(new_version, motor)
+
+# ================= AUDITORIA DO SORTEIO (PORTARIA) ==================
+# Se o sorteio retém cada veículo com probabilidade p, os retidos de uma transportadora num período
+# seguem Binomial(veículos, p). Para cada transportadora × período (dia, semana ou mês) de todo o
+# histórico calcula-se o p-valor binomial exato e a banda de Monte Carlo da taxa, tudo em lote
+# (matrizes NumPy por blocos), uma vez por versão dos dados e probabilidade.
+SORTEIO_SIMULACOES = 2000
+SORTEIO_BANDA = (2.5, 97.5)       # Percentis da banda de Monte Carlo
+SORTEIO_LOTE = 4_000_000          # Células por bloco (linhas × valores possíveis de retidos)
+SORTEIO_SEMENTE = 0               # Bandas reprodutíveis (mesma entrada = mesma banda)
+
+def _blocks(n_ordenado, largura):
+    """Fatias [inicio, fim) de um vetor crescente de n tais que linhas × largura(n máximo) <= SORTEIO_LOTE."""
+    inicio, total = 0, len(n_ordenado)
+    while inicio < total:
+        fim = min(total, inicio + max(1, SORTEIO_LOTE // largura(n_ordenado[inicio])))
+        fim = min(fim, inicio + max(1, SORTEIO_LOTE // largura(n_ordenado[fim - 1])))
+        yield inicio, fim
+        inicio = fim
+
+def binomial_pvalues(k, n, p):
+    """
+    p-valores bilaterais exatos (2 × menor cauda, limitado a 1) de k retidos em n veículos sob
+    Binomial(n, p), para vetores k e n. Cada bloco monta a matriz de probabilidades até o maior n do bloco.
+    """
+    k = np.asarray(k, dtype="int64")
+    n = np.asarray(n, dtype="int64")
+    resultado = np.ones(len(n))
+    if len(n) == 0 or not 0 < p < 1:
+        return resultado
+    ordem = np.argsort(n, kind="stable")
+    n_ord, k_ord = n[ordem], k[ordem]
+    lf = _log_factorials(int(n_ord[-1]))
+    log_p, log_q = np.log(p), np.log1p(-p)
+    for inicio, fim in _blocks(n_ord, lambda m: int(m) + 1):
+        nn, kk = n_ord[inicio:fim, None], k_ord[inicio:fim, None]
+        j = np.arange(int(nn[-1, 0]) + 1)[None, :]
+        validos = j <= nn
+        resto = np.where(validos, nn - j, 0)
+        pmf = np.where(validos, np.exp(lf[nn] - lf[j] - lf[resto] + j * log_p + resto * log_q), 0.0)
+        superior = np.where(j >= kk, pmf, 0.0).sum(axis=1)
+        inferior = np.where(j <= kk, pmf, 0.0).sum(axis=1)
+        resultado[ordem[inicio:fim]] = np.minimum(1.0, 2 * np.minimum(superior, inferior))
+    return resultado
+
+def monte_carlo_band(n, p, simulacoes=SORTEIO_SIMULACOES, percentis=SORTEIO_BANDA, seed=SORTEIO_SEMENTE):
+    """Banda (inferior, superior) da taxa de retenção simulada para cada volume n (uma simulação por n distinto)."""
+    n = np.asarray(n, dtype="int64")
+    unicos, posicao = np.unique(n, return_inverse=True)
+    bandas = np.zeros((len(unicos), 2))
+    rng = np.random.default_rng(seed)
+    for inicio, fim in _blocks(unicos, lambda m: simulacoes):
+        volumes = np.maximum(unicos[inicio:fim, None], 1)
+        taxas = rng.binomial(volumes, p, size=(fim - inicio, simulacoes)) / volumes
+        bandas[inicio:fim] = np.percentile(taxas, percentis, axis=1).T
+    return bandas[posicao, 0], bandas[posicao, 1]
+
+def pooled_rate(df):
+    """Taxa de retenção de todo o histórico (MALHA / (LIBERADOS + MALHA))."""
+    malha = pd.to_numeric(df['MALHA'], errors='coerce').sum()
+    total = malha + pd.to_numeric(df['LIBERADOS'], errors='coerce').sum()
+    return float(malha / total) if total > 0 else 0.0
+
+@st.cache_data(max_entries=8, show_spinner=False)
+@perf.traced("anomalias.sorteio_audit")
+def sorteio_audit(_df, data_version, p, grain="D"):
+    """
+    Auditoria do sorteio com probabilidade p: (períodos, resumo).
+    períodos: uma linha por transportadora × período com taxa, banda de Monte Carlo e p-valor exato.
+    resumo: por transportadora, teste sobre o total e % de períodos acima/abaixo da banda.
+    """
+    base = _df.dropna(subset=['DATA']).copy()
+    for col in ('LIBERADOS', 'MALHA'):
+        base[col] = pd.to_numeric(base[col], errors='coerce').fillna(0)
+    periodos = utils.aggregate_by_grain(base, grain, ['LIBERADOS', 'MALHA'], ['TRANSPORTADORA'], 'DATA')
+    periodos['TOTAL'] = periodos['LIBERADOS'] + periodos['MALHA']
+    periodos = periodos[periodos['TOTAL'] > 0].reset_index(drop=True)
+    k, n = periodos['MALHA'].to_numpy(), periodos['TOTAL'].to_numpy()
+    periodos['TAXA'] = k / n * 100
+    inferior, superior = monte_carlo_band(n, p)
+    periodos['BANDA_INF'], periodos['BANDA_SUP'] = inferior * 100, superior * 100
+    periodos['P_VALOR'] = binomial_pvalues(k, n, p)
+    periodos['FORA'] = np.select([periodos['TAXA'] > periodos['BANDA_SUP'], periodos['TAXA'] < periodos['BANDA_INF']], ["acima", "abaixo"], "")
+
+    resumo = periodos.groupby('TRANSPORTADORA').agg(
+        PERIODOS=('TOTAL', 'size'), TOTAL=('TOTAL', 'sum'), MALHA=('MALHA', 'sum'),
+        ACIMA=('FORA', lambda f: (f == "acima").mean() * 100), ABAIXO=('FORA', lambda f: (f == "abaixo").mean() * 100),
+    ).reset_index()
+    resumo['TAXA'] = resumo['MALHA'] / resumo['TOTAL'] * 100
+    resumo['P_VALOR'] = binomial_pvalues(resumo['MALHA'], resumo['TOTAL'], p)
+    resumo['SITUACAO'] = np.select(
+        [(resumo['P_VALOR'] < ALPHA) & (resumo['TAXA'] > p * 100), (resumo['P_VALOR'] < ALPHA) & (resumo['TAXA'] < p * 100)],
+        ["🔴 Acima do sorteio", "🔵 Abaixo do sorteio"], "🟢 Dentro do esperado")
+    return periodos, resumo.sort_values('P_VALOR', kind='mergesort').reset_index(drop=True)
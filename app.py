@@ -2,14 +2,14 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import os
-import io
+import re
 from datetime import datetime, timedelta
-import folium
-from streamlit_folium import st_folium
-from fpdf import FPDF
 import sqlite3
-from github import Github, GithubException
+from contextlib import closing
+import numpy as np
 import utils # Importa o novo módulo
+import reports
+import perf
 
 # ================= CONFIG ==================
 # st.set_page_config removido para funcionar no projeto unificado
@@ -17,6 +17,8 @@ import utils # Importa o novo módulo
 # ================= ARQUIVOS ==================
 DB_FILE = "voos.db"
 COLUNAS_VOOS = ["Data","Operador","Tipo","Rotas","Voos","Obs"]
+# Chave de "mesmo registro" na importação com atualização (upsert)
+UPSERT_KEY_COLS = ["Data", "Operador"]
 
 LAT = -22.6238754
 LON = -43.2217511
@@ -24,32 +26,393 @@ LON = -43.2217511
 # ================= BASE ==================
 # Funções movidas para utils.py
 
-# --- FUNÇÃO PRINCIPAL DO APP ---
-def app():
-    # Inicialização de Dados (Session State)
-    if 'df_voos' not in st.session_state:
-        # 1. Tenta GitHub
-        df_start = utils.load_data_from_github("file_path_drones")
-        
-        # 2. Se falhar, tenta SQLite Local
-        if df_start is None:
-            conn = sqlite3.connect(DB_FILE)
+def format_voos_for_storage(df):
+    """Cópia para gravação (CSV/SQLite): datas como texto DD/MM/YYYY, padrão do banco."""
+    df_save = df.copy()
+    if "Data" in df_save.columns:
+        df_save["Data"] = pd.to_datetime(df_save["Data"], errors='coerce').dt.strftime("%d/%m/%Y")
+    return df_save
+
+def prepare_voos_rows(linhas):
+    """Tipos das linhas editadas/novas no editor (datas ISO do editor, números)."""
+    linhas["Data"] = pd.to_datetime(linhas["Data"], errors="coerce", format="mixed")
+    for col in ("Rotas", "Voos"):
+        if col in linhas.columns:
+            linhas[col] = pd.to_numeric(linhas[col], errors="coerce").fillna(0)
+    return linhas
+
+def set_df_voos(df):
+    """Atualiza os voos da sessão mantendo-os ordenados por Data (base do filtro por busca binária)."""
+    st.session_state['df_voos'] = utils.sort_by_date(df, "Data")
+
+# --- CARREGAMENTO INICIAL (COMPARTILHADO ENTRE SESSÕES) ---
+# Lido uma vez por processo e reaproveitado por todas as sessões e pelo warm-up (warmup.py).
+# Cada chamada devolve uma cópia; gravações chamam load_initial_flights.clear().
+@st.cache_data(ttl=3600, show_spinner="Carregando voos...")
+@perf.traced("app.load_initial_flights")
+def load_initial_flights():
+    # 1. Tenta GitHub
+    df_start = utils.load_data_from_github("file_path_drones")
+    
+    # 2. Se falhar, tenta SQLite Local
+    if df_start is None:
+        conn = sqlite3.connect(DB_FILE)
+        try:
+            df_start = pd.read_sql("SELECT * FROM voos", conn)
+        except Exception:
+            df_start = pd.DataFrame(columns=COLUNAS_VOOS)
+        conn.close()
+    
+    # Tratamento de tipos
+    # Garante tipagem correta mesmo se o DataFrame estiver vazio (evita erro no .dt)
+    if "Data" in df_start.columns:
+        df_start["Data"] = pd.to_datetime(df_start["Data"], dayfirst=True, errors="coerce")
+    if "Voos" in df_start.columns:
+        df_start["Voos"] = pd.to_numeric(df_start["Voos"], errors="coerce").fillna(0)
+    if "Rotas" in df_start.columns:
+        df_start["Rotas"] = pd.to_numeric(df_start["Rotas"], errors="coerce").fillna(0)
+    return utils.sort_by_date(df_start, "Data")
+
+@perf.traced("app.save_voos_to_github")
+def save_voos_to_github(df, commit_message="Atualizando voos via App"):
+    """Salva os voos no GitHub (datas DD/MM/YYYY) e invalida o carregamento compartilhado."""
+    salvo = utils.save_data_to_github(format_voos_for_storage(df), utils.resolve_storage_path("file_path_drones"), commit_message)
+    load_initial_flights.clear()
+    return salvo
+
+# --- CLASSIFICAÇÃO DE OCORRÊNCIAS ---
+# Palavras-chave para categorizar os problemas (vale a primeira categoria encontrada)
+OCORRENCIA_KEYWORDS = {
+    "🌧️ Chuva/Vento": ["CHUVA", "VENTO", "CLIMA", "TEMPO", "NEBLINA"],
+    "🔧 Problema Técnico": ["TÉCNICO", "TECNICO", "ZOOM", "CÂMERA", "CAMERA", "AERONAVE", "APP", "CALIBRAGEM", "HÉLICE", "HELICE"],
+    "👷 Operacional/RH": ["FALTA", "ATRASO", "MÉDICO", "MEDICO", "PASSO MAL", "DDS"],
+    "⚠️ Outros": ["FOGOS", "INTERROMPIDO", "VIRADA"]
+}
+
+@st.cache_data(max_entries=8, show_spinner=False)
+@perf.traced("app.get_occurrence_categories")
+def get_occurrence_categories(_df, data_version):
+    """
+    Categoria detectada na coluna Obs de cada voo (None se nenhuma), alinhada ao índice de `_df`.
+    Em cache por versão dos dados: o DataFrame em si não é hasheado.
+    """
+    texto = _df["Obs"].fillna("").astype(str).str.upper()
+    categorias = pd.Series(None, index=_df.index, dtype=object)
+    # Aplica em ordem inversa: a primeira categoria do dicionário sobrescreve as demais
+    for category, words in reversed(list(OCORRENCIA_KEYWORDS.items())):
+        achou = texto.str.contains("|".join(re.escape(w) for w in words), regex=True)
+        categorias[achou] = category
+    return categorias
+
+def warmup_steps():
+    """
+    Etapas de pré-aquecimento desta página (executadas por warmup.py, em ordem): [(nome, função)].
+    Os caches por versão usam a mesma chave que as sessões: compute_data_version dos voos carregados.
+    """
+    base = {}
+
+    def carregar():
+        base["df"] = load_initial_flights()
+        base["versao"] = utils.compute_data_version(base["df"])
+
+    def classificar():
+        if "Obs" in base["df"].columns:
+            get_occurrence_categories(base["df"], base["versao"])
+
+    return [
+        ("drones.carregar", carregar),
+        ("drones.ocorrencias", classificar),
+        ("drones.kpis", lambda: utils.prefix_sum_index(base["df"], base["versao"], "Data", ("Operador",), ("Rotas", "Voos"))),
+        ("drones.eficiencia", lambda: efficiency_index(base["df"], base["versao"])),
+        ("drones.metas", load_metas),
+    ]
+
+# --- METAS MENSAIS E PROJEÇÃO ---
+# Metas por operador e mês ficam no armazenamento das bases (metas.csv ao lado de voos.csv, ver
+# utils.resolve_storage_path), com cópia na tabela "metas" do voos.db. O realizado sai do índice de somas
+# acumuladas (operador × dia): qualquer mês custa duas consultas, e um voo registrado só é somado ao
+# índice (utils.advance_prefix_index). A projeção usa o calendário real e os dias de operação do mês.
+META_PADRAO = 225  # Voos por operador no mês, quando não há meta cadastrada
+DIAS_SEMANA = ["Seg", "Ter", "Qua", "Qui", "Sex", "Sáb", "Dom"]
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def load_metas():
+    """Metas cadastradas: operador, mes (YYYY-MM), meta. Do armazenamento (GitHub/local), senão do voos.db."""
+    metas = utils.load_data_from_github("file_path_metas")
+    if metas is None:
+        with closing(sqlite3.connect(DB_FILE)) as conn:
             try:
-                df_start = pd.read_sql("SELECT * FROM voos", conn)
+                metas = pd.read_sql("SELECT operador, mes, meta FROM metas", conn)
             except Exception:
-                df_start = pd.DataFrame(columns=COLUNAS_VOOS)
-            conn.close()
+                metas = pd.DataFrame(columns=["operador", "mes", "meta"])
+    return metas.astype({"operador": str, "mes": str, "meta": "float64"})
+
+def save_metas(mes, metas):
+    """
+    Grava as metas {operador: voos} do mês YYYY-MM (substitui as que já existiam) no armazenamento e
+    no voos.db. Devolve True se salvou no armazenamento (GitHub ou local).
+    """
+    atuais = load_metas()
+    novas = pd.DataFrame({"operador": list(metas), "mes": mes, "meta": [float(v) for v in metas.values()]})
+    tabela = (pd.concat([atuais[(atuais["mes"] != mes) | ~atuais["operador"].isin(novas["operador"])], novas], ignore_index=True)
+              .sort_values(["mes", "operador"], kind="mergesort"))
+    salvo = utils.save_data_to_github(tabela, utils.resolve_storage_path("file_path_metas"), "Atualizando metas dos drones")
+    with closing(sqlite3.connect(DB_FILE)) as conn, conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS metas (operador TEXT NOT NULL, mes TEXT NOT NULL, meta REAL NOT NULL, PRIMARY KEY (operador, mes))")
+        conn.execute("DELETE FROM metas")
+        conn.executemany("INSERT INTO metas (operador, mes, meta) VALUES (?, ?, ?)", tabela.itertuples(index=False, name=None))
+    load_metas.clear()
+    return salvo
+
+def goals_for_month(metas, operadores, mes):
+    """Meta de cada operador no mês: a do próprio mês, senão a última cadastrada antes dele, senão META_PADRAO."""
+    vigentes = metas[metas["mes"] <= mes].sort_values("mes", kind="mergesort").groupby("operador")["meta"].last()
+    return pd.Series([vigentes.get(op, META_PADRAO) for op in operadores], index=operadores, dtype="float64")
+
+def working_days(inicio, fim, weekmask):
+    """Dias de operação em [inicio, fim] (datas, inclusivo). weekmask: '1111100' = segunda a sexta."""
+    if fim < inicio:
+        return 0
+    return int(np.busday_count(inicio, fim + timedelta(days=1), weekmask=weekmask))
+
+def monthly_progress(indice, operadores, mes, metas, hoje, weekmask):
+    """
+    Realizado, meta e projeção de voos de cada operador no mês YYYY-MM.
+    Projeção = realizado + (realizado / dias de operação decorridos) × dias de operação restantes.
+    Devolve (tabela, dias de operação no mês, dias decorridos).
+    """
+    inicio = pd.Timestamp(f"{mes}-01")
+    fim = inicio + pd.offsets.MonthEnd(0)
+    realizado = indice.by_group(inicio, fim, {"Operador": operadores})["Voos"].reindex(operadores, fill_value=0)
+    dias_mes = working_days(inicio.date(), fim.date(), weekmask)
+    decorridos = working_days(inicio.date(), min(hoje, fim.date()), weekmask)
+    ritmo = realizado / decorridos if decorridos else realizado * 0
+    tabela = pd.DataFrame({
+        "Operador": operadores,
+        "Realizado": realizado.to_numpy(),
+        "Meta": goals_for_month(metas, operadores, mes).to_numpy(),
+        "Projeção": (realizado + ritmo * (dias_mes - decorridos)).round().to_numpy(),
+    })
+    tabela["% da Meta"] = (tabela["Realizado"] / tabela["Meta"].where(tabela["Meta"] > 0) * 100).fillna(0)
+    return tabela, dias_mes, decorridos
+
+@st.fragment
+def render_metas(indice_voos, op_selecionados, hoje):
+    """Meta mensal por operador e projeção do mês (seção com rerun próprio)."""
+    st.markdown("### 🎯 Meta Mensal e 📈 Projeção do Mês")
+    if not op_selecionados:
+        st.info("Selecione ao menos um operador para acompanhar as metas.")
+        return
+    # Meses do histórico (eixo de dias do índice) e o mês atual
+    meses = set(pd.period_range(indice_voos.inicio, periods=indice_voos.dias, freq="D").strftime("%Y-%m")) if indice_voos.dias else set()
+    meses = sorted(meses | {hoje.strftime("%Y-%m")}, reverse=True)
+    c_mes, c_dias = st.columns([1, 2])
+    mes = c_mes.selectbox("Mês", meses, format_func=lambda m: f"{m[5:]}/{m[:4]}", key="metas_mes")
+    dias_sel = c_dias.multiselect("Dias de operação", DIAS_SEMANA, default=DIAS_SEMANA, key="metas_dias",
+                                  help="Dias da semana com voo: a projeção distribui o ritmo atual pelos dias de operação restantes.")
+    weekmask = "".join("1" if d in dias_sel else "0" for d in DIAS_SEMANA)
+    if weekmask == "0000000":
+        st.warning("Selecione ao menos um dia de operação.")
+        return
+
+    metas = load_metas()
+    tabela, dias_mes, decorridos = monthly_progress(indice_voos, sorted(op_selecionados), mes, metas, hoje, weekmask)
+    m1, m2, m3 = st.columns(3)
+    m1.metric("Voos no mês", f"{tabela['Realizado'].sum():,.0f}".replace(",", "."))
+    m2.metric("Projeção de voos no mês", f"{tabela['Projeção'].sum():,.0f}".replace(",", "."),
+              f"{tabela['Projeção'].sum() - tabela['Meta'].sum():+,.0f}".replace(",", ".") + " vs meta")
+    m3.metric("Dias de operação", f"{decorridos}/{dias_mes}")
+
+    for _, row in tabela.iterrows():
+        st.write(f"{row['Operador']} - {int(row['Realizado'])}/{int(row['Meta'])} (projeção: {int(row['Projeção'])})")
+        st.progress(min(row["% da Meta"] / 100, 1.0))
+
+    if st.session_state.get('logged_in', False):
+        with st.expander("✏️ Definir metas do mês"):
+            editadas = st.data_editor(
+                tabela[["Operador", "Meta"]],
+                hide_index=True,
+                disabled=["Operador"],
+                column_config={"Meta": st.column_config.NumberColumn("Meta (voos)", min_value=0, step=1, format="%d")},
+                key=f"metas_editor_{mes}",
+            )
+            if st.button("💾 Salvar metas", key="metas_salvar"):
+                if save_metas(mes, dict(zip(editadas["Operador"], editadas["Meta"].fillna(0)))):
+                    st.toast("✅ Metas salvas!")
+                else:
+                    st.toast("⚠️ Metas salvas APENAS localmente. Falha ao salvar no GitHub (verifique credenciais).")
+                st.rerun()
+
+# --- EFICIÊNCIA OPERACIONAL ---
+# Rollup operador × Tipo × dia no índice de somas acumuladas: cada registro é uma escala (operador no dia)
+# e a escala é ativa quando teve voo. Totais do período e séries por semana/mês saem do acumulado,
+# sem reagrupar os voos a cada interação; um voo registrado só é somado ao rollup.
+EFICIENCIA_COLS = ("Rotas", "Voos", "Escalas", "Ativas")
+EFICIENCIA_METRICAS = {"Rotas por Voo": "Rotas_por_Voo", "% Dias Ativos": "Pct_Ativos", "Voos por Dia Ativo": "Voos_por_Dia"}
+
+def efficiency_rows(df):
+    """Colunas do rollup de eficiência: Rotas, Voos, uma escala por registro e se ela teve voo."""
+    voos = pd.to_numeric(df["Voos"], errors="coerce").fillna(0)
+    return pd.DataFrame({
+        "Data": df["Data"],
+        "Operador": df["Operador"].fillna("Não Informado").astype(str).str.strip(),
+        "Tipo": df["Tipo"].fillna("-").astype(str).str.strip().str.upper(),
+        "Rotas": pd.to_numeric(df["Rotas"], errors="coerce").fillna(0),
+        "Voos": voos,
+        "Escalas": 1,
+        "Ativas": (voos > 0).astype(int),
+    })
+
+def efficiency_index(df, versao):
+    """Rollup de eficiência da versão `versao` dos voos (montado uma vez, compartilhado entre sessões)."""
+    return utils.prefix_sum_index(df, versao, "Data", ("Operador", "Tipo"), EFICIENCIA_COLS, prepare=efficiency_rows)
+
+def efficiency_metrics(totais):
+    """Acrescenta rotas por voo, % de dias ativos e voos por dia ativo a uma tabela de totais do rollup."""
+    tabela = totais.copy()
+    tabela["Rotas_por_Voo"] = (tabela["Rotas"] / tabela["Voos"].where(tabela["Voos"] > 0)).round(2)
+    tabela["Pct_Ativos"] = (tabela["Ativas"] / tabela["Escalas"].where(tabela["Escalas"] > 0) * 100).round(1)
+    tabela["Voos_por_Dia"] = (tabela["Voos"] / tabela["Ativas"].where(tabela["Ativas"] > 0)).round(2)
+    return tabela
+
+# --- SEÇÕES COM RERUN PRÓPRIO (st.fragment) ---
+# Mexer na linha do tempo reexecuta só esta seção, não o dashboard inteiro.
+@st.fragment
+def render_ocorrencias(df, op_selecionados, hoje, tres_meses, tema_selecionado, cores_tema, versao_voos):
+    """Análise de ocorrências e clima (coluna Obs), com linha do tempo própria."""
+    st.markdown("---")
+    st.markdown("### 🌪️ Baseado nas análises de ocorrência e clima")
+    
+    # Filtro Linha do Tempo (Slider) - Estilo Excel
+    # Usamos df filtrado por operador, mas aberto em datas para permitir navegação livre
+    df_base_occ = df[df["Operador"].isin(op_selecionados)] if not df.empty else df
+    
+    min_timeline = df_base_occ["Data"].min().date() if not df_base_occ.empty and "Data" in df_base_occ.columns else tres_meses
+    max_timeline = df_base_occ["Data"].max().date() if not df_base_occ.empty and "Data" in df_base_occ.columns else hoje
+    
+    if min_timeline >= max_timeline: min_timeline = max_timeline - timedelta(days=1)
+    
+    # Define valor inicial (últimos 3 meses ou todo o período se for menor)
+    start_val = tres_meses if tres_meses >= min_timeline and tres_meses <= max_timeline else min_timeline
+
+    periodo_occ = st.slider(
+        "📅 Linha do Tempo",
+        min_value=min_timeline,
+        max_value=max_timeline,
+        value=(start_val, max_timeline),
+        format="DD/MM/YYYY",
+        key="timeline_occ"
+    )
+
+    df_occ_filtered = utils.slice_by_date(df_base_occ, periodo_occ[0], periodo_occ[1])
+
+    # Processamento de Texto da coluna Obs para extrair motivos
+    if "Obs" in df_occ_filtered.columns:
+        # Categorias calculadas uma vez por versão dos dados (e pré-aquecidas no início do processo)
+        categorias = get_occurrence_categories(st.session_state['df_voos'], utils.get_data_version('df_voos'))
         
-        # Tratamento de tipos
-        # Garante tipagem correta mesmo se o DataFrame estiver vazio (evita erro no .dt)
-        if "Data" in df_start.columns:
-            df_start["Data"] = pd.to_datetime(df_start["Data"], dayfirst=True, errors="coerce")
-        if "Voos" in df_start.columns:
-            df_start["Voos"] = pd.to_numeric(df_start["Voos"], errors="coerce").fillna(0)
-        if "Rotas" in df_start.columns:
-            df_start["Rotas"] = pd.to_numeric(df_start["Rotas"], errors="coerce").fillna(0)
+        # Filtra apenas linhas com observações preenchidas
+        df_obs = df_occ_filtered[df_occ_filtered["Obs"].notna()].copy()
+        df_obs["Categoria_Detectada"] = categorias.reindex(df_obs.index)
+        occurrences = df_obs["Categoria_Detectada"].dropna()
+        
+        if not occurrences.empty:
+            counts_occ = occurrences.value_counts().reset_index()
+            counts_occ.columns = ["Motivo", "Qtd"]
             
-        st.session_state['df_voos'] = df_start
+            c_occ1, c_occ2 = st.columns([2, 1])
+            with c_occ1:
+                def build_fig_occ():
+                    fig_occ = px.pie(counts_occ, names="Motivo", values="Qtd", title="Principais Causas de Impacto na Operação", hole=0.4, color_discrete_sequence=cores_tema)
+                    fig_occ.update_layout(plot_bgcolor="rgba(0,0,0,0)", paper_bgcolor="rgba(0,0,0,0)")
+                    return fig_occ
+                filtros_occ = {"operadores": sorted(op_selecionados), "periodo": periodo_occ, "tema": tema_selecionado}
+                st.plotly_chart(utils.cached_figure("voos_ocorrencias", filtros_occ, versao_voos, build_fig_occ), use_container_width=True)
+            with c_occ2:
+                st.write("#### Detalhes")
+                st.dataframe(counts_occ, hide_index=True, use_container_width=True)
+            
+            st.markdown("#### 📝 Relatório Detalhado das Ocorrências")
+            df_detalhe = df_obs.dropna(subset=["Categoria_Detectada"])[["Data", "Operador", "Categoria_Detectada", "Obs"]].sort_values("Data")
+            st.dataframe(
+                df_detalhe,
+                hide_index=True,
+                use_container_width=True,
+                column_config={
+                    "Data": st.column_config.DateColumn("Data", format="DD/MM/YYYY"),
+                    "Categoria_Detectada": "Motivo Identificado",
+                    "Obs": "Observação Completa"
+                }
+            )
+        else:
+            st.info("ℹ️ Nenhuma ocorrência específica (Chuva, Técnico, etc.) identificada nas observações do período filtrado.")
+
+@st.fragment
+def render_eficiencia(indice_ef, op_selecionados, start_d, end_d, cores_tema, filtros_voos, versao_voos):
+    """Eficiência por operador e/ou Tipo, no total do período ou por semana/mês (a partir do rollup)."""
+    st.markdown("### ⚡ Eficiência Operacional")
+    c_q, c_p, c_m = st.columns(3)
+    quebra = c_q.radio("Comparar", ["Operador", "Tipo", "Operador × Tipo"], horizontal=True, key="ef_quebra")
+    periodo = c_p.radio("Período", ["Total", "Semana", "Mês"], horizontal=True, key="ef_periodo")
+    metrica = c_m.selectbox("Indicador", list(EFICIENCIA_METRICAS), key="ef_metrica")
+    if not op_selecionados:
+        st.info("Selecione ao menos um operador para ver a eficiência.")
+        return
+
+    sel = {"Operador": op_selecionados}
+    if periodo == "Total":
+        base = indice_ef.by_group(start_d, end_d, sel).reset_index()
+    else:
+        base = indice_ef.series({"Semana": "W", "Mês": "M"}[periodo], start_d, end_d, sel)
+    grupos = {"Operador": ["Operador"], "Tipo": ["Tipo"], "Operador × Tipo": ["Operador", "Tipo"]}[quebra]
+    chaves = grupos + ([] if periodo == "Total" else ["Data"])
+    # Soma só o rollup (grupos × períodos), não os registros de voo
+    tabela = efficiency_metrics(base.groupby(chaves, as_index=False)[list(EFICIENCIA_COLS)].sum())
+    tabela = tabela[tabela["Escalas"] > 0]
+    if tabela.empty:
+        st.info("Sem escalas no período selecionado.")
+        return
+    coluna = EFICIENCIA_METRICAS[metrica]
+
+    def build_fig_eficiencia():
+        if periodo == "Total":
+            dados = tabela.sort_values(coluna, ascending=False)
+            fig = px.bar(dados, x=grupos[0], y=coluna, color="Tipo" if len(grupos) > 1 else None, barmode="group",
+                         text=dados[coluna].map(lambda x: f"{x:.2f}".replace(".", ",") if pd.notna(x) else ""),
+                         template="plotly_white", color_discrete_sequence=cores_tema)
+            fig.update_traces(textfont_size=16)
+        else:
+            dados = tabela.assign(Serie=tabela[grupos].astype(str).agg(" · ".join, axis=1))
+            fig = px.line(dados, x="Data", y=coluna, color="Serie", markers=True,
+                          template="plotly_white", color_discrete_sequence=cores_tema)
+        fig.update_layout(plot_bgcolor="rgba(0,0,0,0)", paper_bgcolor="rgba(0,0,0,0)", yaxis_title=metrica, legend_title_text="")
+        return fig
+    filtros_ef = {**filtros_voos, "quebra": quebra, "periodo": periodo, "metrica": metrica}
+    st.plotly_chart(utils.cached_figure("voos_eficiencia", filtros_ef, versao_voos, build_fig_eficiencia), width="stretch", key="chart_eficiencia")
+
+    with st.expander("📋 Tabela de eficiência"):
+        st.dataframe(
+            tabela,
+            hide_index=True,
+            width="stretch",
+            column_config={
+                "Data": st.column_config.DateColumn("Início do período", format="DD/MM/YYYY"),
+                "Escalas": st.column_config.NumberColumn("Dias escalados", format="%d"),
+                "Ativas": st.column_config.NumberColumn("Dias com voo", format="%d"),
+                "Rotas_por_Voo": st.column_config.NumberColumn("Rotas/Voo", format="%.2f"),
+                "Pct_Ativos": st.column_config.NumberColumn("% Dias ativos", format="%.1f"),
+                "Voos_por_Dia": st.column_config.NumberColumn("Voos/Dia ativo", format="%.2f"),
+            },
+        )
+    st.caption("⚡ **Rotas por Voo:** rotas vistoriadas por voo. **% Dias Ativos:** dias escalados em que houve voo. **Voos por Dia Ativo:** ritmo nos dias com operação.")
+
+# --- FUNÇÃO PRINCIPAL DO APP ---
+def app():
+    perf.step("drones.carregar")
+    # Inicialização de Dados (Session State)
+    if 'df_voos' not in st.session_state:
+        # Já vem tipado e ordenado por Data (mesmo invariante de set_df_voos)
+        st.session_state['df_voos'] = load_initial_flights()
 
     # Usa o dataframe da sessão
     df = st.session_state['df_voos'].copy()
@@ -60,6 +423,7 @@ def app():
     else:
         df["Mes"] = []
 
+    perf.step("drones.sidebar")
     # ================= ESTILO (Carregado apenas ao abrir este módulo) ==================
     st.markdown("""
     <style>
@@ -157,6 +521,7 @@ def app():
         # Limpa os dados da sessão
         if 'df_voos' in st.session_state:
             del st.session_state['df_voos']
+        load_initial_flights.clear()
         # Limpa também o estado dos filtros para evitar gráficos quebrados/vazios ao recarregar
         keys_to_clear = ["filtro_todos", "filtro_manual", "filtro_dia_ini", "filtro_dia_fim", "filtro_mes_ini", "filtro_mes_fim", "filtro_ano_geral"]
         for k in keys_to_clear:
@@ -181,6 +546,7 @@ def app():
         </div>
         """, unsafe_allow_html=True)
 
+    perf.step(f"drones.{menu}")
     # ================= DASHBOARD ==================
     if menu == "Dashboard":
         # Obtém as cores do tema selecionado
@@ -218,6 +584,7 @@ def app():
             *   Use a seção final para ver a evolução mês a mês ou filtrar por anos anteriores.
             """)
 
+        perf.step("drones.dashboard.filtros")
         # ===== FILTRO GERAL =====
         # Tratamento de dados (Igual ao teste que funcionou)
         df["Operador"] = df["Operador"].fillna("Não Informado").astype(str).str.strip()
@@ -256,35 +623,51 @@ def app():
                 key="filtro_data_geral"
             )
         
+        # Período selecionado (um dia, se só uma data foi escolhida)
+        if isinstance(datas_selecionadas, tuple):
+            start_d = datas_selecionadas[0] if datas_selecionadas else min_d
+            end_d = datas_selecionadas[1] if len(datas_selecionadas) == 2 else start_d
+        else:
+            start_d = end_d = datas_selecionadas
+
         # Aplicação do filtro
         if not op_selecionados:
             st.warning("⚠️ Nenhum operador selecionado. A tabela ficará vazia.")
             df_filtrado = df.iloc[0:0] # Cria um DF vazio com as mesmas colunas
         else:
-            df_filtrado = df[df["Operador"].isin(op_selecionados)]
-            
-            # Aplica filtro de data
-            if isinstance(datas_selecionadas, tuple):
-                if len(datas_selecionadas) == 2:
-                    start_d, end_d = datas_selecionadas
-                    df_filtrado = df_filtrado[(df_filtrado["Data"].dt.date >= start_d) & (df_filtrado["Data"].dt.date <= end_d)]
-                elif len(datas_selecionadas) == 1:
-                    start_d = datas_selecionadas[0]
-                    df_filtrado = df_filtrado[df_filtrado["Data"].dt.date == start_d]
-            else:
-                df_filtrado = df_filtrado[df_filtrado["Data"].dt.date == datas_selecionadas]
+            with perf.trace("app.filtro"):
+                df_filtrado = df[df["Operador"].isin(op_selecionados)]
+
+                # Aplica filtro de data (df está ordenado por Data: recorte por busca binária)
+                df_filtrado = utils.slice_by_date(df_filtrado, start_d, end_d)
 
+        # Chaves do cache de gráficos: cada gráfico é reaproveitado por (filtros que usa, tema, versão dos dados)
+        versao_voos = utils.get_data_version('df_voos')
+        filtros_voos = {"operadores": sorted(op_selecionados), "datas": datas_selecionadas, "tema": tema_selecionado}
+        # Totais por operador e período saem das somas acumuladas (operador × dia), montadas uma vez por versão
+        indice_voos = utils.prefix_sum_index(df, versao_voos, "Data", ("Operador",), ("Rotas", "Voos"))
+        sel_voos = {"Operador": op_selecionados}
+
+        perf.step("drones.dashboard.kpis")
         # ===== KPIs (Cards) =====
         st.markdown("<br>", unsafe_allow_html=True)
+        totais = indice_voos.total(start_d, end_d, sel_voos)
+        totais_aa = indice_voos.total(pd.Timestamp(start_d) - pd.DateOffset(years=1), pd.Timestamp(end_d) - pd.DateOffset(years=1), sel_voos)
+        voos_txt = f"{int(totais['Voos']):,.0f}".replace(",", ".")
+        rotas_txt = f"{int(totais['Rotas']):,.0f}".replace(",", ".")
         c1, c2, c3 = st.columns(3)
-        c1.markdown(f"<div class='metric-card'>{f'{int(df_filtrado['Voos'].sum()):,.0f}'.replace(',', '.')}<div class='small'>Total de Voos</div></div>", unsafe_allow_html=True)
-        c2.markdown(f"<div class='metric-card'>{f'{int(df_filtrado['Rotas'].sum()):,.0f}'.replace(',', '.')}<div class='small'>Total de Rotas</div></div>", unsafe_allow_html=True)
+        c1.markdown(f"<div class='metric-card'>{voos_txt}<div class='small'>Total de Voos</div></div>", unsafe_allow_html=True)
+        c2.markdown(f"<div class='metric-card'>{rotas_txt}<div class='small'>Total de Rotas</div></div>", unsafe_allow_html=True)
         c3.markdown(f"<div class='metric-card'>{df_filtrado['Operador'].nunique()}<div class='small'>Operadores</div></div>", unsafe_allow_html=True)
+        if totais_aa["Voos"] > 0:
+            st.caption(f"📆 Mesmo período do ano anterior: {totais_aa['Voos']:,.0f}".replace(",", ".") +
+                       f" voos ({(totais['Voos'] / totais_aa['Voos'] - 1) * 100:+.1f}%) · {totais_aa['Rotas']:,.0f}".replace(",", ".") + " rotas")
 
         hoje = datetime.now().date()
         semana_passada = hoje - timedelta(days=7)
         tres_meses = hoje - timedelta(days=90)
 
+        perf.step("drones.dashboard.graficos")
         # ===== FILTRO DIÁRIO =====
         st.markdown("### 📅 Filtro Diário")
         f1, f2 = st.columns(2)
@@ -292,16 +675,20 @@ def app():
         inicio_dia = f1.date_input("Data Início", semana_passada, format="DD/MM/YYYY", key="filtro_dia_ini")
         fim_dia = f2.date_input("Data Fim", hoje, format="DD/MM/YYYY", key="filtro_dia_fim")
 
-        base_dia = df_filtrado[(df_filtrado["Data"].dt.date >= inicio_dia) & (df_filtrado["Data"].dt.date <= fim_dia)]
-
         # ===== GRAFICO DIÁRIO =====
         st.markdown("### 📊 Produção por Operador (Dia)")
-        dia = base_dia.groupby("Operador")[["Rotas","Voos"]].sum().reset_index()
-        fig_dia = px.bar(dia, x="Operador", y=["Rotas","Voos"], barmode="group",
-                        template="plotly_white", color_discrete_sequence=cores_tema)
-        fig_dia.update_traces(textfont_size=20)
-        fig_dia.for_each_trace(lambda t: t.update(text=[f"{y:,.0f}".replace(",", ".") for y in t.y], texttemplate='%{text}'))
-        fig_dia.update_layout(plot_bgcolor="rgba(0,0,0,0)", paper_bgcolor="rgba(0,0,0,0)", yaxis_tickformat=',.0f')
+        with perf.trace("app.agregacao_dia"):
+            # Interseção do período geral com o do filtro diário
+            dia = indice_voos.by_group(max(pd.Timestamp(start_d), pd.Timestamp(inicio_dia)), min(pd.Timestamp(end_d), pd.Timestamp(fim_dia)), sel_voos)
+            dia = dia[(dia != 0).any(axis=1)].reset_index()
+        def build_fig_dia():
+            fig_dia = px.bar(dia, x="Operador", y=["Rotas","Voos"], barmode="group",
+                            template="plotly_white", color_discrete_sequence=cores_tema)
+            fig_dia.update_traces(textfont_size=20)
+            fig_dia.for_each_trace(lambda t: t.update(text=[f"{y:,.0f}".replace(",", ".") for y in t.y], texttemplate='%{text}'))
+            fig_dia.update_layout(plot_bgcolor="rgba(0,0,0,0)", paper_bgcolor="rgba(0,0,0,0)", yaxis_tickformat=',.0f')
+            return fig_dia
+        fig_dia = utils.cached_figure("voos_dia", {**filtros_voos, "inicio": inicio_dia, "fim": fim_dia}, versao_voos, build_fig_dia)
         st.plotly_chart(fig_dia, width="stretch", key="chart_dia")
 
         # ===== RANKING =====
@@ -310,27 +697,9 @@ def app():
         for i, row in ranking.head(5).iterrows():
             medalha = "🥇" if i == ranking.index[0] else "🥈" if i == ranking.index[1] else "🥉"
             st.markdown(f"<div class='rank'>{medalha} {row['Operador']} — {int(row['Voos'])} voos | {int(row['Rotas'])} rondas</div>", unsafe_allow_html=True)
-        '''
-        # ===== META =====
-        st.markdown("### 🎯 Meta Mensal")
-        meta = st.number_input("Meta de voos por operador", 50, 2000, 225)
-        mes_atual = df_filtrado[df_filtrado["Data"].dt.month == hoje.month]
-        meta_base = mes_atual.groupby("Operador")["Voos"].sum().reset_index()
-
-        for _, row in meta_base.iterrows():
-            perc = min(row["Voos"] / meta, 1.0)
-            st.write(f"{row['Operador']} - {int(row['Voos'])}/{meta}")
-            st.progress(perc)
-        
-        # ===== PROJEÇÃO =====
-        st.markdown("### 📈 Projeção do Mês")
-        voos_ate_hoje = mes_atual["Voos"].sum()
-        dias_passados = hoje.day
-        projecao = int((voos_ate_hoje / max(dias_passados,1)) * 30)
 
-        st.metric("Projeção de voos no mês", projecao)
-
-        '''
+        # ===== META E PROJEÇÃO =====
+        render_metas(indice_voos, op_selecionados, hoje)
 
         # ===== GRÁFICO MENSAL =====
         st.markdown("### 📊 Produção por Mês")
@@ -338,15 +707,21 @@ def app():
         inicio_mes = f3.date_input("Data Início (Mensal)", tres_meses, format="DD/MM/YYYY", key="filtro_mes_ini")
         fim_mes = f4.date_input("Data Fim (Mensal)", hoje, format="DD/MM/YYYY", key="filtro_mes_fim")
 
-        base_mes = df_filtrado[(df_filtrado["Data"].dt.date >= inicio_mes) & (df_filtrado["Data"].dt.date <= fim_mes)]
-        mes = base_mes.groupby(["Mes","Operador"])[["Rotas","Voos"]].sum().reset_index()
-
-        fig_mes = px.bar(mes, x="Operador", y=["Rotas","Voos"], barmode="group",
-                        facet_col="Mes",
-                        template="plotly_white", color_discrete_sequence=cores_tema)
-        fig_mes.update_traces(textfont_size=20)
-        fig_mes.for_each_trace(lambda t: t.update(text=[f"{y:,.0f}".replace(",", ".") for y in t.y], texttemplate='%{text}'))
-        fig_mes.update_layout(plot_bgcolor="rgba(0,0,0,0)", paper_bgcolor="rgba(0,0,0,0)", yaxis_tickformat=',.0f')
+        def build_fig_mes():
+            base_mes = utils.slice_by_date(df_filtrado, inicio_mes, fim_mes)
+            # Um painel por período: intervalos longos passam de mês para trimestre/ano
+            grain = utils.choose_time_grain(inicio_mes, fim_mes, grains=("M", "Q", "Y"), max_points=utils.MAX_CHART_FACETS)
+            mes = utils.aggregate_by_grain(base_mes, grain, ["Rotas","Voos"], ["Operador"])
+            mes["Mes"] = utils.format_period(mes["Data"], grain)
+
+            fig_mes = px.bar(mes, x="Operador", y=["Rotas","Voos"], barmode="group",
+                            facet_col="Mes",
+                            template="plotly_white", color_discrete_sequence=cores_tema)
+            fig_mes.update_traces(textfont_size=20)
+            fig_mes.for_each_trace(lambda t: t.update(text=[f"{y:,.0f}".replace(",", ".") for y in t.y], texttemplate='%{text}'))
+            fig_mes.update_layout(plot_bgcolor="rgba(0,0,0,0)", paper_bgcolor="rgba(0,0,0,0)", yaxis_tickformat=',.0f')
+            return fig_mes
+        fig_mes = utils.cached_figure("voos_mes", {**filtros_voos, "inicio": inicio_mes, "fim": fim_mes}, versao_voos, build_fig_mes)
         st.plotly_chart(fig_mes, width="stretch", key="chart_mes")
 
         # ===== TOTAL GERAL =====
@@ -355,129 +730,41 @@ def app():
         anos = sorted(df_filtrado["Data"].dt.year.dropna().unique().astype(int), reverse=True)
         ano_filtro = st.selectbox("Selecione o Ano", ["Todos"] + list(anos), key="filtro_ano_geral")
 
-        if ano_filtro != "Todos":
-            df_geral = df_filtrado[df_filtrado["Data"].dt.year == ano_filtro]
-        else:
-            df_geral = df_filtrado
-
-        geral = df_geral.groupby("Operador")[["Rotas","Voos"]].sum().reset_index()
-        fig_geral = px.bar(geral, x="Operador", y=["Rotas","Voos"], barmode="group",
-                        template="plotly_white", color_discrete_sequence=cores_tema)
-        fig_geral.update_traces(textfont_size=20)
-        fig_geral.for_each_trace(lambda t: t.update(text=[f"{y:,.0f}".replace(",", ".") for y in t.y], texttemplate='%{text}'))
-        fig_geral.update_layout(plot_bgcolor="rgba(0,0,0,0)", paper_bgcolor="rgba(0,0,0,0)", yaxis_tickformat=',.0f')
+        def build_fig_geral():
+            geral = indice_voos.by_group(start_d, end_d, sel_voos, years=None if ano_filtro == "Todos" else [ano_filtro])
+            geral = geral[(geral != 0).any(axis=1)].reset_index()
+            fig_geral = px.bar(geral, x="Operador", y=["Rotas","Voos"], barmode="group",
+                            template="plotly_white", color_discrete_sequence=cores_tema)
+            fig_geral.update_traces(textfont_size=20)
+            fig_geral.for_each_trace(lambda t: t.update(text=[f"{y:,.0f}".replace(",", ".") for y in t.y], texttemplate='%{text}'))
+            fig_geral.update_layout(plot_bgcolor="rgba(0,0,0,0)", paper_bgcolor="rgba(0,0,0,0)", yaxis_tickformat=',.0f')
+            return fig_geral
+        fig_geral = utils.cached_figure("voos_geral", {**filtros_voos, "ano": ano_filtro}, versao_voos, build_fig_geral)
         st.plotly_chart(fig_geral, width="stretch", key="chart_geral")
 
+        perf.step("drones.dashboard.ocorrencias")
         # ===== ANÁLISE DE OCORRÊNCIAS (NOVO) =====
-        st.markdown("---")
-        st.markdown("### 🌪️ Baseado nas análises de ocorrência e clima")
-        
-        # Filtro Linha do Tempo (Slider) - Estilo Excel
-        # Usamos df filtrado por operador, mas aberto em datas para permitir navegação livre
-        df_base_occ = df[df["Operador"].isin(op_selecionados)] if not df.empty else df
-        
-        min_timeline = df_base_occ["Data"].min().date() if not df_base_occ.empty and "Data" in df_base_occ.columns else tres_meses
-        max_timeline = df_base_occ["Data"].max().date() if not df_base_occ.empty and "Data" in df_base_occ.columns else hoje
-        
-        if min_timeline >= max_timeline: min_timeline = max_timeline - timedelta(days=1)
-        
-        # Define valor inicial (últimos 3 meses ou todo o período se for menor)
-        start_val = tres_meses if tres_meses >= min_timeline and tres_meses <= max_timeline else min_timeline
-
-        periodo_occ = st.slider(
-            "📅 Linha do Tempo",
-            min_value=min_timeline,
-            max_value=max_timeline,
-            value=(start_val, max_timeline),
-            format="DD/MM/YYYY",
-            key="timeline_occ"
-        )
+        render_ocorrencias(df, op_selecionados, hoje, tres_meses, tema_selecionado, cores_tema, versao_voos)
 
-        df_occ_filtered = df_base_occ[
-            (df_base_occ["Data"].dt.date >= periodo_occ[0]) & 
-            (df_base_occ["Data"].dt.date <= periodo_occ[1])
-        ]
-
-        # Processamento de Texto da coluna Obs para extrair motivos
-        if "Obs" in df_occ_filtered.columns:
-            # Palavras-chave para categorizar os problemas
-            keywords = {
-                "🌧️ Chuva/Vento": ["CHUVA", "VENTO", "CLIMA", "TEMPO", "NEBLINA"],
-                "🔧 Problema Técnico": ["TÉCNICO", "TECNICO", "ZOOM", "CÂMERA", "CAMERA", "AERONAVE", "APP", "CALIBRAGEM", "HÉLICE", "HELICE"],
-                "👷 Operacional/RH": ["FALTA", "ATRASO", "MÉDICO", "MEDICO", "PASSO MAL", "DDS"],
-                "⚠️ Outros": ["FOGOS", "INTERROMPIDO", "VIRADA"]
-            }
-            
-            occurrences = []
-            # Filtra apenas linhas com observações preenchidas
-            df_obs = df_occ_filtered[df_occ_filtered["Obs"].notna()].copy()
-            df_obs["Categoria_Detectada"] = None
-            
-            for idx, row in df_obs.iterrows():
-                obs_text = str(row["Obs"]).upper()
-                for category, words in keywords.items():
-                    if any(word in obs_text for word in words):
-                        occurrences.append(category)
-                        df_obs.at[idx, "Categoria_Detectada"] = category
-                        # Conta apenas a primeira categoria encontrada para simplificar
-                        break 
-            
-            if occurrences:
-                df_occ = pd.DataFrame(occurrences, columns=["Motivo"])
-                counts_occ = df_occ["Motivo"].value_counts().reset_index()
-                counts_occ.columns = ["Motivo", "Qtd"]
-                
-                c_occ1, c_occ2 = st.columns([2, 1])
-                with c_occ1:
-                    fig_occ = px.pie(counts_occ, names="Motivo", values="Qtd", title="Principais Causas de Impacto na Operação", hole=0.4, color_discrete_sequence=cores_tema)
-                    fig_occ.update_layout(plot_bgcolor="rgba(0,0,0,0)", paper_bgcolor="rgba(0,0,0,0)")
-                    st.plotly_chart(fig_occ, use_container_width=True)
-                with c_occ2:
-                    st.write("#### Detalhes")
-                    st.dataframe(counts_occ, hide_index=True, use_container_width=True)
-                
-                st.markdown("#### 📝 Relatório Detalhado das Ocorrências")
-                df_detalhe = df_obs.dropna(subset=["Categoria_Detectada"])[["Data", "Operador", "Categoria_Detectada", "Obs"]].sort_values("Data")
-                st.dataframe(
-                    df_detalhe,
-                    hide_index=True,
-                    use_container_width=True,
-                    column_config={
-                        "Data": st.column_config.DateColumn("Data", format="DD/MM/YYYY"),
-                        "Categoria_Detectada": "Motivo Identificado",
-                        "Obs": "Observação Completa"
-                    }
-                )
-            else:
-                st.info("ℹ️ Nenhuma ocorrência específica (Chuva, Técnico, etc.) identificada nas observações do período filtrado.")
-        '''
-        # ===== EFICIÊNCIA (NOVO) =====
-        st.markdown("### ⚡ Eficiência Operacional (Rotas por Voo)")
-        df_eff = df_filtrado.groupby("Operador")[["Rotas", "Voos"]].sum().reset_index()
-        df_eff = df_eff[df_eff["Voos"] > 0] # Evita divisão por zero
-        df_eff["Rotas_por_Voo"] = (df_eff["Rotas"] / df_eff["Voos"]).round(1)
-        
-        df_eff["TXT"] = df_eff["Rotas_por_Voo"].apply(lambda x: str(x).replace(".", ","))
-        fig_eff = px.bar(df_eff.sort_values("Rotas_por_Voo", ascending=False), 
-                         x="Operador", y="Rotas_por_Voo", text="TXT",
-                         title="Média de Rotas vistoriadas por Voo",
-                         color="Rotas_por_Voo", color_continuous_scale="Blues")
-        fig_eff.update_traces(textfont_size=20, texttemplate='%{text}')
-        fig_eff.update_layout(plot_bgcolor="rgba(0,0,0,0)", paper_bgcolor="rgba(0,0,0,0)", yaxis_title="Rotas / Voo")
-        st.plotly_chart(fig_eff, use_container_width=True)
-        '''
+        perf.step("drones.dashboard.eficiencia")
+        # ===== EFICIÊNCIA =====
+        render_eficiencia(efficiency_index(df, versao_voos), op_selecionados, start_d, end_d, cores_tema, filtros_voos, versao_voos)
+
+        perf.step("drones.dashboard.exportar")
         # ===== EXPORTAÇÃO =====
         st.markdown("### 📤 Exportar Dados do Período (Filtro Diário)")
         
-        buffer = io.BytesIO()
-        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-            base_dia.to_excel(writer, index=False, sheet_name='Relatorio')
-            
-        st.download_button(
-            label="Baixar Excel",
-            data=buffer.getvalue(),
+        reports.report_panel(
+            "excel_voos_periodo",
+            {"operadores": sorted(op_selecionados), "datas": datas_selecionadas, "inicio": inicio_dia, "fim": fim_dia},
+            utils.get_data_version('df_voos'),
+            ".xlsx",
+            lambda path: reports.export_excel(utils.slice_by_date(df_filtrado, inicio_dia, fim_dia), path),
             file_name="exportacao_periodo.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            label_gerar="Gerar Excel",
+            label_baixar="Baixar Excel",
+            key="excel_voos",
         )
 
     # ================= REGISTRAR ==================
@@ -511,7 +798,8 @@ def app():
             submitted = st.form_submit_button("Salvar")
 
             if submitted:
-                operador_final = operador_input if op_selecionado == "🆕 Novo Operador..." else op_selecionado
+                # Sem espaços nas pontas, como a base é normalizada: o voo entra no mesmo grupo dos índices por operador
+                operador_final = (operador_input if op_selecionado == "🆕 Novo Operador..." else op_selecionado).strip()
                 
                 if operador_final:
                     data_formatada = data.strftime("%d/%m/%Y")
@@ -521,25 +809,15 @@ def app():
                     # Converte a data do novo registro para datetime para manter consistência no DF em memória
                     novo_memoria = novo.copy()
                     novo_memoria["Data"] = pd.to_datetime(novo_memoria["Data"], dayfirst=True)
-                    st.session_state['df_voos'] = pd.concat([st.session_state['df_voos'], novo_memoria], ignore_index=True)
+                    versao_anterior = utils.get_data_version('df_voos')
+                    set_df_voos(pd.concat([st.session_state['df_voos'], novo_memoria], ignore_index=True))
+                    # Metas, KPIs e eficiência: o voo é somado aos índices por operador × dia, sem remontá-los
+                    versao_nova = utils.get_data_version('df_voos')
+                    utils.advance_prefix_index(versao_anterior, versao_nova, novo_memoria, "Data", ("Operador",), ("Rotas", "Voos"))
+                    utils.advance_prefix_index(versao_anterior, versao_nova, novo_memoria, "Data", ("Operador", "Tipo"), EFICIENCIA_COLS, prepare=efficiency_rows)
                     
-                    # Salva GitHub
-                    # Prepara cópia para salvar com data formatada (DD/MM/YYYY)
-                    df_save = st.session_state['df_voos'].copy()
-                    if "Data" in df_save.columns:
-                        df_save["Data"] = pd.to_datetime(df_save["Data"], errors='coerce').dt.strftime("%d/%m/%Y")
-                    
-                    creds = utils.get_github_connection()
-                    # Lógica para determinar o path (igual estava antes, mas agora usando creds obtidas)
-                    path = "voos.csv"
-                    if creds:
-                        path = creds.get("file_path_drones")
-                        if not path:
-                            base = creds.get("file_path", "")
-                            if "/" in base: path = f"{base.rsplit('/', 1)[0]}/voos.csv"
-                            else: path = "voos.csv"
-                            
-                    salvo_cloud = utils.save_data_to_github(df_save, path, "Atualizando voos via App")
+                    # Salva GitHub (data formatada DD/MM/YYYY)
+                    salvo_cloud = save_voos_to_github(st.session_state['df_voos'])
                     
                     # Salva SQLite (Backup Local)
                     conn = sqlite3.connect(DB_FILE)
@@ -563,54 +841,49 @@ def app():
         st.markdown("## ✏️ Editar Registros")
         st.info("Faça as alterações na tabela abaixo e clique em Salvar. Você pode corrigir erros de digitação ou excluir linhas.")
 
-        # Edição apenas das colunas originais
-        df_edit = st.data_editor(
-            df[COLUNAS_VOOS], 
-            num_rows="dynamic", 
-            width="stretch",
+        # Edição apenas das colunas originais, paginada (só a página atual vai ao navegador)
+        alteracoes = utils.paged_editor(
+            df[COLUNAS_VOOS],
             key="editor_voos",
+            version=utils.get_data_version('df_voos'),
             column_config={
                 "Data": st.column_config.DateColumn(
                     "Data",
                     format="DD/MM/YYYY"
                 )
-            }
+            },
+            search_cols=["Operador", "Tipo", "Obs"],
         )
 
         if st.button("💾 Salvar Alterações"):
             try:
-                df_salvar = df_edit.copy()
-                st.session_state['df_voos'] = df_salvar
-                
-                # Salva GitHub
-                df_save = df_salvar.copy()
-                if "Data" in df_save.columns:
-                    df_save["Data"] = pd.to_datetime(df_save["Data"], errors='coerce').dt.strftime("%d/%m/%Y")
-                
-                creds = utils.get_github_connection()
-                path = "voos.csv"
-                if creds:
-                    path = creds.get("file_path_drones")
-                    if not path:
-                        base = creds.get("file_path", "")
-                        if "/" in base: path = f"{base.rsplit('/', 1)[0]}/voos.csv"
+                # Aplica só as linhas editadas/novas/excluídas na base da sessão
+                df_novo, resumo = utils.apply_row_changes(st.session_state['df_voos'], alteracoes, prepare_voos_rows)
+                if resumo["rejeitadas"]:
+                    st.toast(f"⚠️ {resumo['rejeitadas']} linha(s) inválida(s) não foram aplicadas; os registros originais foram mantidos.")
+                if not (resumo["editadas"] or resumo["novas"] or resumo["removidas"]):
+                    st.info("Nenhuma alteração para salvar.")
+                else:
+                    set_df_voos(df_novo)
+                    df_salvar = st.session_state['df_voos']
                 
-                salvo_cloud = utils.save_data_to_github(df_save, path, "Atualizando voos via App")
+                    # Salva GitHub
+                    salvo_cloud = save_voos_to_github(df_salvar)
                 
-                # Salva SQLite
-                # Garante formato de data string (DD/MM/YYYY) para manter o padrão do banco
-                df_sqlite = df_salvar.copy()
-                df_sqlite["Data"] = pd.to_datetime(df_sqlite["Data"]).dt.strftime("%d/%m/%Y")
-                conn = sqlite3.connect(DB_FILE)
-                df_sqlite.to_sql("voos", conn, if_exists="replace", index=False)
-                conn.close()
+                    # Salva SQLite
+                    # Garante formato de data string (DD/MM/YYYY) para manter o padrão do banco
+                    df_sqlite = df_salvar.copy()
+                    df_sqlite["Data"] = pd.to_datetime(df_sqlite["Data"]).dt.strftime("%d/%m/%Y")
+                    conn = sqlite3.connect(DB_FILE)
+                    df_sqlite.to_sql("voos", conn, if_exists="replace", index=False)
+                    conn.close()
                 
-                if salvo_cloud:
-                    st.success("✅ Banco de dados atualizado e sincronizado com GitHub!")
-                    st.rerun()
-                else:
-                    st.warning("⚠️ Banco de dados atualizado APENAS Localmente. Falha ao salvar no GitHub (verifique credenciais).")
-                    # Não executamos st.rerun() imediatamente para dar tempo de ler o aviso
+                    if salvo_cloud:
+                        st.success("✅ Banco de dados atualizado e sincronizado com GitHub!")
+                        st.rerun()
+                    else:
+                        st.warning("⚠️ Banco de dados atualizado APENAS Localmente. Falha ao salvar no GitHub (verifique credenciais).")
+                        # Não executamos st.rerun() imediatamente para dar tempo de ler o aviso
             except Exception as e:
                 st.error(f"Erro ao salvar: {e}")
 
@@ -632,6 +905,7 @@ def app():
                     st.error("❌ Credenciais não encontradas.")
                 else:
                     try:
+                        from github import Github
                         g = Github(creds["token"])
                         repo = g.get_repo(creds["repo"])
                         branch = creds.get("branch", "main")
@@ -663,6 +937,7 @@ def app():
                 st.dataframe(base.head())
                 
                 modo = st.radio("Modo de Importação", ["Unificar (Adicionar aos dados existentes)", "Substituir (Apagar dados antigos)"])
+                atualizar = st.checkbox("Atualizar registros existentes", disabled="Substituir" in modo, help="Mesma data e operador com outros valores substitui o registro da base.")
                 
                 if st.button("✅ Confirmar Importação"):
                     conn = sqlite3.connect(DB_FILE)
@@ -678,28 +953,16 @@ def app():
                     df_novo["Operador"] = df_novo["Operador"].astype(str).str.strip()
                     
                     if "Unificar" in modo:
-                        combined = pd.concat([st.session_state['df_voos'], df_novo], ignore_index=True)
-                        # Garante que os dados originais também estejam limpos para comparação
-                        combined["Operador"] = combined["Operador"].astype(str).str.strip()
-                        # Remove duplicatas exatas para evitar repetição de dados ao importar o mesmo arquivo
-                        st.session_state['df_voos'] = combined.drop_duplicates()
+                        # Só as linhas novas são hasheadas e consultadas no índice da base (espaços e datas já normalizados no hash)
+                        novo, indice, resumo = utils.upsert_rows('df_voos', df_novo, key_cols=UPSERT_KEY_COLS if atualizar else None, sort_col="Data")
+                        set_df_voos(novo)
+                        utils.remember_row_index('df_voos', indice)
+                        st.info(f"{resumo['novas']} novos, {resumo['atualizadas']} atualizados, {resumo['ignoradas']} já existentes (ignorados).")
                     else:
-                        st.session_state['df_voos'] = df_novo
+                        set_df_voos(df_novo)
                     
                     # Salva GitHub e SQLite
-                    df_save = st.session_state['df_voos'].copy()
-                    if "Data" in df_save.columns:
-                        df_save["Data"] = pd.to_datetime(df_save["Data"], errors='coerce').dt.strftime("%d/%m/%Y")
-                        
-                    creds = utils.get_github_connection()
-                    path = "voos.csv"
-                    if creds:
-                        path = creds.get("file_path_drones")
-                        if not path:
-                            base = creds.get("file_path", "")
-                            if "/" in base: path = f"{base.rsplit('/', 1)[0]}/voos.csv"
-                    
-                    salvo_github = utils.save_data_to_github(df_save, path, "Importando dados via App")
+                    salvo_github = save_voos_to_github(st.session_state['df_voos'], "Importando dados via App")
                     
                     # Para SQLite, converte data para string
                     df_sqlite = st.session_state['df_voos'].copy()
@@ -720,18 +983,14 @@ def app():
             st.download_button("⬇️ Baixar CSV (Planilha)", csv, "voos_backup.csv", "text/csv")
             
             # Botão DB
-            # Verifica se o arquivo existe antes de abrir. Se não existir (ambiente cloud), recria a partir da memória.
-            if not os.path.exists(DB_FILE):
-                conn = sqlite3.connect(DB_FILE)
-                df_temp = st.session_state['df_voos'].copy()
-                if "Data" in df_temp.columns:
-                    df_temp["Data"] = pd.to_datetime(df_temp["Data"]).dt.strftime("%d/%m/%Y")
-                df_temp.to_sql("voos", conn, if_exists="replace", index=False)
-                conn.close()
-
-            if os.path.exists(DB_FILE):
-                with open(DB_FILE, "rb") as f:
-                    st.download_button("⬇️ Baixar Banco de Dados (.db)", f, "voos.db", "application/octet-stream")
+            # Gerado só no clique: cópia do voos.db como está (as gravações o mantêm atualizado)
+            versao_backup = utils.get_data_version('df_voos')
+            st.download_button(
+                "⬇️ Baixar Banco de Dados (.db)",
+                lambda: reports.sqlite_backup_bytes(DB_FILE, versao_backup),
+                "voos.db",
+                "application/octet-stream"
+            )
 
     # ================= MAPA ==================
     if menu == "Mapa":
@@ -740,14 +999,9 @@ def app():
             st.stop()
 
         st.markdown("## 🗺️ Galpão Casas Bahia")
-        mapa = folium.Map(
-            location=[LAT, LON], 
-            zoom_start=17, 
-            tiles="https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}", 
-            attr="Esri World Imagery"
-        )
-        folium.Marker([LAT,LON], popup="CD - 1401 ", tooltip="Casas Bahia").add_to(mapa)
-        st_folium(mapa, width="stretch")
+        # Importado só aqui: o mapa é a única tela que usa folium. Tiles e HTML vêm do cache offline (maptiles.py)
+        import maptiles
+        maptiles.render_map(LAT, LON, zoom=17, popup="CD - 1401 ", tooltip="Casas Bahia")
 
     # ================= PDF ==================
     if menu == "Relatório PDF":
@@ -755,23 +1009,35 @@ def app():
             st.warning("🔒 Faça login para gerar relatórios.")
             st.stop()
 
-        st.dataframe(df)
-        if st.button("Gerar PDF"):
-            pdf = FPDF()
-            pdf.add_page()
-            pdf.set_font("Arial","B",14)
-            pdf.cell(0,10,"Relatório de Voos - Casas Bahia", ln=True)
-            pdf.set_font("Arial","",10)
+        st.markdown("## 📄 Relatório PDF")
 
-            for _, r in df.iterrows():
-                pdf.cell(0,8,f"{r['Operador']} - {r['Voos']} voos - {r['Rotas']} rotas", ln=True)
-
-            pdf.cell(0,10,"Desenvolvido por Clayton S. Silva", ln=True)
-            
-            # Gera o PDF em memória (string) e converte para bytes (latin-1 é o padrão do FPDF)
-            pdf_bytes = pdf.output(dest='S').encode('latin-1')
-            
-            st.download_button("⬇️ Baixar PDF", data=pdf_bytes, file_name="relatorio_voos.pdf", mime="application/pdf")
+        # Filtros do relatório (período e operadores)
+        ops_pdf = sorted(df["Operador"].fillna("Não Informado").astype(str).str.strip().unique().tolist())
+        if not df.empty and df["Data"].notna().any():
+            min_pdf, max_pdf = df["Data"].min().date(), df["Data"].max().date()
+        else:
+            min_pdf = max_pdf = datetime.now().date()
+
+        c_pdf1, c_pdf2 = st.columns(2)
+        periodo_pdf = c_pdf1.date_input("Período", value=(min_pdf, max_pdf), min_value=min_pdf, max_value=max_pdf, format="DD/MM/YYYY", key="pdf_periodo")
+        sel_ops_pdf = c_pdf2.multiselect("Operadores", ops_pdf, default=ops_pdf, key="pdf_operadores")
+
+        inicio_pdf = periodo_pdf[0] if len(periodo_pdf) > 0 else None
+        fim_pdf = periodo_pdf[1] if len(periodo_pdf) > 1 else inicio_pdf
+
+        # Geração em segundo plano: o PDF fica em cache por (filtros, versão dos dados)
+        reports.report_panel(
+            "pdf_voos",
+            {"inicio": inicio_pdf, "fim": fim_pdf, "operadores": sorted(sel_ops_pdf)},
+            utils.get_data_version('df_voos'),
+            ".pdf",
+            lambda path: reports.build_flights_pdf(df, inicio_pdf, fim_pdf, sel_ops_pdf, path=path),
+            file_name="relatorio_voos.pdf",
+            mime="application/pdf",
+            label_gerar="Gerar PDF",
+            label_baixar="⬇️ Baixar PDF",
+            key="pdf_voos",
+        )
 
     # ================= SAIR ==================
     if menu == "Sair":
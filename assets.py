@@ -0,0 +1,81 @@
+import streamlit as st
+import io
+import os
+import re
+import base64
+import hashlib
+import mimetypes
+
+# Módulo leve (sem pandas/plotly): usado pela Home, que deve abrir rápido.
+
+# --- ASSETS ESTÁTICOS (IMAGENS E CSS EM CACHE POR PROCESSO) ---
+# Com server.enableStaticServing (ver .streamlit/config.toml) as imagens são publicadas em static/
+# com o hash no nome: o navegador guarda em cache e a página não carrega mais o GIF embutido no HTML.
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+
+def _resize_image(data, max_width):
+    """Reduz a imagem (incluindo GIF animado) para no máximo `max_width` pixels de largura."""
+    try:
+        from PIL import Image, ImageSequence
+        img = Image.open(io.BytesIO(data))
+        if img.width <= max_width:
+            return data
+        altura = round(img.height * max_width / img.width)
+        out = io.BytesIO()
+        if getattr(img, "is_animated", False):
+            frames, duracoes = [], []
+            for frame in ImageSequence.Iterator(img):
+                duracoes.append(frame.info.get("duration", 60))
+                frames.append(frame.convert("RGBA").resize((max_width, altura), Image.LANCZOS))
+            frames[0].save(out, format="GIF", save_all=True, append_images=frames[1:], duration=duracoes,
+                           loop=img.info.get("loop", 0), disposal=2, optimize=True)
+        else:
+            img.resize((max_width, altura), Image.LANCZOS).save(out, format=img.format)
+        reduzido = out.getvalue()
+        return reduzido if len(reduzido) < len(data) else data
+    except Exception:
+        return data
+
+@st.cache_resource(show_spinner=False)
+def _prepare_asset(path, mtime_ns, size, max_width):
+    """Lê, reduz e publica o asset uma única vez (mtime/tamanho na chave: se o arquivo mudar, refaz)."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if max_width:
+        data = _resize_image(data, max_width)
+    digest = hashlib.sha1(data).hexdigest()[:12]
+    nome, ext = os.path.splitext(os.path.basename(path))
+
+    if st.get_option("server.enableStaticServing"):
+        try:
+            os.makedirs(STATIC_DIR, exist_ok=True)
+            arquivo = f"{nome}.{max_width or 'orig'}.{digest}{ext}"
+            destino = os.path.join(STATIC_DIR, arquivo)
+            if not os.path.exists(destino):
+                # Remove versões antigas do mesmo asset
+                for antigo in os.listdir(STATIC_DIR):
+                    if antigo.startswith(f"{nome}.{max_width or 'orig'}.") and antigo.endswith(ext):
+                        os.remove(os.path.join(STATIC_DIR, antigo))
+                with open(destino, "wb") as f:
+                    f.write(data)
+            return f"app/static/{arquivo}"
+        except OSError:
+            pass
+
+    # Fallback: data URI (ainda assim lido e codificado só uma vez por processo)
+    mime = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    return f"data:{mime};base64,{base64.b64encode(data).decode()}"
+
+def get_asset_url(path, max_width=None):
+    """URL para <img src>: arquivo estático versionado pelo hash ou data URI. None se o arquivo não existir."""
+    if not os.path.exists(path):
+        return None
+    info = os.stat(path)
+    return _prepare_asset(path, info.st_mtime_ns, info.st_size, max_width)
+
+@st.cache_resource(show_spinner=False)
+def minify_css(css):
+    """Remove comentários e espaços do CSS (calculado uma vez por processo)."""
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    return re.sub(r"\s*([{};:,>])\s*", r"\1", css).strip()
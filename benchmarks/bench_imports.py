@@ -0,0 +1,67 @@
+"""
+Benchmark de importação: quanto cada módulo de página custa no cold start.
+
+Cada módulo é importado em um processo Python novo (python -X importtime),
+repetido algumas vezes; reporta o menor tempo e as dependências mais pesadas.
+
+Uso:
+    python benchmarks/bench_imports.py [--repeat 3] [--json resultado.json]
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ["assets", "utils", "reports", "dashboard", "app"]
+LINHA = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+def profile_import(module):
+    """
+    Importa `module` em um processo novo.
+    Retorna (total em µs, {dependência direta: µs acumulados}).
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_DIR, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Falha ao importar {module}: {proc.stderr.strip().splitlines()[-1]}")
+    filhos = {}
+    for linha in proc.stderr.splitlines():
+        m = LINHA.match(linha)
+        if not m:
+            continue
+        nivel, nome, acumulado = len(m.group(3)), m.group(4), int(m.group(2))
+        # O importtime lista as dependências antes do módulo que as importou, com indentação maior
+        if nivel == 1:
+            if nome == module:
+                return acumulado, filhos
+            filhos = {}
+        elif nivel == 3:
+            filhos[nome] = acumulado
+    raise RuntimeError(f"{module} não aparece na saída do importtime")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="Grava o resultado em JSON")
+    args = parser.parse_args()
+
+    resultado = {}
+    for module in MODULES:
+        execucoes = [profile_import(module) for _ in range(args.repeat)]
+        total, filhos = min(execucoes, key=lambda e: e[0])
+        pesados = sorted(filhos.items(), key=lambda kv: -kv[1])[:5]
+        resultado[module] = {"total_ms": round(total / 1000, 1), "dependencias_ms": {k: round(v / 1000, 1) for k, v in pesados}}
+        deps = ", ".join(f"{k} {v / 1000:.0f}ms" for k, v in pesados)
+        print(f"{module:<12} {total / 1000:8.1f} ms   ({deps})")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+Benchmark do pipeline de dados: carga, limpeza, filtros, agregações, classificação de
+ocorrências, exportações e gravação, com bases sintéticas de 10k a 10M linhas.
+
+Roda offline: o GitHub é substituído pelo armazenamento local (utils.LocalStorage,
+PORTAL_STORAGE=local) e os bancos SQLite ficam em um diretório temporário. Cada etapa é repetida --repeat vezes
+e reporta o menor tempo.
+
+Os resultados são gravados em benchmarks/resultados/<nome>.json; --baseline compara com uma
+execução anterior e termina com código 1 se alguma etapa ficar mais lenta que a tolerância.
+
+Uso:
+    python benchmarks/bench_pipeline.py [--sizes 10k,100k,1M] [--repeat 3]
+                                        [--save nome] [--baseline nome|arquivo.json] [--tolerance 0.25]
+                                        [--latency-ms 0] [--writers 4] [--max-export-rows 20000]
+    python benchmarks/bench_pipeline.py --sizes 10M --repeat 1    # base grande (vários GB de RAM)
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, "resultados")
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import pandas as pd
+import streamlit.config
+import streamlit.logger
+import synthetic
+
+def medir(func, repeat, setup=None):
+    """Menor tempo (s) de `repeat` chamadas de func(*setup()); o setup não entra na medição."""
+    melhor = float("inf")
+    for _ in range(repeat):
+        args = setup() if setup else ()
+        inicio = time.perf_counter()
+        func(*args)
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor
+
+class Upload(io.BytesIO):
+    """Arquivo enviado pelo st.file_uploader (nome + bytes)."""
+
+    def __init__(self, conteudo, name):
+        super().__init__(conteudo)
+        self.name = name
+
+def sqlite_roundtrip(df, db_path, table):
+    with closing(sqlite3.connect(db_path)) as conn:
+        df.to_sql(table, conn, if_exists="replace", index=False)
+        return pd.read_sql(f"SELECT * FROM {table}", conn)
+
+def concurrent_saves(storage, path, content, writers):
+    """`writers` gravações simultâneas com o SHA lido antes (como sessões salvando ao mesmo tempo)."""
+    import utils
+
+    def gravar(_):
+        sha = storage.read(path)[1]
+        try:
+            storage.write(path, content, "bench", sha=sha)
+            return 0
+        except utils.StorageConflict:
+            return 1
+    with ThreadPoolExecutor(writers) as pool:
+        return sum(pool.map(gravar, range(writers)))
+
+def bench_logistics(n, args, workdir):
+    import dashboard
+    import reports
+    import utils
+
+    bruto = synthetic.make_logistics(n)
+    csv = bruto.to_csv(index=False).encode("utf-8")
+    caminho_csv = utils.resolve_storage_path("file_path")
+    etapas = {}
+    etapas["github.salvar"] = medir(lambda: utils.save_data_to_github(bruto, caminho_csv), args.repeat)
+    etapas["github.salvar_concorrente"] = medir(
+        lambda: concurrent_saves(utils.get_storage(), caminho_csv, csv, args.writers), args.repeat)
+    etapas["github.carregar"] = medir(lambda: utils.load_data_from_github("file_path"), args.repeat)
+    etapas["load_data.csv"] = medir(dashboard.load_data, args.repeat, lambda: (Upload(csv, "dados.csv"),))
+    etapas["clean_dataframe"] = medir(dashboard.clean_dataframe, args.repeat, lambda: (bruto.copy(),))
+
+    df = dashboard.clean_dataframe(bruto.copy())
+    etapas["versao_dados"] = medir(lambda: utils.compute_data_version(df), args.repeat)
+    fim = df["DATA"].max()
+    inicio = fim - pd.Timedelta(days=90)
+    anos = df["DATA"].dt.year.unique()
+    transportadoras = synthetic.TRANSPORTADORAS[:6]
+
+    def filtrar():
+        # Mesma máscara do dashboard (dashboard.app, "APLICAÇÃO DOS FILTROS")
+        return df[
+            (df['DATA'].dt.year.isin(anos)) &
+            (df['DATA'] >= inicio) &
+            (df['DATA'] <= fim) &
+            (df['OPERAÇÃO'].isin(synthetic.OPERACOES)) &
+            (df['TRANSPORTADORA'].isin(transportadoras))
+        ].copy()
+    etapas["filtro.mascara"] = medir(filtrar, args.repeat)
+    ordenado = utils.sort_by_date(df, "DATA")
+    etapas["filtro.slice_by_date"] = medir(lambda: utils.slice_by_date(ordenado, inicio, fim, col="DATA"), args.repeat)
+
+    df["Mês_Ano"] = df["DATA"].dt.strftime("%Y-%m")
+    df["Ano"] = df["DATA"].dt.strftime("%Y")
+    etapas["agg.ranking"] = medir(lambda: df.groupby("TRANSPORTADORA")["LIBERADOS"].sum().reset_index(), args.repeat)
+    etapas["agg.dia_semana"] = medir(
+        lambda: df.assign(Dia_Semana=df["DATA"].dt.day_name()).groupby(["Dia_Semana", "TRANSPORTADORA"])[["LIBERADOS", "MALHA"]].sum(),
+        args.repeat)
+    etapas["agg.mes"] = medir(lambda: df.groupby(["Mês_Ano", "TRANSPORTADORA"])[["LIBERADOS", "MALHA"]].sum().reset_index(), args.repeat)
+    etapas["agg.ano"] = medir(lambda: df.groupby(["Ano", "TRANSPORTADORA"])[["LIBERADOS", "MALHA"]].sum().reset_index(), args.repeat)
+    etapas["agg.chart_series"] = medir(
+        lambda: utils.chart_series(df, ["LIBERADOS", "MALHA"], ["TRANSPORTADORA"], col="DATA"), args.repeat)
+
+    exportar = df.tail(args.max_export_rows)
+    caminho = os.path.join(workdir, "relatorio.xlsx")
+    etapas["export.excel"] = medir(lambda: reports.export_excel(exportar, caminho), args.repeat)
+    etapas["sqlite.roundtrip"] = medir(
+        lambda: sqlite_roundtrip(df[bruto.columns], os.path.join(workdir, "dados.db"), dashboard.TABLE_NAME), args.repeat)
+    return etapas
+
+def bench_flights(n, args, workdir):
+    import app
+    import reports
+    import utils
+
+    bruto = synthetic.make_flights(n)
+    etapas = {}
+    etapas["github.salvar"] = medir(lambda: utils.save_data_to_github(bruto, utils.resolve_storage_path("file_path_drones")), args.repeat)
+    # Sem o st.cache_data: mede a leitura + conversão de tipos + ordenação
+    carregar = app.load_initial_flights.__wrapped__
+    etapas["github.carregar"] = medir(carregar, args.repeat)
+    df = carregar()
+    etapas["ocorrencias"] = medir(lambda: app.get_occurrence_categories.__wrapped__(df, "bench"), args.repeat)
+
+    fim = df["Data"].max()
+    inicio = fim - pd.Timedelta(days=90)
+    operadores = synthetic.OPERADORES[:5]
+    etapas["filtro"] = medir(lambda: utils.slice_by_date(df[df["Operador"].isin(operadores)], inicio, fim), args.repeat)
+    etapas["agg.operador"] = medir(lambda: df.groupby("Operador")[["Rotas", "Voos"]].sum().reset_index(), args.repeat)
+    etapas["agg.mes"] = medir(lambda: utils.aggregate_by_grain(df, "M", ["Rotas", "Voos"], ["Operador"]), args.repeat)
+    etapas["formatar.armazenamento"] = medir(lambda: app.format_voos_for_storage(df), args.repeat)
+
+    exportar = df.tail(args.max_export_rows)
+    caminho = os.path.join(workdir, "voos.pdf")
+    etapas["export.pdf"] = medir(lambda: reports.build_flights_pdf(exportar, path=caminho), args.repeat)
+    etapas["persistir.github"] = medir(lambda: app.save_voos_to_github(df), args.repeat)
+    etapas["sqlite.roundtrip"] = medir(
+        lambda: sqlite_roundtrip(app.format_voos_for_storage(df), os.path.join(workdir, "voos.db"), "voos"), args.repeat)
+    return etapas
+
+BENCHES = {"logistica": bench_logistics, "drones": bench_flights}
+
+def resolve_baseline(nome):
+    if os.path.exists(nome):
+        return os.path.abspath(nome)
+    return os.path.join(RESULTS_DIR, f"{nome}.json")
+
+def compare(resultados, baseline, tolerancia):
+    """Imprime a variação por etapa e devolve a lista de regressões acima da tolerância."""
+    regressoes = []
+    for chave, segundos in resultados.items():
+        anterior = baseline.get(chave)
+        if not anterior:
+            continue
+        variacao = segundos / anterior - 1
+        marca = ""
+        if variacao > tolerancia:
+            marca = "  <-- REGRESSÃO"
+            regressoes.append(chave)
+        print(f"{chave:<45} {anterior * 1000:10.1f} -> {segundos * 1000:10.1f} ms  ({variacao:+.0%}){marca}")
+    return regressoes
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10k,100k,1M", help="Tamanhos separados por vírgula (10k, 100k, 1M, 10M ou números)")
+    parser.add_argument("--only", choices=list(BENCHES), help="Roda só uma das bases")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--latency-ms", type=float, default=0, help="Latência simulada por chamada ao armazenamento local")
+    parser.add_argument("--writers", type=int, default=4, help="Gravações simultâneas em github.salvar_concorrente")
+    parser.add_argument("--max-export-rows", type=int, default=20_000, help="Linhas enviadas ao Excel/PDF (as mais recentes)")
+    parser.add_argument("--save", default=datetime.now().strftime("pipeline_%Y%m%d_%H%M%S"), help="Nome do arquivo de resultados")
+    parser.add_argument("--baseline", help="Resultado anterior (nome em benchmarks/resultados ou caminho) para comparar")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Aumento relativo aceito antes de acusar regressão")
+    args = parser.parse_args()
+
+    # Sem os avisos de "bare mode" a cada st.* (a opção vale quando o Streamlit relê a configuração)
+    streamlit.config.set_option("logger.level", "error")
+    streamlit.logger.set_log_level("error")
+    baseline_path = resolve_baseline(args.baseline) if args.baseline else None
+    workdir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    os.environ.update(PORTAL_STORAGE="local", PORTAL_STORAGE_DIR=os.path.join(workdir, "storage"),
+                      PORTAL_STORAGE_LATENCY_MS=str(args.latency_ms), PORTAL_STORAGE_RATE_LIMIT="0")
+    os.chdir(workdir)  # bancos SQLite e caches de relatório relativos ficam no diretório temporário
+
+    resultados = {}
+    for texto in args.sizes.split(","):
+        n = synthetic.parse_size(texto.strip())
+        for nome, bench in BENCHES.items():
+            if args.only and nome != args.only:
+                continue
+            for etapa, segundos in bench(n, args, workdir).items():
+                chave = f"{nome}.{texto.strip()}.{etapa}"
+                resultados[chave] = segundos
+                print(f"{chave:<45} {segundos * 1000:10.1f} ms", flush=True)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    destino = os.path.join(RESULTS_DIR, f"{args.save}.json")
+    meta = {"data": datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(),
+            "pandas": pd.__version__, "maquina": platform.machine(), "repeat": args.repeat,
+            "latency_ms": args.latency_ms, "max_export_rows": args.max_export_rows}
+    with open(destino, "w", encoding="utf-8") as f:
+        json.dump({"meta": meta, "resultados": resultados}, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados gravados em {destino}")
+
+    if baseline_path:
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)["resultados"]
+        print("\nComparação com a execução anterior:")
+        regressoes = compare(resultados, baseline, args.tolerance)
+        if regressoes:
+            print(f"\n{len(regressoes)} etapa(s) acima da tolerância de {args.tolerance:.0%}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Geradores de dados sintéticos para os benchmarks, no formato das bases reais.
+
+- make_logistics(n): igual ao dados_logistica.csv
+  (DATA, TRANSPORTADORA, OPERAÇÃO, LIBERADOS, MALHA, TOTAL TRANSPORTADORAS)
+- make_flights(n):   igual ao voos.csv (Data, Operador, Tipo, Rotas, Voos, Obs)
+
+Os dados são gerados "crus", como chegam de um upload ou do CSV do GitHub
+(datas em texto DD/MM/YYYY), para que a limpeza e a conversão de tipos entrem na medição.
+Mesma semente = mesmos dados, para comparar execuções.
+"""
+import numpy as np
+import pandas as pd
+
+TRANSPORTADORAS = ["FE", "DMD", "Zumpy", "ASSIS", "PJ", "JCM", "REU", "Riviera", "TRILOG", "Zoom"]
+OPERACOES = ["LML", "Direta"]
+OPERADORES = ["EDNALDO", "EDUARDO", "MAYARA", "JAKSON", "ROBERTA", "RODRIGO", "VALÉRIA", "SABRINA"]
+TIPOS = ["FIXO", "RESERVA"]
+# Observações com e sem palavras-chave de ocorrência (ver app.OCORRENCIA_KEYWORDS)
+OBSERVACOES = [
+    "", "", "", "", "SEM INFORMAÇAO", "OPERADOR RESERVA", "FALTA", "BRICKS",
+    "NÃO FORAM REALIZADOS OS VOOS DEVIDO Á CHUVA",
+    "ZOOM DA AERONAVE NÃO ESTÁ FUNCIONANDO",
+    "VOO NÃO FOI FEITO DEVIDO AO DDS COM A COORDENAÇÃO",
+    "INTERROMPIDO POR FOGOS",
+]
+INICIO = "2020-01-01"
+SIZES = {"10k": 10_000, "100k": 100_000, "1M": 1_000_000, "10M": 10_000_000}
+
+def parse_size(texto):
+    """'10k', '1M' ou um número inteiro."""
+    return SIZES.get(texto) or int(texto)
+
+def _datas(n, por_dia):
+    """n datas em texto DD/MM/YYYY, `por_dia` linhas por dia, em ordem cronológica."""
+    dias = pd.date_range(INICIO, periods=-(-n // por_dia), freq="D").strftime("%d/%m/%Y").to_numpy()
+    return np.repeat(dias, por_dia)[:n]
+
+def make_logistics(n, seed=0):
+    """Base de logística: uma linha por (dia, transportadora, operação)."""
+    rng = np.random.default_rng(seed)
+    por_dia = len(TRANSPORTADORAS) * len(OPERACOES)
+    combinacoes = np.arange(n) % por_dia
+    liberados = rng.integers(0, 80, n)
+    malha = rng.binomial(liberados + 2, 0.09)
+    return pd.DataFrame({
+        "DATA": _datas(n, por_dia),
+        "TRANSPORTADORA": np.array(TRANSPORTADORAS)[combinacoes // len(OPERACOES)],
+        "OPERAÇÃO": np.array(OPERACOES)[combinacoes % len(OPERACOES)],
+        "LIBERADOS": liberados,
+        "MALHA": malha,
+        "TOTAL TRANSPORTADORAS": liberados + malha,
+    })
+
+def make_flights(n, seed=0):
+    """Base de voos: uma linha por (dia, operador)."""
+    rng = np.random.default_rng(seed)
+    voos = rng.integers(0, 18, n).astype(float)
+    return pd.DataFrame({
+        "Data": _datas(n, len(OPERADORES)),
+        "Operador": np.array(OPERADORES)[np.arange(n) % len(OPERADORES)],
+        "Tipo": rng.choice(TIPOS, n),
+        "Rotas": (voos * rng.uniform(2, 3.2, n)).round(),
+        "Voos": voos,
+        "Obs": rng.choice(OBSERVACOES, n),
+    })
@@ -2,13 +2,14 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-import io
 import os
 import tempfile
-from github import Github, GithubException
 from sqlalchemy import create_engine, inspect
 from pandas.api.types import is_datetime64_any_dtype
 import utils # Importa o novo módulo
+import reports
+import perf
+import anomalies
 
 # --- Configuração da Página ---
 # st.set_page_config removido para funcionar no projeto unificado
@@ -27,17 +28,98 @@ TABLE_NAME = 'performance_logistica'
 
 # @st.cache_resource: Otimização de performance.
 # Mantém a conexão com o banco aberta na memória para não reconectar a cada clique do usuário.
+# Criada apenas no primeiro uso (não no import do módulo).
 @st.cache_resource
 def get_database_engine(url):
     return create_engine(url)
 
-engine = get_database_engine(DATABASE_URL)
-
 # --- FUNÇÕES PARA GITHUB (PERSISTÊNCIA NA NUVEM) ---
 # Funções movidas para utils.py para evitar duplicação
 
+# --- CARREGAMENTO INICIAL (COMPARTILHADO ENTRE SESSÕES) ---
+# A base é lida uma vez por processo (GitHub > SQLite > dados.xlsx) e reaproveitada por todas as
+# sessões e pelo warm-up (warmup.py). Cada chamada devolve uma cópia, então a sessão pode alterá-la.
+# Qualquer gravação chama load_initial_data.clear() para que novas sessões leiam a versão salva.
+@st.cache_data(ttl=3600, show_spinner="Carregando dados de logística...")
+@perf.traced("dashboard.load_initial_data")
+def load_initial_data():
+    try:
+        # Tenta ler do GitHub primeiro (se configurado)
+        df_start = utils.load_data_from_github("file_path")
+        
+        if df_start is None:
+            # Se não tem GitHub ou falhou, tenta ler do banco local (SQLite)
+            try:
+                df_start = pd.read_sql(f"SELECT * FROM {TABLE_NAME}", con=get_database_engine(DATABASE_URL), parse_dates=['DATA'])
+            except:
+                df_start = pd.DataFrame()
+            
+            # Se o banco estiver vazio ou falhar, tenta ler o Excel local (igual ao teste_validacao.py)
+            if df_start.empty and os.path.exists('dados.xlsx'):
+                try:
+                    df_start = pd.read_excel('dados.xlsx')
+                except Exception:
+                    pass
+            
+        # Garante tipos corretos
+        df_start.columns = df_start.columns.str.strip().str.upper()
+        if 'DATA' in df_start.columns:
+            df_start['DATA'] = pd.to_datetime(df_start['DATA'])
+        return df_start
+    except Exception:
+        # Se der erro (ex: banco não existe), inicia vazio
+        return pd.DataFrame(columns=['DATA', 'TRANSPORTADORA', 'OPERAÇÃO', 'LIBERADOS', 'MALHA'])
+
+@perf.traced("dashboard.persist_dados")
+def persist_dados(df, commit_message="Atualizando dados", versao_anterior=None, novos=None):
+    """
+    Salva a base da sessão (st.session_state['df_dados']) no GitHub e no SQLite local e invalida o
+    carregamento compartilhado. Com versao_anterior (versão antes da alteração), avisa o motor de
+    anomalias: novos = só as linhas acrescentadas; None = dados antigos editados (motor remontado).
+    """
+    salvo = utils.save_data_to_github(df, utils.resolve_storage_path("file_path"), commit_message)
+    # Sempre grava o SQLite também (como o voos.db dos drones): é a fonte no modo local e o que o backup .db copia
+    df.to_sql(TABLE_NAME, get_database_engine(DATABASE_URL), if_exists='replace', index=False)
+    load_initial_data.clear()
+    if versao_anterior is not None:
+        limpos = clean_dataframe(novos.copy()) if novos is not None else None
+        anomalies.advance_engine(versao_anterior, utils.get_data_version('df_dados'), limpos)
+    return salvo
+
+def warmup_steps():
+    """
+    Etapas de pré-aquecimento desta página (executadas por warmup.py, em ordem): [(nome, função)].
+    Base carregada e limpa como numa sessão; índices, motor de anomalias e auditoria do sorteio ficam
+    nos caches por versão com a mesma chave que as sessões usam (compute_data_version da base carregada).
+    """
+    base = {}
+
+    def carregar():
+        base["df"] = load_initial_data()
+        base["versao"] = utils.compute_data_version(base["df"])
+        base["limpo"] = clean_dataframe(base["df"].copy())  # Como load_data() sem upload
+
+    def kpis():
+        df = base["limpo"]
+        utils.prefix_sum_index(df, base["versao"], 'DATA', ('TRANSPORTADORA', 'OPERAÇÃO'), tuple(c for c in NUMERIC_COLS if c in df.columns))
+
+    def sorteio():
+        df = base["limpo"]
+        anomalies.sorteio_audit(df, base["versao"], default_sorteio_prob(df) / 100, "D")
+
+    return [
+        ("logistica.carregar", carregar),
+        ("logistica.kpis", kpis),
+        ("logistica.anomalias", lambda: anomalies.get_engine(base["limpo"], base["versao"])),
+        ("logistica.sorteio", sorteio),
+    ]
+
+# Chave de "mesmo registro" na importação com atualização (upsert)
+UPSERT_KEY_COLS = ['DATA', 'TRANSPORTADORA', 'OPERAÇÃO']
+
 # Função para salvar dados carregados via Upload no banco de dados persistente
-def save_uploaded_data(df, replace=False):
+# key_cols=None ignora apenas linhas idênticas; com UPSERT_KEY_COLS, valores novos substituem o registro existente
+def save_uploaded_data(df, replace=False, key_cols=None):
     try:
         # Colunas esperadas
         expected_cols = ['DATA', 'TRANSPORTADORA', 'OPERAÇÃO', 'LIBERADOS', 'MALHA', 'TOTAL TRANSPORTADORAS']
@@ -45,31 +127,30 @@ def save_uploaded_data(df, replace=False):
         cols_to_save = [c for c in expected_cols if c in df.columns]
         
         if cols_to_save:
+            # Motor de anomalias: só as linhas acrescentadas; substituição e atualizações o remontam (None)
+            versao_anterior = utils.get_data_version('df_dados')
+            novos = None
             if replace:
                 st.session_state['df_dados'] = df[cols_to_save].copy()
             else:
                 if st.session_state['df_dados'].empty:
                     st.session_state['df_dados'] = df[cols_to_save].copy()
                 else:
-                    # Concatena os dados existentes com os novos
-                    df_combined = pd.concat([st.session_state['df_dados'], df[cols_to_save]], ignore_index=True)
-                    
-                    # Remove duplicatas para garantir que apenas dados novos sejam mantidos
-                    rows_before = len(df_combined)
-                    st.session_state['df_dados'] = df_combined.drop_duplicates()
-                    rows_after = len(st.session_state['df_dados'])
-                    
-                    if rows_before > rows_after:
-                        st.sidebar.info(f"ℹ️ {rows_before - rows_after:,.0f}".replace(",", ".") + " registros duplicados foram ignorados (já existiam no banco).")
-            
-            # Tenta salvar no GitHub
-            creds = utils.get_github_connection()
-            path = creds["file_path"] if creds else "dados.csv"
-            salvo_github = utils.save_data_to_github(st.session_state['df_dados'], path, "Atualizando dados via Dashboard")
+                    # Só as linhas do arquivo são hasheadas e consultadas no índice da base
+                    anteriores = len(st.session_state['df_dados'])
+                    novo, indice, resumo = utils.upsert_rows('df_dados', df[cols_to_save], key_cols=key_cols)
+                    st.session_state['df_dados'] = novo
+                    utils.remember_row_index('df_dados', indice)
+                    if not resumo["atualizadas"]:
+                        novos = novo.iloc[anteriores:]  # Sem atualizações, as linhas novas vêm no fim
+
+                    if resumo["atualizadas"]:
+                        st.sidebar.info(f"ℹ️ {resumo['atualizadas']:,.0f}".replace(",", ".") + " registros existentes foram atualizados.")
+                    if resumo["ignoradas"]:
+                        st.sidebar.info(f"ℹ️ {resumo['ignoradas']:,.0f}".replace(",", ".") + " registros duplicados foram ignorados (já existiam no banco).")
             
-            # Salva no banco local também (backup/cache)
-            if not salvo_github:
-                st.session_state['df_dados'].to_sql(TABLE_NAME, engine, if_exists='replace', index=False)
+            # Tenta salvar no GitHub (ou no banco local, como backup)
+            persist_dados(st.session_state['df_dados'], "Atualizando dados via Dashboard", versao_anterior, novos)
                 
             st.sidebar.success(f"✅ Dados atualizados e salvos!")
         else:
@@ -77,7 +158,20 @@ def save_uploaded_data(df, replace=False):
     except Exception as e:
         st.sidebar.error(f"❌ Erro ao salvar: {e}")
 
+# --- TOTAIS DOS KPIS ---
+def kpi_totals(totais):
+    """(veículos, liberados, malha, taxa de malha %) a partir dos totais de um período."""
+    total_liberados = totais.get('LIBERADOS', 0)
+    total_malha = totais.get('MALHA', 0)
+    # Usa a coluna de Total do Excel se existir (para bater com o relatório), senão calcula a soma
+    total_veiculos = totais.get('TOTAL TRANSPORTADORAS', 0)
+    if not total_veiculos > 0:
+        total_veiculos = total_liberados + total_malha
+    taxa_malha = (total_malha / total_veiculos * 100) if total_veiculos > 0 else 0
+    return total_veiculos, total_liberados, total_malha, taxa_malha
+
 # Função CRÍTICA: Limpeza de dados. É aqui que corrigimos erros comuns de digitação e formatação.
+@perf.traced("dashboard.clean_dataframe")
 def clean_dataframe(df: pd.DataFrame) -> pd.DataFrame:
     """Realiza a limpeza e padronização dos dados."""
     # Padronizar nomes das colunas
@@ -128,6 +222,7 @@ def clean_dataframe(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 # Função robusta para ler diferentes tipos de arquivo (CSV, Excel, SQLite)
+@perf.traced("dashboard.load_data")
 def load_data(uploaded_file=None):
     df = None
     # 1. Tenta carregar do upload
@@ -188,6 +283,40 @@ def load_data(uploaded_file=None):
 
     return df
 
+# --- EDIÇÃO POR DIFERENÇA (st.data_editor) ---
+# O editor (utils.paged_editor) devolve só o que mudou, por rótulo do índice da base:
+# {"edited_rows": {rótulo: {coluna: valor}}, "added_rows": [{coluna: valor}], "deleted_rows": [rótulo]}.
+# Salvar aplica essa diferença na base e limpa apenas as linhas alteradas/novas.
+NUMERIC_COLS = ['LIBERADOS', 'MALHA', 'TOTAL TRANSPORTADORAS']
+
+def _prepare_changed_rows(linhas):
+    """Deixa as linhas alteradas no formato de entrada do clean_dataframe (datas DD/MM/AAAA, números numéricos)."""
+    if 'DATA' in linhas.columns:
+        # O editor devolve datas ISO (AAAA-MM-DD); o clean_dataframe lê com dayfirst
+        datas = pd.to_datetime(linhas['DATA'], errors='coerce', format='mixed')
+        linhas['DATA'] = datas.dt.strftime('%d/%m/%Y').fillna('')
+    for col in NUMERIC_COLS:
+        if col in linhas.columns:
+            linhas[col] = pd.to_numeric(linhas[col], errors='coerce')
+    return linhas
+
+def apply_editor_changes(df_full, changes):
+    """Aplica o change set do editor em df_full. Devolve (nova base ordenada por DATA, resumo)."""
+    editadas = changes.get("edited_rows", {})
+
+    def preparar(linhas):
+        linhas = clean_dataframe(_prepare_changed_rows(linhas))
+        # Total da linha acompanha Liberados + Malha quando um deles muda (ou a linha é nova)
+        if 'TOTAL TRANSPORTADORAS' in df_full.columns:
+            recalcular = [label not in editadas or bool({'LIBERADOS', 'MALHA'} & set(editadas[label])) for label in linhas.index]
+            total = linhas['LIBERADOS'].fillna(0) + linhas['MALHA'].fillna(0)
+            linhas['TOTAL TRANSPORTADORAS'] = total.where(recalcular, linhas['TOTAL TRANSPORTADORAS'])
+        return linhas
+
+    df_novo, resumo = utils.apply_row_changes(df_full, changes, preparar)
+    # Base quase ordenada: a ordenação estável só reposiciona as linhas alteradas
+    return df_novo.sort_values(by='DATA', kind='mergesort'), resumo
+
 # --- FUNÇÕES AUXILIARES DE CÁLCULO ---
 def calculate_retention_rate(row):
     """Calcula a taxa de retenção: (Malha / Total Geral) * 100."""
@@ -195,48 +324,240 @@ def calculate_retention_rate(row):
     if total == 0: return 0.0
     return round((row['MALHA'] / total) * 100, 2)
 
-# --- NOVA FUNÇÃO: EXPORTAR PARA EXCEL ---
-@st.cache_data
-def convert_df_to_excel(df):
-    """Converte o DataFrame filtrado para um arquivo Excel em memória."""
-    output = io.BytesIO()
-    # Engine 'openpyxl' é necessária para escrever .xlsx
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Relatorio')
-    return output.getvalue()
+# --- DIAS ANÔMALOS (VISÃO GERAL & RISCO) ---
+def render_anomalias(df, versao_dados, start_date, end_date, transportadoras, operacoes):
+    """Dias com taxa de malha fora do padrão da transportadora/operação (ver anomalies.py)."""
+    st.subheader("🚨 Dias Anômalos (Taxa de Malha)")
+    # Um motor por versão dos dados (a base salva ou com um arquivo carregado), montado uma vez por processo
+    alertas = anomalies.get_engine(df, versao_dados).frame(start_date, end_date, transportadoras, operacoes)
+    if alertas.empty:
+        st.success("✅ Nenhum dia anômalo no período e filtros selecionados.")
+        return
+    st.caption(f"{len(alertas)} dia(s) com retenção fora do padrão móvel do grupo (|z| ≥ {anomalies.Z_LIMITE:g} e p < {anomalies.ALPHA:g} no teste binomial).")
+    st.dataframe(
+        alertas.rename(columns={'TAXA': 'Taxa (%)', 'TAXA_ESPERADA': 'Esperada (%)', 'P_VALOR': 'p-valor', 'DIRECAO': 'Desvio'}),
+        hide_index=True,
+        width="stretch",
+        column_config={
+            "DATA": st.column_config.DateColumn("Data", format="DD/MM/YYYY"),
+            "Taxa (%)": st.column_config.NumberColumn(format="%.2f"),
+            "Esperada (%)": st.column_config.NumberColumn(format="%.2f"),
+            "Z": st.column_config.NumberColumn(format="%.1f"),
+            "p-valor": st.column_config.NumberColumn(format="%.2e"),
+        },
+    )
+    with st.expander("💡 Como os dias anômalos são detectados?"):
+        st.markdown(f"""
+        *   Para cada **transportadora × operação** é mantida a média e a variância móveis da taxa diária de malha (meia-vida de {anomalies.MEIA_VIDA_DIAS} dias).
+        *   Um dia é sinalizado quando a taxa se afasta da média em mais de {anomalies.Z_LIMITE:g} desvios (**z-score**) e o resultado é improvável para o volume do dia (**teste binomial**), o que evita alertas em dias de poucos veículos.
+        *   **Desvio alta:** retenção acima do esperado (possível problema na expedição). **Desvio baixa:** retenção abaixo do esperado (verificar se o sorteio foi aplicado).
+        """)
+
+# --- GRÁFICOS TEMPORAIS (GRANULARIDADE ADAPTATIVA) ---
+# Em vez de uma barra por linha (data x transportadora x operação), os gráficos diários agregam por
+# período; com períodos longos a granularidade sobe para semana/mês (ver utils.chart_series).
+def build_volume_figure(df_view, titulo, color_map, textfont_size):
+    """Fluxo de LIBERADOS por período e transportadora. `titulo` pode conter {grao} (Dia, Semana...)."""
+    serie, grain, rotulos = utils.chart_series(df_view, ['LIBERADOS'], ['TRANSPORTADORA'], col='DATA')
+    serie['TXT_VOL'] = serie['LIBERADOS'].apply(lambda x: f"{x:,.0f}".replace(",", "."))
+    fig = px.bar(serie, x='DATA', y='LIBERADOS', color='TRANSPORTADORA', barmode='group', title=titulo.format(grao=utils.GRAIN_LABELS[grain]),
+                 text='TXT_VOL' if rotulos else None, color_discrete_map=color_map)
+    fig.update_xaxes(tickformat=utils.GRAIN_TICKFORMAT[grain])
+    if rotulos:
+        fig.update_traces(textfont_size=textfont_size, texttemplate='%{text}')
+    fig.update_layout(template="plotly_white", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", xaxis_title="Data", yaxis_title="Volume", yaxis_tickformat=',.0f')
+    return fig
+
+def build_retention_figure(df_view, titulo, color_map, textfont_size):
+    """Taxa de retenção (%) por período e transportadora. `titulo` pode conter {grao}."""
+    serie, grain, rotulos = utils.chart_series(df_view, ['LIBERADOS', 'MALHA'], ['TRANSPORTADORA'], col='DATA')
+    # Cálculo da Taxa de Retenção (%) usando função auxiliar
+    serie['MALHA_PCT'] = serie.apply(calculate_retention_rate, axis=1) if not serie.empty else []
+    serie['TXT_PCT'] = serie['MALHA_PCT'].apply(lambda x: f"{x:.2f}".replace(".", ",") + "%")
+    fig = px.bar(serie, x='DATA', y='MALHA_PCT', color='TRANSPORTADORA', title=titulo.format(grao=utils.GRAIN_LABELS[grain]),
+                 text='TXT_PCT' if rotulos else None, color_discrete_map=color_map)
+    fig.update_xaxes(tickformat=utils.GRAIN_TICKFORMAT[grain])
+    if rotulos:
+        fig.update_traces(texttemplate='%{text}', textposition='auto', textfont_size=textfont_size)
+    fig.update_layout(template="plotly_white", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", xaxis_title="Data", yaxis_title="Retenção (%)")
+    return fig
+
+# --- SEÇÕES COM RERUN PRÓPRIO (st.fragment) ---
+# Widgets destas seções só reexecutam a própria seção (não KPIs, rankings, outras abas ou backup).
+# Tudo que a seção usa chega pelos parâmetros, calculados na última execução completa do app().
+@st.fragment
+def render_geral_diario(df_filtered, periodo_label, filtros_tema, color_map, versao_dados):
+    """Gráficos diários da Visão Geral, com filtro de período próprio (padrão: últimos 5 dias)."""
+    df_geral_view = df_filtered.copy()
+    periodo_g_label = periodo_label # Default
+    periodo_g = None
+    if not df_filtered.empty:
+        max_date_g = df_filtered['DATA'].max()
+        min_date_g = df_filtered['DATA'].min()
+        # Define padrão: últimos 5 dias
+        default_start = max_date_g - pd.Timedelta(days=4)
+        if default_start < min_date_g: default_start = min_date_g
+        
+        dates_g = st.date_input(
+            "📅 Filtrar Período (Gráficos Diários)",
+            value=[default_start, max_date_g],
+            min_value=min_date_g,
+            max_value=max_date_g,
+            format="DD/MM/YYYY",
+            key="filter_geral_dates"
+        )
+        
+        if len(dates_g) == 2:
+            df_geral_view = df_filtered[(df_filtered['DATA'] >= pd.to_datetime(dates_g[0])) & (df_filtered['DATA'] <= pd.to_datetime(dates_g[1]))].copy()
+            periodo_g_label = f"{pd.to_datetime(dates_g[0]).strftime('%d/%m')} a {pd.to_datetime(dates_g[1]).strftime('%d/%m')}"
+            periodo_g = list(dates_g)
+
+    filtros_g = {**filtros_tema, "periodo_g": periodo_g}
+    col_g1, col_g2 = st.columns(2)
+    with col_g1:
+        def build_fig_vol_dia_g():
+            return build_volume_figure(df_geral_view, f"Fluxo de Saída por {{grao}} ({periodo_g_label})", color_map, 20)
+        st.plotly_chart(utils.cached_figure("geral_vol_dia", filtros_g, versao_dados, build_fig_vol_dia_g), key="geral_vol_dia", width="stretch")
+        st.caption("📊 **Volume Operacional:** Quantidade de veículos liberados dia a dia.")
+    with col_g2:
+        def build_fig_malha_dia_g():
+            return build_retention_figure(df_geral_view, f"Taxa de Retenção % por {{grao}} ({periodo_g_label})", color_map, 20)
+        st.plotly_chart(utils.cached_figure("geral_malha_dia", filtros_g, versao_dados, build_fig_malha_dia_g), key="geral_malha_dia", width="stretch")
+        st.caption("🛡️ **Intensidade da Fiscalização:** Porcentagem de veículos auditados em relação ao total de saídas.")
+    
+    with st.expander("💡 Análise de Tendência Diária (O que observar?)"):
+        st.markdown("""
+        *   📊 **Fluxo de Saída (Volume):** Acompanhe a quantidade de veículos processados na portaria. Quedas podem indicar falta de carga ou problemas sistêmicos.
+        *   🛡️ **Taxa de Retenção (%):** Monitora a severidade do sorteio.
+            *   📈 **Picos:** Indicam que muitos veículos foram enviados para reconferência naquele dia, o que pode gerar atrasos e filas no retorno.
+            *   📉 **Zeros:** Dias com 0% de malha sugerem falha no sistema de sorteio (todos passaram direto).
+        """)
+
+@st.fragment
+def render_analise_diaria(df, df_filtered, operacoes, transportadoras, filtros_tema, color_map, versao_dados):
+    """Aba Visão Diária: semana atual ou um dia específico (independente do filtro global de datas)."""
+    st.subheader("Análise Diária")
+    st.markdown("ℹ️ *Esta visão permite isolar dias específicos para entender o que aconteceu em datas com anomalias identificadas na Visão Geral.*")
+    
+    # Filtro Independente
+    modo_filtro = st.radio("Modo de Visualização:", ["Semana Atual (Automático)", "Selecionar Dia Específico (Independente)"], horizontal=True)
+    dia_label = ""
+    
+    if "Independente" in modo_filtro:
+        # Cria um dataframe base ignorando o filtro de data global, mas mantendo filtros de categoria
+        df_base_indep = df[
+            (df['OPERAÇÃO'].isin(operacoes)) &
+            (df['TRANSPORTADORA'].isin(transportadoras))
+        ].copy()
+        
+        if not df_base_indep.empty:
+            datas_disponiveis = sorted(df_base_indep['DATA'].dt.date.unique())
+            data_selecionada = st.date_input(
+                "Selecione a Data:", 
+                value=datas_disponiveis[-1], 
+                min_value=min(datas_disponiveis), 
+                max_value=max(datas_disponiveis),
+                format="DD/MM/YYYY"
+            )
+            if data_selecionada:
+                df_dia_view = df_base_indep[df_base_indep['DATA'].dt.date == data_selecionada].copy()
+                dia_label = data_selecionada.strftime('%d/%m/%Y')
+            else:
+                df_dia_view = pd.DataFrame(columns=df_base_indep.columns)
+                dia_label = "Data não selecionada"
+        else:
+            df_dia_view = pd.DataFrame(columns=df_base_indep.columns)
+            st.warning("Não há dados disponíveis para os filtros de Operação/Transportadora selecionados.")
+    else:
+        # Lógica original (Semana Atual baseada no filtro global)
+        df_dia_view = df_filtered.copy()
+        if not df_dia_view.empty:
+            max_date = df_dia_view['DATA'].max()
+            start_of_week = max_date - pd.Timedelta(days=max_date.weekday())
+            df_dia_view = df_dia_view[df_dia_view['DATA'] >= start_of_week]
+            dia_label = f"Semana de {start_of_week.strftime('%d/%m')} a {max_date.strftime('%d/%m')}"
+
+    filtros_d = {**filtros_tema, "modo": modo_filtro, "dia": dia_label}
+    col_d1, col_d2 = st.columns(2)
+    with col_d1:
+        def build_fig_vol_dia():
+            return build_volume_figure(df_dia_view, f"Fluxo de Saída ({dia_label})", color_map, 18)
+        st.plotly_chart(utils.cached_figure("dia_vol", filtros_d, versao_dados, build_fig_vol_dia), key="dia_vol", width="stretch")
+        st.caption("📊 **Volume:** Quantidade de veículos liberados por dia.")
+    with col_d2:
+        def build_fig_malha_dia():
+            return build_retention_figure(df_dia_view, f"Taxa de Retenção % ({dia_label})", color_map, 18)
+        st.plotly_chart(utils.cached_figure("dia_malha", filtros_d, versao_dados, build_fig_malha_dia), key="dia_malha", width="stretch")
+        st.caption("🛡️ **Auditoria:** % de veículos retidos sobre o total.")
+
+def default_sorteio_prob(df):
+    """Probabilidade padrão do sorteio (%): taxa de retenção de todo o histórico."""
+    # Base sem malha (ou só com malha) daria 0% ou 100%, fora dos limites do campo
+    return min(max(round(anomalies.pooled_rate(df) * 100, 1), 0.1), 99.9)
+
+@st.fragment
+def render_auditoria_sorteio(df, versao_dados, transportadoras, filtros_tema, color_map):
+    """Auditoria do sorteio: taxa observada de cada transportadora vs. a probabilidade configurada (anomalies.py)."""
+    st.subheader("⚖️ Auditoria do Sorteio")
+    if df.empty:
+        st.info("Sem dados para auditar.")
+        return
+    col_p, col_g = st.columns(2)
+    prob = col_p.number_input("Probabilidade de retenção do sorteio (%)", min_value=0.1, max_value=99.9, step=0.1, format="%.1f",
+                              value=default_sorteio_prob(df), key="sorteio_prob",
+                              help="Padrão: taxa de retenção de todo o histórico. Informe a probabilidade configurada na portaria, se conhecida.")
+    grao = col_g.radio("Agrupar por", ["Dia", "Semana", "Mês"], horizontal=True, key="sorteio_grao")
+    periodos, resumo = anomalies.sorteio_audit(df, versao_dados, prob / 100, {"Dia": "D", "Semana": "W", "Mês": "M"}[grao])
+    periodos = periodos[periodos['TRANSPORTADORA'].isin(transportadoras)]
+    resumo = resumo[resumo['TRANSPORTADORA'].isin(transportadoras)]
+
+    col_t, col_f = st.columns([2, 3])
+    with col_t:
+        st.dataframe(
+            resumo[['TRANSPORTADORA', 'SITUACAO', 'TAXA', 'P_VALOR', 'ACIMA', 'ABAIXO', 'PERIODOS']],
+            hide_index=True,
+            width="stretch",
+            column_config={
+                "TRANSPORTADORA": "Transportadora",
+                "SITUACAO": "Situação",
+                "TAXA": st.column_config.NumberColumn("Taxa (%)", format="%.2f"),
+                "P_VALOR": st.column_config.NumberColumn("p-valor", format="%.2e"),
+                "ACIMA": st.column_config.NumberColumn(f"% {grao.lower()}s acima", format="%.1f"),
+                "ABAIXO": st.column_config.NumberColumn(f"% {grao.lower()}s abaixo", format="%.1f"),
+                "PERIODOS": st.column_config.NumberColumn("Períodos"),
+            },
+        )
+    with col_f:
+        def build_fig_funil_sorteio():
+            # Gráfico de funil: fora da banda (Monte Carlo) do volume do período = fora do acaso
+            fig = px.scatter(periodos, x='TOTAL', y='TAXA', color='TRANSPORTADORA', color_discrete_map=color_map,
+                             hover_data={'DATA': '|%d/%m/%Y', 'P_VALOR': ':.2e'}, opacity=0.6,
+                             labels={'TOTAL': 'Veículos no período', 'TAXA': 'Retenção (%)'})
+            banda = periodos.drop_duplicates('TOTAL').sort_values('TOTAL')
+            for col in ('BANDA_INF', 'BANDA_SUP'):
+                fig.add_scatter(x=banda['TOTAL'], y=banda[col], mode='lines', line=dict(color='#888', dash='dash', width=1),
+                                name=f"Banda {anomalies.SORTEIO_BANDA[0]:g}–{anomalies.SORTEIO_BANDA[1]:g}%", showlegend=col == 'BANDA_SUP')
+            fig.add_hline(y=prob, line_color='#333', line_width=1)
+            fig.update_layout(template="plotly_white", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", height=380)
+            return fig
+        filtros_sorteio = {**filtros_tema, "prob": prob, "grao": grao}
+        st.plotly_chart(utils.cached_figure("funil_sorteio", filtros_sorteio, versao_dados, build_fig_funil_sorteio), key="funil_sorteio", width="stretch")
+
+    with st.expander("💡 Como ler a auditoria?"):
+        st.markdown(f"""
+        *   Se o sorteio retém cada veículo com a probabilidade informada, os retidos de uma transportadora seguem uma **distribuição binomial**. O **p-valor** mede a chance de um desvio igual ou maior acontecer só por acaso.
+        *   **Situação:** teste sobre o total do histórico da transportadora (p < {anomalies.ALPHA:g}). 🔴 retida mais do que o sorteio explica; 🔵 retida menos (possível falha na aplicação do sorteio).
+        *   **Gráfico:** cada ponto é um(a) {grao.lower()} de uma transportadora. As linhas tracejadas são a faixa esperada pelo acaso para aquele volume ({anomalies.SORTEIO_SIMULACOES} simulações); pontos fora dela com frequência indicam amostragem sistematicamente maior ou menor.
+        """)
 
 # --- FUNÇÃO PRINCIPAL DO APP ---
 def app():
+    perf.step("dashboard.sidebar")
     # --- INICIALIZAÇÃO DOS DADOS NA MEMÓRIA (SESSION STATE) ---
     # O Session State é a "memória de curto prazo" do usuário.
     # Usamos isso para que os dados não sumam quando o usuário clica em um filtro.
     if 'df_dados' not in st.session_state:
-        try:
-            # Tenta ler do GitHub primeiro (se configurado)
-            df_start = utils.load_data_from_github("file_path")
-            
-            if df_start is None:
-                # Se não tem GitHub ou falhou, tenta ler do banco local (SQLite)
-                try:
-                    df_start = pd.read_sql(f"SELECT * FROM {TABLE_NAME}", con=engine, parse_dates=['DATA'])
-                except:
-                    df_start = pd.DataFrame()
-                
-                # Se o banco estiver vazio ou falhar, tenta ler o Excel local (igual ao teste_validacao.py)
-                if df_start.empty and os.path.exists('dados.xlsx'):
-                    try:
-                        df_start = pd.read_excel('dados.xlsx')
-                    except Exception:
-                        pass
-                
-            # Garante tipos corretos
-            df_start.columns = df_start.columns.str.strip().str.upper()
-            if 'DATA' in df_start.columns:
-                df_start['DATA'] = pd.to_datetime(df_start['DATA'])
-            st.session_state['df_dados'] = df_start
-        except Exception:
-            # Se der erro (ex: banco não existe), inicia vazio
-            st.session_state['df_dados'] = pd.DataFrame(columns=['DATA', 'TRANSPORTADORA', 'OPERAÇÃO', 'LIBERADOS', 'MALHA'])
+        st.session_state['df_dados'] = load_initial_data()
 
     # --- 2. BARRA LATERAL (UPLOAD E FILTROS) ---
 
@@ -303,6 +624,7 @@ def app():
                     df_new = pd.DataFrame(new_row)
                     
                     try:
+                        versao_anterior = utils.get_data_version('df_dados')
                         # Atualiza session state
                         if st.session_state['df_dados'].empty:
                             st.session_state['df_dados'] = df_new.copy()
@@ -310,12 +632,7 @@ def app():
                             st.session_state['df_dados'] = pd.concat([st.session_state['df_dados'], df_new], ignore_index=True)
                         
                         # Persistência
-                        creds = utils.get_github_connection()
-                        path = creds["file_path"] if creds else "dados.csv"
-                        salvo = utils.save_data_to_github(st.session_state['df_dados'], path)
-                        if not salvo:
-                            # Salva o dataframe COMPLETO para garantir consistência (Excel + Novos)
-                            st.session_state['df_dados'].to_sql(TABLE_NAME, engine, if_exists='replace', index=False)
+                        persist_dados(st.session_state['df_dados'], versao_anterior=versao_anterior, novos=df_new)
                             
                         st.success("Salvo no Banco de Dados com sucesso!")
                         st.rerun()
@@ -332,21 +649,20 @@ def app():
         # Botão para salvar dados importados no banco (aparece apenas se houver upload)
         if uploaded_file is not None:
             replace_data = st.sidebar.checkbox("Substituir todo o banco de dados", help="Marque para apagar o banco atual e criar um novo com este arquivo.")
+            atualizar = st.sidebar.checkbox("Atualizar registros existentes", disabled=replace_data, help="Mesma data, transportadora e operação com outros valores substitui o registro do banco.")
             if st.sidebar.button("💾 Converter/Salvar em dados.db"):
-                save_uploaded_data(df, replace=replace_data)
+                save_uploaded_data(df, replace=replace_data, key_cols=UPSERT_KEY_COLS if atualizar else None)
 
         # Botão para baixar o banco de dados atualizado
-        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
-            temp_engine = create_engine(f"sqlite:///{tmp.name}")
-            st.session_state['df_dados'].to_sql(TABLE_NAME, temp_engine, if_exists='replace', index=False)
-            
-            with open(tmp.name, "rb") as fp:
-                st.sidebar.download_button(
-                    label="📥 Baixar dados.db (Backup)",
-                    data=fp,
-                    file_name="dados.db",
-                    mime="application/x-sqlite3"
-                )
+        # O backup só é gerado no clique (callable), copiando o banco local como está, e fica em cache por versão dos dados
+        versao_backup = utils.get_data_version('df_dados')
+        db_file = get_database_engine(DATABASE_URL).url.database
+        st.sidebar.download_button(
+            label="📥 Baixar dados.db (Backup)",
+            data=lambda: reports.sqlite_backup_bytes(db_file, versao_backup),
+            file_name="dados.db",
+            mime="application/x-sqlite3"
+        )
 
         st.sidebar.header("Filtros")
 
@@ -389,6 +705,7 @@ def app():
         
         if col_btn1.button("🔄 Recarregar DB"):
             del st.session_state['df_dados']
+            load_initial_data.clear()
             st.rerun()
             
         if os.path.exists('dados.xlsx'):
@@ -423,25 +740,35 @@ def app():
         
         st.sidebar.info("ℹ️ Faça login para acessar filtros e ferramentas de edição.")
 
+    perf.step("dashboard.filtros")
     # --- APLICAÇÃO DOS FILTROS ---
     # Aplicar Filtros
-    df_filtered = df[
-        (df['DATA'].dt.year.isin(anos_selecionados)) &
-        (df['DATA'] >= pd.to_datetime(start_date)) &
-        (df['DATA'] <= pd.to_datetime(end_date)) &
-        (df['OPERAÇÃO'].isin(operacoes)) &
-        (df['TRANSPORTADORA'].isin(transportadoras))
-    ].copy()
-
-    # Criar colunas de período
-    df_filtered['Mês_Ano'] = df_filtered['DATA'].dt.strftime('%Y-%m')
-    df_filtered['Ano'] = df_filtered['DATA'].dt.strftime('%Y')
+    with perf.trace("dashboard.filtro"):
+        df_filtered = df[
+            (df['DATA'].dt.year.isin(anos_selecionados)) &
+            (df['DATA'] >= pd.to_datetime(start_date)) &
+            (df['DATA'] <= pd.to_datetime(end_date)) &
+            (df['OPERAÇÃO'].isin(operacoes)) &
+            (df['TRANSPORTADORA'].isin(transportadoras))
+        ].copy()
+
+        # Criar colunas de período
+        df_filtered['Mês_Ano'] = df_filtered['DATA'].dt.strftime('%Y-%m')
+        df_filtered['Ano'] = df_filtered['DATA'].dt.strftime('%Y')
 
     # --- DEFINIÇÃO DE CORES CONSISTENTES ---
     # Garante que a mesma transportadora tenha a mesma cor em todos os gráficos
     # Usa a nova função com o tema selecionado na sidebar
     color_map = utils.get_color_map(df_filtered['TRANSPORTADORA'].unique(), theme=tema_selecionado)
 
+    # --- CHAVES DE CACHE (RELATÓRIOS E GRÁFICOS) ---
+    # Cada gráfico é reaproveitado por (filtros que ele usa, tema, versão dos dados)
+    filtros = {"anos": sorted(map(int, anos_selecionados)), "inicio": pd.to_datetime(start_date).date(), "fim": pd.to_datetime(end_date).date(),
+               "operacoes": sorted(map(str, operacoes)), "transportadoras": sorted(map(str, transportadoras))}
+    filtros_tema = {**filtros, "tema": tema_selecionado}
+    # Com upload, os gráficos mostram o arquivo carregado (ainda não salvo na sessão)
+    versao_dados = utils.get_data_version('df_dados') if uploaded_file is None else utils.compute_data_version(df)
+
     # --- CONSTRUÇÃO DE TEXTOS DINÂMICOS (PARA TÍTULOS) ---
     if not df_filtered.empty:
         periodo_label = f"{pd.to_datetime(start_date).strftime('%d/%m/%Y')} a {pd.to_datetime(end_date).strftime('%d/%m/%Y')}"
@@ -454,14 +781,22 @@ def app():
     if acesso_liberado and not df_filtered.empty:
         st.sidebar.markdown("---")
         st.sidebar.header("📥 Exportar Relatório")
-        excel_data = convert_df_to_excel(df_filtered)
-        st.sidebar.download_button(
-            label="Baixar Dados Filtrados (.xlsx)",
-            data=excel_data,
-            file_name="relatorio_logistica_filtrado.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
+        # Gerado em segundo plano e reaproveitado por (filtros, versão dos dados)
+        with st.sidebar:
+            reports.report_panel(
+                "excel_logistica",
+                filtros,
+                versao_dados,
+                ".xlsx",
+                lambda path: reports.export_excel(df_filtered, path),
+                file_name="relatorio_logistica_filtrado.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                label_gerar="Gerar Dados Filtrados (.xlsx)",
+                label_baixar="Baixar Dados Filtrados (.xlsx)",
+                key="excel_logistica",
+            )
 
+    perf.step("dashboard.cabecalho")
     # --- 3. DASHBOARD PRINCIPAL ---
     if logo_image:
         st.image(logo_image, width=200)
@@ -501,46 +836,39 @@ def app():
         4.  📋 **Conclusão:** Após a reconferência, se não houver divergências, o veículo é liberado. Caso contrário, a divergência é relatada.
         """)
 
+    perf.step("dashboard.kpis")
     # --- CÁLCULO DE KPIS E DELTAS (COMPARATIVO) ---
-    # Período Atual
-    total_liberados = df_filtered['LIBERADOS'].sum()
-    total_malha = df_filtered['MALHA'].sum()
-
-    # Tenta usar a coluna de Total do Excel se existir (para bater com os 68.128), senão calcula a soma
-    if 'TOTAL TRANSPORTADORAS' in df_filtered.columns and df_filtered['TOTAL TRANSPORTADORAS'].sum() > 0:
-        total_veiculos = df_filtered['TOTAL TRANSPORTADORAS'].sum()
-    else:
-        total_veiculos = total_liberados + total_malha
+    # Totais por período vêm do índice de somas acumuladas (transportadora × operação × dia), montado uma vez
+    # por versão dos dados: período atual, anterior e ano anterior custam duas consultas cada, sem varrer a base
+    indice_kpi = utils.prefix_sum_index(df, versao_dados, 'DATA', ('TRANSPORTADORA', 'OPERAÇÃO'), tuple(c for c in NUMERIC_COLS if c in df.columns))
+    grupos_sel = {'TRANSPORTADORA': transportadoras, 'OPERAÇÃO': operacoes}
+    inicio_sel, fim_sel = pd.to_datetime(start_date), pd.to_datetime(end_date)
 
-    taxa_malha_global = (total_malha / total_veiculos * 100) if total_veiculos > 0 else 0
+    # Período Atual
+    total_veiculos, total_liberados, total_malha, taxa_malha_global = kpi_totals(
+        indice_kpi.total(inicio_sel, fim_sel, grupos_sel, years=anos_selecionados))
 
     # Período Anterior (para cálculo do Delta)
-    periodo_dias = (pd.to_datetime(end_date) - pd.to_datetime(start_date)).days + 1
-    data_inicio_prev = pd.to_datetime(start_date) - pd.Timedelta(days=periodo_dias)
-    data_fim_prev = pd.to_datetime(start_date) - pd.Timedelta(days=1)
-
-    df_prev = df[
-        (df['DATA'] >= data_inicio_prev) &
-        (df['DATA'] <= data_fim_prev) &
-        (df['OPERAÇÃO'].isin(operacoes)) &
-        (df['TRANSPORTADORA'].isin(transportadoras))
-    ]
+    periodo_dias = (fim_sel - inicio_sel).days + 1
+    data_inicio_prev = inicio_sel - pd.Timedelta(days=periodo_dias)
+    data_fim_prev = inicio_sel - pd.Timedelta(days=1)
+    total_veiculos_prev, total_liberados_prev, total_malha_prev, taxa_malha_prev = kpi_totals(
+        indice_kpi.total(data_inicio_prev, data_fim_prev, grupos_sel))
 
-    if 'TOTAL TRANSPORTADORAS' in df_prev.columns and df_prev['TOTAL TRANSPORTADORAS'].sum() > 0:
-        total_veiculos_prev = df_prev['TOTAL TRANSPORTADORAS'].sum()
-    else:
-        total_veiculos_prev = df_prev['LIBERADOS'].sum() + df_prev['MALHA'].sum()
-
-    total_liberados_prev = df_prev['LIBERADOS'].sum()
-    total_malha_prev = df_prev['MALHA'].sum()
-    taxa_malha_prev = (total_malha_prev / total_veiculos_prev * 100) if total_veiculos_prev > 0 else 0
+    # Mesmo período do ano anterior
+    total_veiculos_aa, _, total_malha_aa, taxa_malha_aa = kpi_totals(indice_kpi.total(
+        inicio_sel - pd.DateOffset(years=1), fim_sel - pd.DateOffset(years=1), grupos_sel,
+        years=[int(a) - 1 for a in anos_selecionados]))
 
     col1, col2, col3, col4 = st.columns(4)
     col1.metric("Fluxo Total (Veículos)", f"{total_veiculos:,.0f}".replace(",", "."), f"{total_veiculos - total_veiculos_prev:,.0f}".replace(",", ".") + " vs período anterior")
     col2.metric("Veículos Liberados", f"{total_liberados:,.0f}".replace(",", "."), f"{total_liberados - total_liberados_prev:,.0f}".replace(",", ".") + " vs período anterior")
     col3.metric("Retidos em Malha", f"{total_malha:,.0f}".replace(",", "."), f"{total_malha - total_malha_prev:,.0f}".replace(",", ".") + " vs período anterior", delta_color="inverse")
+    if total_veiculos_aa > 0:
+        st.caption(f"📆 Mesmo período do ano anterior: {total_veiculos_aa:,.0f}".replace(",", ".") +
+                   f" veículos ({(total_veiculos / total_veiculos_aa - 1) * 100:+.1f}%) · retenção {taxa_malha_aa:.2f}% ({taxa_malha_global - taxa_malha_aa:+.2f} p.p.)")
     
-    with col4:
+    def build_fig_gauge():
         fig_gauge = go.Figure(go.Indicator(
             mode = "gauge+number+delta",
             value = taxa_malha_global,
@@ -566,31 +894,39 @@ def app():
             paper_bgcolor="rgba(0,0,0,0)",
             template="plotly_white"
         )
-        st.plotly_chart(fig_gauge, use_container_width=True)
+        return fig_gauge
+
+    with col4:
+        st.plotly_chart(utils.cached_figure("gauge", filtros, versao_dados, build_fig_gauge), use_container_width=True)
 
     st.markdown("---")
 
+    perf.step("dashboard.rankings")
     st.subheader("🏆 Rankings")
     col_r1, col_r2 = st.columns(2)
 
     #GRAFICO DE RANKINGS.LIBERADO
     with col_r1:
-        top_vol = df_filtered.groupby('TRANSPORTADORA')['LIBERADOS'].sum().reset_index().sort_values(by='LIBERADOS', ascending=True)
-        top_vol['TXT_VOL'] = top_vol['LIBERADOS'].apply(lambda x: f"{x:,.0f}".replace(",", "."))
-        fig_top_vol = px.bar(top_vol, x='LIBERADOS', y='TRANSPORTADORA', orientation='h', text='TXT_VOL', title=f"Ranking de Fluxo LIBERADOS. ({periodo_label})", color='LIBERADOS', color_continuous_scale='Teal')
-        fig_top_vol.update_traces(textfont_size=20, texttemplate='%{text}')
-        fig_top_vol.update_layout(template="plotly_white", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", xaxis_title=None, yaxis_title=None, showlegend=False, xaxis_showticklabels=False, coloraxis_showscale=False)
-        st.plotly_chart(fig_top_vol, key="rank_vol", width="stretch")
+        def build_fig_top_vol():
+            top_vol = df_filtered.groupby('TRANSPORTADORA')['LIBERADOS'].sum().reset_index().sort_values(by='LIBERADOS', ascending=True)
+            top_vol['TXT_VOL'] = top_vol['LIBERADOS'].apply(lambda x: f"{x:,.0f}".replace(",", "."))
+            fig_top_vol = px.bar(top_vol, x='LIBERADOS', y='TRANSPORTADORA', orientation='h', text='TXT_VOL', title=f"Ranking de Fluxo LIBERADOS. ({periodo_label})", color='LIBERADOS', color_continuous_scale='Teal')
+            fig_top_vol.update_traces(textfont_size=20, texttemplate='%{text}')
+            fig_top_vol.update_layout(template="plotly_white", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", xaxis_title=None, yaxis_title=None, showlegend=False, xaxis_showticklabels=False, coloraxis_showscale=False)
+            return fig_top_vol
+        st.plotly_chart(utils.cached_figure("rank_vol", filtros, versao_dados, build_fig_top_vol), key="rank_vol", width="stretch")
         st.caption("📝 **Fluxo:** Volume total de veículos que saíram liberados (sem auditoria).")
 
     #GRAFICO DE RANKINGS.MALHA
     with col_r2:
-        top_malha = df_filtered.groupby('TRANSPORTADORA')['MALHA'].sum().reset_index().sort_values(by='MALHA', ascending=True)
-        top_malha['TXT_MALHA'] = top_malha['MALHA'].apply(lambda x: f"{x:,.0f}".replace(",", "."))
-        fig_top_malha = px.bar(top_malha, x='MALHA', y='TRANSPORTADORA', orientation='h', text='TXT_MALHA', title=f"Ranking de Retenção MALHA. ({periodo_label})", color='MALHA', color_continuous_scale='Reds')
-        fig_top_malha.update_traces(textfont_size=20, texttemplate='%{text}')
-        fig_top_malha.update_layout(template="plotly_white", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", xaxis_title=None, yaxis_title=None, showlegend=False, xaxis_showticklabels=False, coloraxis_showscale=False)
-        st.plotly_chart(fig_top_malha, key="rank_malha", width="stretch")
+        def build_fig_top_malha():
+            top_malha = df_filtered.groupby('TRANSPORTADORA')['MALHA'].sum().reset_index().sort_values(by='MALHA', ascending=True)
+            top_malha['TXT_MALHA'] = top_malha['MALHA'].apply(lambda x: f"{x:,.0f}".replace(",", "."))
+            fig_top_malha = px.bar(top_malha, x='MALHA', y='TRANSPORTADORA', orientation='h', text='TXT_MALHA', title=f"Ranking de Retenção MALHA. ({periodo_label})", color='MALHA', color_continuous_scale='Reds')
+            fig_top_malha.update_traces(textfont_size=20, texttemplate='%{text}')
+            fig_top_malha.update_layout(template="plotly_white", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", xaxis_title=None, yaxis_title=None, showlegend=False, xaxis_showticklabels=False, coloraxis_showscale=False)
+            return fig_top_malha
+        st.plotly_chart(utils.cached_figure("rank_malha", filtros, versao_dados, build_fig_top_malha), key="rank_malha", width="stretch")
         st.caption("📝 **Retenção:** Quantidade absoluta de veículos parados para auditoria (Malha Fina).")
 
     with st.expander("💡 Guia Rápido: Como ler os Rankings?"):
@@ -600,6 +936,7 @@ def app():
             *   ⚠️ *Atenção:* Uma transportadora pode estar no topo aqui apenas porque tem muito volume. Para ver quem tem a *pior performance relativa* (quem "falha" mais proporcionalmente), consulte os gráficos de **Taxa de Retenção (%)** nas abas abaixo.
         """)
 
+    perf.step("dashboard.abas")
     # Abas para análises
     tab_geral, tab_dia, tab_mes, tab_ano = st.tabs(["🔍 Visão Geral & Risco", "📅 Visão Diária", "📆 Visão Mensal", "📅 Visão Anual"])
 
@@ -612,34 +949,38 @@ def app():
         
         with col_funnel:
             st.markdown("##### 🎲 Fluxo do Sorteio (Funil)")
-            data_funnel = dict(
-                number=[total_veiculos, total_liberados, total_malha],
-                stage=["Veículos na Portaria", "🟢 Liberados (Viagem)", "🔴 Retidos (Malha Fina)"],
-                text=[f"{x:,.0f}".replace(",", ".") for x in [total_veiculos, total_liberados, total_malha]]
-            )
-            fig_funnel = px.funnel(data_funnel, x='number', y='stage', color='stage', text='text',
-                                   color_discrete_map={"Veículos na Portaria": "#2E86C1", "🟢 Liberados (Viagem)": "#27AE60", "🔴 Retidos (Malha Fina)": "#C0392B"})
-            fig_funnel.update_traces(texttemplate="%{text}")
-            fig_funnel.update_layout(showlegend=False, template="plotly_white", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", xaxis_tickformat=',.0f')
-            st.plotly_chart(fig_funnel, width="stretch")
+            def build_fig_funnel():
+                data_funnel = dict(
+                    number=[total_veiculos, total_liberados, total_malha],
+                    stage=["Veículos na Portaria", "🟢 Liberados (Viagem)", "🔴 Retidos (Malha Fina)"],
+                    text=[f"{x:,.0f}".replace(",", ".") for x in [total_veiculos, total_liberados, total_malha]]
+                )
+                fig_funnel = px.funnel(data_funnel, x='number', y='stage', color='stage', text='text',
+                                       color_discrete_map={"Veículos na Portaria": "#2E86C1", "🟢 Liberados (Viagem)": "#27AE60", "🔴 Retidos (Malha Fina)": "#C0392B"})
+                fig_funnel.update_traces(texttemplate="%{text}")
+                fig_funnel.update_layout(showlegend=False, template="plotly_white", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", xaxis_tickformat=',.0f')
+                return fig_funnel
+            st.plotly_chart(utils.cached_figure("funil", filtros, versao_dados, build_fig_funnel), width="stretch")
 
         with col_heatmap:
             st.markdown("##### 🔥 Mapa de Calor: Risco por Dia da Semana")
-            # Prepara dados para heatmap: Dia da Semana x Transportadora
-            df_heat = df_filtered.copy()
-            df_heat['Dia_Semana'] = df_heat['DATA'].dt.day_name()
-            # Traduzir dias se necessário, ou usar ordem
-            order_days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-            df_heat_group = df_heat.groupby(['Dia_Semana', 'TRANSPORTADORA'])[['LIBERADOS', 'MALHA']].sum().reset_index()
-            
-            # Calcula % usando a função auxiliar
-            df_heat_group['MALHA_PCT'] = df_heat_group.apply(calculate_retention_rate, axis=1)
-            
-            fig_heat = px.density_heatmap(df_heat_group, x='Dia_Semana', y='TRANSPORTADORA', z='MALHA_PCT', 
-                                          category_orders={"Dia_Semana": order_days},
-                                          color_continuous_scale='Reds', title="Intensidade de Retenção (%)")
-            fig_heat.update_layout(template="plotly_white", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)")
-            st.plotly_chart(fig_heat, width="stretch")
+            def build_fig_heat():
+                # Prepara dados para heatmap: Dia da Semana x Transportadora
+                df_heat = df_filtered.copy()
+                df_heat['Dia_Semana'] = df_heat['DATA'].dt.day_name()
+                # Traduzir dias se necessário, ou usar ordem
+                order_days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+                df_heat_group = df_heat.groupby(['Dia_Semana', 'TRANSPORTADORA'])[['LIBERADOS', 'MALHA']].sum().reset_index()
+                
+                # Calcula % usando a função auxiliar
+                df_heat_group['MALHA_PCT'] = df_heat_group.apply(calculate_retention_rate, axis=1)
+                
+                fig_heat = px.density_heatmap(df_heat_group, x='Dia_Semana', y='TRANSPORTADORA', z='MALHA_PCT', 
+                                              category_orders={"Dia_Semana": order_days},
+                                              color_continuous_scale='Reds', title="Intensidade de Retenção (%)")
+                fig_heat.update_layout(template="plotly_white", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)")
+                return fig_heat
+            st.plotly_chart(utils.cached_figure("heatmap", filtros, versao_dados, build_fig_heat), width="stretch")
 
         with st.expander("💡 Análise de Risco e Fluxo (Como interpretar?)"):
             st.markdown("""
@@ -649,74 +990,34 @@ def app():
                 *   🕵️ **Ação:** Investigar se há padrões viciados (ex: toda sexta-feira a taxa sobe) ou problemas específicos na expedição.
             """)
 
+        st.markdown("---")
+        render_anomalias(df, versao_dados, start_date, end_date, transportadoras, operacoes)
+
+        st.markdown("---")
+        render_auditoria_sorteio(df, versao_dados, transportadoras, filtros_tema, color_map)
+
         st.markdown("---")
         
-        # Filtro de Data Específico para a Visão Geral (Padrão: Últimos 5 dias)
-        df_geral_view = df_filtered.copy()
-        periodo_g_label = periodo_label # Default
-        if not df_filtered.empty:
-            max_date_g = df_filtered['DATA'].max()
-            min_date_g = df_filtered['DATA'].min()
-            # Define padrão: últimos 5 dias
-            default_start = max_date_g - pd.Timedelta(days=4)
-            if default_start < min_date_g: default_start = min_date_g
-            
-            dates_g = st.date_input(
-                "📅 Filtrar Período (Gráficos Diários)",
-                value=[default_start, max_date_g],
-                min_value=min_date_g,
-                max_value=max_date_g,
-                format="DD/MM/YYYY",
-                key="filter_geral_dates"
-            )
-            
-            if len(dates_g) == 2:
-                df_geral_view = df_filtered[(df_filtered['DATA'] >= pd.to_datetime(dates_g[0])) & (df_filtered['DATA'] <= pd.to_datetime(dates_g[1]))].copy()
-                periodo_g_label = f"{pd.to_datetime(dates_g[0]).strftime('%d/%m')} a {pd.to_datetime(dates_g[1]).strftime('%d/%m')}"
-
-        col_g1, col_g2 = st.columns(2)
-        with col_g1:
-            df_geral_view['TXT_VOL'] = df_geral_view['LIBERADOS'].apply(lambda x: f"{x:,.0f}".replace(",", "."))
-            fig_vol_dia_g = px.bar(df_geral_view, x='DATA', y='LIBERADOS', color='TRANSPORTADORA', barmode='group', title=f"Fluxo de Saída por Dia ({periodo_g_label})", text='TXT_VOL', color_discrete_map=color_map)
-            fig_vol_dia_g.update_xaxes(tickformat="%d/%m/%Y")
-            fig_vol_dia_g.update_traces(textfont_size=20, texttemplate='%{text}')
-            fig_vol_dia_g.update_layout(template="plotly_white", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", xaxis_title="Data", yaxis_title="Volume", yaxis_tickformat=',.0f')
-            st.plotly_chart(fig_vol_dia_g, key="geral_vol_dia", width="stretch")
-            st.caption("📊 **Volume Operacional:** Quantidade de veículos liberados dia a dia.")
-        with col_g2:
-            df_dia_malha_g = df_geral_view.groupby(['DATA', 'TRANSPORTADORA'])[['LIBERADOS', 'MALHA']].sum().reset_index()
-            # Cálculo da Taxa de Retenção (%) usando função auxiliar
-            df_dia_malha_g['MALHA_PCT'] = df_dia_malha_g.apply(calculate_retention_rate, axis=1)
-            df_dia_malha_g['TXT_PCT'] = df_dia_malha_g['MALHA_PCT'].apply(lambda x: f"{x:.2f}".replace(".", ",") + "%")
-            
-            fig_malha_dia_g = px.bar(df_dia_malha_g, x='DATA', y='MALHA_PCT', color='TRANSPORTADORA', title=f"Taxa de Retenção % por Dia ({periodo_g_label})", text='TXT_PCT', color_discrete_map=color_map)
-            fig_malha_dia_g.update_xaxes(tickformat="%d/%m/%Y")
-            fig_malha_dia_g.update_traces(texttemplate='%{text}', textposition='auto', textfont_size=20)
-            fig_malha_dia_g.update_layout(template="plotly_white", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", xaxis_title="Data", yaxis_title="Retenção (%)")
-            st.plotly_chart(fig_malha_dia_g, key="geral_malha_dia", width="stretch")
-            st.caption("🛡️ **Intensidade da Fiscalização:** Porcentagem de veículos auditados em relação ao total de saídas.")
-        
-        with st.expander("💡 Análise de Tendência Diária (O que observar?)"):
-            st.markdown("""
-            *   📊 **Fluxo de Saída (Volume):** Acompanhe a quantidade de veículos processados na portaria. Quedas podem indicar falta de carga ou problemas sistêmicos.
-            *   🛡️ **Taxa de Retenção (%):** Monitora a severidade do sorteio.
-                *   📈 **Picos:** Indicam que muitos veículos foram enviados para reconferência naquele dia, o que pode gerar atrasos e filas no retorno.
-                *   📉 **Zeros:** Dias com 0% de malha sugerem falha no sistema de sorteio (todos passaram direto).
-            """)
+        # Filtro de Data Específico para a Visão Geral: rerun apenas desta seção
+        render_geral_diario(df_filtered, periodo_label, filtros_tema, color_map, versao_dados)
 
         st.markdown("---")
         st.subheader("Distribuição Operacional")
         col_g3, col_g4 = st.columns(2)
         with col_g3:
-            fig_pie_op = px.pie(df_filtered, names='OPERAÇÃO', values='LIBERADOS', title=f"Volume por Operação ({periodo_label})", hole=0.4)
-            fig_pie_op.update_traces(textinfo='percent+label')
-            fig_pie_op.update_layout(template="plotly_white", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)")
-            st.plotly_chart(fig_pie_op, key="pie_op", width="stretch")
+            def build_fig_pie_op():
+                fig_pie_op = px.pie(df_filtered, names='OPERAÇÃO', values='LIBERADOS', title=f"Volume por Operação ({periodo_label})", hole=0.4)
+                fig_pie_op.update_traces(textinfo='percent+label')
+                fig_pie_op.update_layout(template="plotly_white", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)")
+                return fig_pie_op
+            st.plotly_chart(utils.cached_figure("pie_op", filtros, versao_dados, build_fig_pie_op), key="pie_op", width="stretch")
         with col_g4:
-            fig_pie_transp = px.pie(df_filtered, names='TRANSPORTADORA', values='LIBERADOS', title=f"Share de Volume ({periodo_label})", hole=0.4, color='TRANSPORTADORA', color_discrete_map=color_map)
-            fig_pie_transp.update_traces(textinfo='percent+label', textposition='inside')
-            fig_pie_transp.update_layout(template="plotly_white", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)")
-            st.plotly_chart(fig_pie_transp, key="pie_transp", width="stretch")
+            def build_fig_pie_transp():
+                fig_pie_transp = px.pie(df_filtered, names='TRANSPORTADORA', values='LIBERADOS', title=f"Share de Volume ({periodo_label})", hole=0.4, color='TRANSPORTADORA', color_discrete_map=color_map)
+                fig_pie_transp.update_traces(textinfo='percent+label', textposition='inside')
+                fig_pie_transp.update_layout(template="plotly_white", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)")
+                return fig_pie_transp
+            st.plotly_chart(utils.cached_figure("pie_transp", filtros_tema, versao_dados, build_fig_pie_transp), key="pie_transp", width="stretch")
         
         with st.expander("💡 Análise de Distribuição"):
             st.markdown("""
@@ -727,68 +1028,7 @@ def app():
         st.markdown("---")
         
     with tab_dia:
-        st.subheader("Análise Diária")
-        st.markdown("ℹ️ *Esta visão permite isolar dias específicos para entender o que aconteceu em datas com anomalias identificadas na Visão Geral.*")
-        
-        # Filtro Independente
-        modo_filtro = st.radio("Modo de Visualização:", ["Semana Atual (Automático)", "Selecionar Dia Específico (Independente)"], horizontal=True)
-        dia_label = ""
-        
-        if "Independente" in modo_filtro:
-            # Cria um dataframe base ignorando o filtro de data global, mas mantendo filtros de categoria
-            df_base_indep = df[
-                (df['OPERAÇÃO'].isin(operacoes)) &
-                (df['TRANSPORTADORA'].isin(transportadoras))
-            ].copy()
-            
-            if not df_base_indep.empty:
-                datas_disponiveis = sorted(df_base_indep['DATA'].dt.date.unique())
-                data_selecionada = st.date_input(
-                    "Selecione a Data:", 
-                    value=datas_disponiveis[-1], 
-                    min_value=min(datas_disponiveis), 
-                    max_value=max(datas_disponiveis),
-                    format="DD/MM/YYYY"
-                )
-                if data_selecionada:
-                    df_dia_view = df_base_indep[df_base_indep['DATA'].dt.date == data_selecionada].copy()
-                    dia_label = data_selecionada.strftime('%d/%m/%Y')
-                else:
-                    df_dia_view = pd.DataFrame(columns=df_base_indep.columns)
-                    dia_label = "Data não selecionada"
-            else:
-                df_dia_view = pd.DataFrame(columns=df_base_indep.columns)
-                st.warning("Não há dados disponíveis para os filtros de Operação/Transportadora selecionados.")
-        else:
-            # Lógica original (Semana Atual baseada no filtro global)
-            df_dia_view = df_filtered.copy()
-            if not df_dia_view.empty:
-                max_date = df_dia_view['DATA'].max()
-                start_of_week = max_date - pd.Timedelta(days=max_date.weekday())
-                df_dia_view = df_dia_view[df_dia_view['DATA'] >= start_of_week]
-                dia_label = f"Semana de {start_of_week.strftime('%d/%m')} a {max_date.strftime('%d/%m')}"
-
-        col_d1, col_d2 = st.columns(2)
-        with col_d1:
-            df_dia_view['TXT_VOL'] = df_dia_view['LIBERADOS'].apply(lambda x: f"{x:,.0f}".replace(",", "."))
-            fig_vol_dia = px.bar(df_dia_view, x='DATA', y='LIBERADOS', color='TRANSPORTADORA', barmode='group', title=f"Fluxo de Saída ({dia_label})", text='TXT_VOL', color_discrete_map=color_map)
-            fig_vol_dia.update_xaxes(tickformat="%d/%m/%Y")
-            fig_vol_dia.update_traces(textfont_size=18, texttemplate='%{text}')
-            fig_vol_dia.update_layout(template="plotly_white", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", xaxis_title="Data", yaxis_title="Volume", yaxis_tickformat=',.0f')
-            st.plotly_chart(fig_vol_dia, key="dia_vol", width="stretch")
-            st.caption("📊 **Volume:** Quantidade de veículos liberados por dia.")
-        with col_d2:
-            df_dia_malha = df_dia_view.groupby(['DATA', 'TRANSPORTADORA'])[['LIBERADOS', 'MALHA']].sum().reset_index()
-            # Cálculo da Taxa de Retenção (%) usando função auxiliar
-            df_dia_malha['MALHA_PCT'] = df_dia_malha.apply(calculate_retention_rate, axis=1)
-            df_dia_malha['TXT_PCT'] = df_dia_malha['MALHA_PCT'].apply(lambda x: f"{x:.2f}".replace(".", ",") + "%")
-            
-            fig_malha_dia = px.bar(df_dia_malha, x='DATA', y='MALHA_PCT', color='TRANSPORTADORA', title=f"Taxa de Retenção % ({dia_label})", text='TXT_PCT', color_discrete_map=color_map)
-            fig_malha_dia.update_xaxes(tickformat="%d/%m/%Y")
-            fig_malha_dia.update_traces(texttemplate='%{text}', textposition='auto', textfont_size=18)
-            fig_malha_dia.update_layout(template="plotly_white", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", xaxis_title="Data", yaxis_title="Retenção (%)")
-            st.plotly_chart(fig_malha_dia, key="dia_malha", width="stretch")
-            st.caption("🛡️ **Auditoria:** % de veículos retidos sobre o total.")
+        render_analise_diaria(df, df_filtered, operacoes, transportadoras, filtros_tema, color_map, versao_dados)
 
     with tab_mes:
         st.subheader("Análise Mensal")
@@ -805,49 +1045,65 @@ def app():
         else:
             df_mes_filtered = df_filtered
             
-        df_mes = df_mes_filtered.groupby(['Mês_Ano', 'TRANSPORTADORA'])[['LIBERADOS', 'MALHA']].sum().reset_index()
+        filtros_m = {**filtros_tema, "meses": sorted(meses_selecionados)}
+        def get_df_mes():
+            return df_mes_filtered.groupby(['Mês_Ano', 'TRANSPORTADORA'])[['LIBERADOS', 'MALHA']].sum().reset_index()
         col_m1, col_m2 = st.columns(2)
         with col_m1:
-            df_mes['TXT_VOL'] = df_mes['LIBERADOS'].apply(lambda x: f"{x:,.0f}".replace(",", "."))
-            fig_vol_mes = px.bar(df_mes, x='Mês_Ano', y='LIBERADOS', color='TRANSPORTADORA', barmode='group', title=f"Fluxo de Saída por Mês ({anos_label})", text='TXT_VOL', color_discrete_map=color_map)
-            fig_vol_mes.update_traces(textfont_size=18, texttemplate='%{text}')
-            fig_vol_mes.update_layout(template="plotly_white", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", xaxis_title="Mês", yaxis_title="Volume", yaxis_tickformat=',.0f')
-            st.plotly_chart(fig_vol_mes, key="mes_vol", width="stretch")
+            def build_fig_vol_mes():
+                df_mes = get_df_mes()
+                df_mes['TXT_VOL'] = df_mes['LIBERADOS'].apply(lambda x: f"{x:,.0f}".replace(",", "."))
+                fig_vol_mes = px.bar(df_mes, x='Mês_Ano', y='LIBERADOS', color='TRANSPORTADORA', barmode='group', title=f"Fluxo de Saída por Mês ({anos_label})", text='TXT_VOL', color_discrete_map=color_map)
+                fig_vol_mes.update_traces(textfont_size=18, texttemplate='%{text}')
+                fig_vol_mes.update_layout(template="plotly_white", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", xaxis_title="Mês", yaxis_title="Volume", yaxis_tickformat=',.0f')
+                return fig_vol_mes
+            st.plotly_chart(utils.cached_figure("mes_vol", filtros_m, versao_dados, build_fig_vol_mes), key="mes_vol", width="stretch")
             st.caption("📊 **Sazonalidade:** Volume acumulado de liberados por mês.")
         with col_m2:
-            # Cálculo da Taxa de Retenção (%) usando função auxiliar
-            df_mes['MALHA_PCT'] = df_mes.apply(calculate_retention_rate, axis=1)
-            df_mes['TXT_PCT'] = df_mes['MALHA_PCT'].apply(lambda x: f"{x:.2f}".replace(".", ",") + "%")
-            
-            fig_malha_mes = px.bar(df_mes, x='Mês_Ano', y='MALHA_PCT', color='TRANSPORTADORA', title=f"Taxa de Retenção % por Mês ({anos_label})", text='TXT_PCT', color_discrete_map=color_map)
-            fig_malha_mes.update_traces(texttemplate='%{text}', textposition='auto', textfont_size=18)
-            fig_malha_mes.update_layout(template="plotly_white", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", xaxis_title="Mês", yaxis_title="Retenção (%)")
-            st.plotly_chart(fig_malha_mes, key="mes_malha", width="stretch")
+            def build_fig_malha_mes():
+                df_mes = get_df_mes()
+                # Cálculo da Taxa de Retenção (%) usando função auxiliar
+                df_mes['MALHA_PCT'] = df_mes.apply(calculate_retention_rate, axis=1)
+                df_mes['TXT_PCT'] = df_mes['MALHA_PCT'].apply(lambda x: f"{x:.2f}".replace(".", ",") + "%")
+                
+                fig_malha_mes = px.bar(df_mes, x='Mês_Ano', y='MALHA_PCT', color='TRANSPORTADORA', title=f"Taxa de Retenção % por Mês ({anos_label})", text='TXT_PCT', color_discrete_map=color_map)
+                fig_malha_mes.update_traces(texttemplate='%{text}', textposition='auto', textfont_size=18)
+                fig_malha_mes.update_layout(template="plotly_white", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", xaxis_title="Mês", yaxis_title="Retenção (%)")
+                return fig_malha_mes
+            st.plotly_chart(utils.cached_figure("mes_malha", filtros_m, versao_dados, build_fig_malha_mes), key="mes_malha", width="stretch")
             st.caption("🛡️ **Tendência:** Variação mensal da taxa de retenção na malha fina.")
 
     with tab_ano:
         st.subheader("Análise Anual")
         st.markdown("ℹ️ *Visão consolidada para relatórios gerenciais de longo prazo.*")
-        df_ano = df_filtered.groupby(['Ano', 'TRANSPORTADORA'])[['LIBERADOS', 'MALHA']].sum().reset_index()
+        def get_df_ano():
+            return df_filtered.groupby(['Ano', 'TRANSPORTADORA'])[['LIBERADOS', 'MALHA']].sum().reset_index()
         col_a1, col_a2 = st.columns(2)
         with col_a1:
-            df_ano['TXT_VOL'] = df_ano['LIBERADOS'].apply(lambda x: f"{x:,.0f}".replace(",", "."))
-            fig_vol_ano = px.bar(df_ano, x='Ano', y='LIBERADOS', color='TRANSPORTADORA', barmode='group', title=f"Fluxo de Saída por Ano ({anos_label})", text='TXT_VOL', color_discrete_map=color_map)
-            fig_vol_ano.update_traces(textfont_size=18, texttemplate='%{text}')
-            fig_vol_ano.update_layout(template="plotly_white", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", xaxis_title="Ano", yaxis_title="Volume", yaxis_tickformat=',.0f')
-            st.plotly_chart(fig_vol_ano, key="ano_vol", width="stretch")
+            def build_fig_vol_ano():
+                df_ano = get_df_ano()
+                df_ano['TXT_VOL'] = df_ano['LIBERADOS'].apply(lambda x: f"{x:,.0f}".replace(",", "."))
+                fig_vol_ano = px.bar(df_ano, x='Ano', y='LIBERADOS', color='TRANSPORTADORA', barmode='group', title=f"Fluxo de Saída por Ano ({anos_label})", text='TXT_VOL', color_discrete_map=color_map)
+                fig_vol_ano.update_traces(textfont_size=18, texttemplate='%{text}')
+                fig_vol_ano.update_layout(template="plotly_white", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", xaxis_title="Ano", yaxis_title="Volume", yaxis_tickformat=',.0f')
+                return fig_vol_ano
+            st.plotly_chart(utils.cached_figure("ano_vol", filtros_tema, versao_dados, build_fig_vol_ano), key="ano_vol", width="stretch")
             st.caption("📊 **Histórico:** Volume total de liberados por ano.")
         with col_a2:
-            # Cálculo da Taxa de Retenção (%) usando função auxiliar
-            df_ano['MALHA_PCT'] = df_ano.apply(calculate_retention_rate, axis=1)
-            df_ano['TXT_PCT'] = df_ano['MALHA_PCT'].apply(lambda x: f"{x:.2f}".replace(".", ",") + "%")
-            
-            fig_malha_ano = px.bar(df_ano, x='Ano', y='MALHA_PCT', color='TRANSPORTADORA', title=f"Taxa de Retenção % por Ano ({anos_label})", text='TXT_PCT', color_discrete_map=color_map)
-            fig_malha_ano.update_traces(texttemplate='%{text}', textposition='auto', textfont_size=18)
-            fig_malha_ano.update_layout(template="plotly_white", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", xaxis_title="Ano", yaxis_title="Retenção (%)")
-            st.plotly_chart(fig_malha_ano, key="ano_malha", width="stretch")
+            def build_fig_malha_ano():
+                df_ano = get_df_ano()
+                # Cálculo da Taxa de Retenção (%) usando função auxiliar
+                df_ano['MALHA_PCT'] = df_ano.apply(calculate_retention_rate, axis=1)
+                df_ano['TXT_PCT'] = df_ano['MALHA_PCT'].apply(lambda x: f"{x:.2f}".replace(".", ",") + "%")
+                
+                fig_malha_ano = px.bar(df_ano, x='Ano', y='MALHA_PCT', color='TRANSPORTADORA', title=f"Taxa de Retenção % por Ano ({anos_label})", text='TXT_PCT', color_discrete_map=color_map)
+                fig_malha_ano.update_traces(texttemplate='%{text}', textposition='auto', textfont_size=18)
+                fig_malha_ano.update_layout(template="plotly_white", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", xaxis_title="Ano", yaxis_title="Retenção (%)")
+                return fig_malha_ano
+            st.plotly_chart(utils.cached_figure("ano_malha", filtros_tema, versao_dados, build_fig_malha_ano), key="ano_malha", width="stretch")
             st.caption("🛡️ **Consolidado:** Taxa média anual de retenção para auditoria.")
 
+    perf.step("dashboard.tabela")
     # --- 4. TABELA DE DADOS E EDIÇÃO ---
     with st.expander("Ver Dados Detalhados / Editar"):
         if acesso_liberado:
@@ -857,49 +1113,38 @@ def app():
             # Seleciona apenas colunas base para edição
             cols_base = ['DATA', 'TRANSPORTADORA', 'OPERAÇÃO', 'LIBERADOS', 'MALHA']
             
-            # Editor de Dados
-            df_edited = st.data_editor(
+            # Editor paginado: só a página atual vai ao navegador; as alterações de todas as páginas
+            # ficam pendentes na sessão até salvar (e são descartadas quando a versão dos dados muda)
+            alteracoes = utils.paged_editor(
                 df_filtered[cols_base].sort_values(by=['DATA', 'TRANSPORTADORA']),
-                num_rows="dynamic",
-                width="stretch",
                 key="editor_dados",
+                version=versao_dados,
                 column_config={
                     "DATA": st.column_config.DateColumn("Data", format="DD/MM/YYYY"),
                     "LIBERADOS": st.column_config.NumberColumn("Liberados", min_value=0, step=1, format="%d"),
                     "MALHA": st.column_config.NumberColumn("Malha", min_value=0, step=1, format="%d"),
                     "OPERAÇÃO": st.column_config.SelectboxColumn("Operação", options=["LML", "Direta", "Reversa", "Outros"]),
-                }
+                },
+                search_cols=['TRANSPORTADORA', 'OPERAÇÃO'],
             )
 
-            if st.button("💾 Salvar Alterações"):
+            if uploaded_file is not None:
+                st.caption("ℹ️ Salve ou remova o arquivo enviado antes de editar a base.")
+            elif st.button("💾 Salvar Alterações"):
                 try:
-                    # Lógica de Atualização:
-                    df_full = st.session_state['df_dados']
-                    indices_originais = df_filtered.index
-                    
-                    # Remove as linhas antigas correspondentes ao filtro atual
-                    df_full = df_full.drop(indices_originais, errors='ignore')
-                    
-                    # Adiciona as linhas que vieram do editor
-                    if df_full.empty:
-                        df_full = df_edited.copy()
+                    # Aplica só o que mudou no editor (linhas editadas, novas e excluídas)
+                    versao_anterior = utils.get_data_version('df_dados')
+                    df_full, resumo = apply_editor_changes(st.session_state['df_dados'], alteracoes)
+                    if resumo['rejeitadas']:
+                        # Toast: continua visível após o st.rerun do salvamento
+                        st.toast(f"⚠️ {resumo['rejeitadas']} linha(s) inválida(s) (ex.: DATA vazia) não foram aplicadas; os registros originais foram mantidos.")
+                    if not (resumo['editadas'] or resumo['novas'] or resumo['removidas']):
+                        st.info("Nenhuma alteração para salvar.")
                     else:
-                        df_full = pd.concat([df_full, df_edited], ignore_index=True)
-                    
-                    # Limpeza e Persistência
-                    df_full = clean_dataframe(df_full)
-                    df_full = df_full.sort_values(by='DATA')
-                    
-                    st.session_state['df_dados'] = df_full
-                    
-                    creds = utils.get_github_connection()
-                    path = creds["file_path"] if creds else "dados.csv"
-                    salvo = utils.save_data_to_github(df_full, path)
-                    if not salvo:
-                        df_full.to_sql(TABLE_NAME, engine, if_exists='replace', index=False)
-                    
-                    st.success("✅ Banco de dados atualizado com sucesso!")
-                    st.rerun()
+                        st.session_state['df_dados'] = df_full
+                        persist_dados(df_full, versao_anterior=versao_anterior)  # Edição: motor remontado
+                        st.success(f"✅ Banco de dados atualizado: {resumo['editadas']} editada(s), {resumo['novas']} nova(s), {resumo['removidas']} excluída(s).")
+                        st.rerun()
                 except Exception as e:
                     st.error(f"Erro ao salvar: {e}")
 
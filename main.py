@@ -1,10 +1,15 @@
 
 import streamlit as st
-import dashboard
-import app as drone_app
 from datetime import datetime
 import os
-import base64
+import sys
+import time
+import importlib
+import assets
+import warmup
+import perf
+
+ICON_WIDTH = 250  # Largura (px) dos GIFs dos cards da Home
 
 # --- Configuração Global da Página ---
 st.set_page_config(
@@ -14,9 +19,15 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Mede bytes enviados ao navegador e tempo por seção desta execução (ver perf.py).
+# finish_rerun (no finally da página) devolve o _enqueue original; se a execução for interrompida antes
+# (st.rerun() do login, erro na barra lateral), o próximo start_rerun o devolve antes de medir de novo.
+perf.start_rerun()
+perf.step("main.estilo")
+
 # --- Estilo CSS Personalizado (Para ficar "Lindo") ---
-st.markdown("""
-<style>
+# Minificado uma vez por processo; o Streamlit exige reenviar o bloco a cada execução.
+PORTAL_CSS = """
     
     /* Estilo da Sidebar */
     [data-testid="stSidebar"] {
@@ -101,14 +112,41 @@ st.markdown("""
     .nav-desc {
         color: #64748b;
     }
-</style>
-""", unsafe_allow_html=True)
+"""
+st.markdown(f"<style>{assets.minify_css(PORTAL_CSS)}</style>", unsafe_allow_html=True)
+
+# --- Registro de Páginas (carregamento sob demanda) ---
+# Cada módulo, com suas dependências pesadas (pandas, plotly, folium, sqlalchemy, PyGithub...),
+# só é importado na primeira vez que alguém navega até ele.
+PAGES = {
+    "🏠 Início": None,
+    "🚚 Logística (Malha Fina)": "dashboard",
+    "🚁 Controle de Drones": "app",
+}
+
+@st.cache_resource
+def get_import_times():
+    """Tempo (s) de importação de cada módulo de página, medido na primeira navegação do processo."""
+    return {}
+
+def load_page(module_name):
+    """Importa o módulo da página sob demanda e registra quanto tempo o import levou."""
+    if module_name not in sys.modules:
+        inicio = time.perf_counter()
+        importlib.import_module(module_name)
+        get_import_times()[module_name] = time.perf_counter() - inicio
+    return sys.modules[module_name]
+
+# --- Warm-up (uma vez por processo, em segundo plano; PORTAL_WARMUP=0 desliga) ---
+# Importa as páginas e pré-carrega bases/caches enquanto o usuário ainda está na Home.
+warmup_state = warmup.start_warmup()
 
 # --- Inicialização de Sessão ---
 if 'logged_in' not in st.session_state:
     st.session_state['logged_in'] = False
 
 # --- Navegação Lateral ---
+perf.step("main.sidebar")
 with st.sidebar:
     if os.path.exists("image.png"):
         st.image("image.png", width=100)
@@ -145,14 +183,27 @@ with st.sidebar:
     # Menu de Navegação
     selection = st.radio(
         "Navegar para:",
-        ["🏠 Início", "🚚 Logística (Malha Fina)", "🚁 Controle de Drones"],
+        list(PAGES),
         index=0
     )
     
     st.markdown("---")
     st.caption("Sistema Unificado v1.0")
+    if st.session_state['logged_in'] and get_import_times():
+        st.caption("⏱️ Import: " + " | ".join(f"{m} {t:.2f}s" for m, t in get_import_times().items()))
+    if st.session_state['logged_in'] and warmup_state["tempos"]:
+        st.caption(f"🔥 Warm-up ({warmup_state['status']}): " + " | ".join(f"{k} {t:.2f}s" for k, t in warmup_state["tempos"].items()))
+    # Resumo da execução anterior (a atual ainda está em andamento)
+    ultima = st.session_state.get("_perf_ultima")
+    if st.session_state['logged_in'] and ultima:
+        st.caption(f"📦 Última execução: {ultima['total_ms']:.0f} ms, {ultima['kb']:,.0f} KB enviados")
+        for alerta in ultima["alertas"]:
+            st.warning(f"⚠️ Orçamento excedido: {alerta}")
+    if st.session_state['logged_in']:
+        perf.render_debug_panel()
 
 # --- Lógica de Exibição ---
+perf.step("main.pagina")
 if selection == "🏠 Início":
     # Saudação baseada no horário
     hora_atual = datetime.now().hour
@@ -173,12 +224,11 @@ if selection == "🏠 Início":
     
     col1, col2 = st.columns(2)
     
-    # Prepara o ícone: Se existir car.gif, usa ele (Base64), senão mantém o caminhão
+    # Prepara o ícone: Se existir car.gif, usa ele (reduzido e em cache), senão mantém o caminhão
     icon_logistica = "🚚"
-    if os.path.exists("car.gif"):
-        with open("car.gif", "rb") as f:
-            data = base64.b64encode(f.read()).decode()
-        icon_logistica = f'<img src="data:image/gif;base64,{data}" style="width: 250px; vertical-align: middle;">'
+    url_car = assets.get_asset_url("car.gif", max_width=ICON_WIDTH)
+    if url_car:
+        icon_logistica = f'<img src="{url_car}" style="width: {ICON_WIDTH}px; vertical-align: middle;">'
 
     with col1:
         st.markdown(f"""
@@ -194,12 +244,11 @@ if selection == "🏠 Início":
         </div>
         """, unsafe_allow_html=True)
         
-    # Prepara o ícone: Se existir logo.gif, usa ele (Base64), senão mantém o helicóptero
+    # Prepara o ícone: Se existir logo.gif, usa ele (reduzido e em cache), senão mantém o helicóptero
     icon_drone = "🚁"
-    if os.path.exists("logo.gif"):
-        with open("logo.gif", "rb") as f:
-            data = base64.b64encode(f.read()).decode()
-        icon_drone = f'<img src="data:image/gif;base64,{data}" style="width: 250px; vertical-align: middle;">'
+    url_logo = assets.get_asset_url("logo.gif", max_width=ICON_WIDTH)
+    if url_logo:
+        icon_drone = f'<img src="{url_logo}" style="width: {ICON_WIDTH}px; vertical-align: middle;">'
 
     with col2:
         st.markdown(f"""
@@ -228,8 +277,12 @@ if selection == "🏠 Início":
     st.markdown("---")
     st.caption("© 2025 Casas Bahia - Departamento de Prevenção e Perdas | Desenvolvido por Clayton S. Silva")
 
-elif selection == "🚚 Logística (Malha Fina)":
-    dashboard.app()
+else:
+    try:
+        with perf.section(f"pagina.{PAGES[selection]}"):
+            load_page(PAGES[selection]).app()
+    finally:
+        # Também após st.stop()/st.rerun() dentro da página
+        perf.finish_rerun()
 
-elif selection == "🚁 Controle de Drones":
-    drone_app.app()
+perf.finish_rerun()  # Home (na página já foi encerrado; chamadas repetidas não têm efeito)
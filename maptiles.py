@@ -0,0 +1,198 @@
+import streamlit as st
+import os
+import re
+import sys
+import json
+import math
+import logging
+from urllib.parse import urljoin, urlsplit
+import assets
+
+# --- MAPA OFFLINE (CACHE DE TILES E DO HTML) ---
+# Os tiles de satélite da área do site (LAT/LON do app) nos zooms usados e o Leaflet ficam em static/mapa/,
+# publicados pelo server.enableStaticServing (ver .streamlit/config.toml). O HTML do mapa é gerado uma vez
+# por entradas (local, zoom, marcador, modo offline) e exibido com components.html: sem st_folium e sem
+# internet quando o cache está completo. Sem o cache, o mapa usa os tiles e o Leaflet online, como antes.
+# Pré-carga (em uma máquina com internet; para a rede isolada, copie static/mapa/ para o servidor):
+#     python maptiles.py [LAT LON]
+TILE_URL = "https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}"
+TILE_ATTR = "Esri World Imagery"
+MAP_ZOOMS = range(15, 20)  # zoom_start 17 com folga de 2 níveis para cada lado
+MAP_RADIUS_M = int(os.environ.get("MAP_RADIUS_M", "800"))  # Raio da área em cache em torno do site
+MAP_DIR = os.path.join(assets.STATIC_DIR, "mapa")
+MANIFEST = os.path.join(MAP_DIR, "manifest.json")  # Gravado pela pré-carga: área, zooms e falhas
+DOWNLOAD_TIMEOUT = 15
+
+logger = logging.getLogger("portal.mapa")
+
+def _leaflet_urls():
+    """(js, css) do Leaflet na versão que o folium instalado usa."""
+    import folium
+    return dict(folium.Map.default_js)["leaflet"], dict(folium.Map.default_css)["leaflet_css"]
+
+# --- ÁREA E TILES ---
+def tile_xy(lat, lon, z):
+    """Tile (x, y) que contém o ponto no zoom z (projeção Web Mercator)."""
+    n = 2 ** z
+    x = int((lon + 180) / 360 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+def area_bounds(lat, lon, raio_m=MAP_RADIUS_M):
+    """[[sul, oeste], [norte, leste]] do quadrado de lado 2 × raio_m centrado no site."""
+    dlat = raio_m / 111_320
+    dlon = raio_m / (111_320 * math.cos(math.radians(lat)))
+    return [[lat - dlat, lon - dlon], [lat + dlat, lon + dlon]]
+
+def area_tiles(lat, lon, zooms=MAP_ZOOMS, raio_m=MAP_RADIUS_M):
+    """Tiles (z, x, y) que cobrem a área em cada zoom."""
+    (sul, oeste), (norte, leste) = area_bounds(lat, lon, raio_m)
+    tiles = []
+    for z in zooms:
+        x0, y0 = tile_xy(norte, oeste, z)
+        x1, y1 = tile_xy(sul, leste, z)
+        tiles += [(z, x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+    return tiles
+
+def _tile_path(z, x, y):
+    return os.path.join(MAP_DIR, "tiles", str(z), str(y), f"{x}.jpg")
+
+def _lib_path(url):
+    """Arquivo local que espelha a URL (host/caminho), para que referências relativas do CSS continuem valendo."""
+    partes = urlsplit(url)
+    return os.path.join(MAP_DIR, "lib", partes.netloc, *partes.path.lstrip("/").split("/"))
+
+def _static_url(path):
+    """URL absoluta (a partir da raiz do servidor) de um arquivo em static/: vale dentro do iframe do mapa."""
+    base = st.get_option("server.baseUrlPath").strip("/")
+    relativo = os.path.relpath(path, assets.STATIC_DIR).replace(os.sep, "/")
+    return "/" + "/".join(p for p in (base, "app/static", relativo) if p)
+
+@st.cache_resource(show_spinner=False)
+def _check_cache(lat, lon, zooms, raio_m, manifest_mtime_ns):
+    """Confere o cache uma vez por versão do manifesto (mtime na chave): área coberta e arquivos em disco."""
+    try:
+        with open(MANIFEST, encoding="utf-8") as f:
+            manifesto = json.load(f)
+    except (OSError, ValueError):
+        return False
+    js, css = _leaflet_urls()
+    if (manifesto.get("falhas") or manifesto.get("leaflet") != [js, css]
+            or [manifesto.get("lat"), manifesto.get("lon")] != [lat, lon]
+            or not set(zooms) <= set(manifesto.get("zooms", [])) or manifesto.get("raio_m", 0) < raio_m):
+        return False
+    return (os.path.exists(_lib_path(js)) and os.path.exists(_lib_path(css))
+            and all(os.path.exists(_tile_path(*t)) for t in area_tiles(lat, lon, zooms, raio_m)))
+
+def is_cached(lat, lon, zooms=MAP_ZOOMS, raio_m=MAP_RADIUS_M):
+    """True se a pré-carga cobriu a área (tiles e Leaflet em disco) e o servidor publica static/."""
+    if not st.get_option("server.enableStaticServing"):
+        return False
+    try:
+        mtime = os.stat(MANIFEST).st_mtime_ns
+    except OSError:
+        return False
+    return _check_cache(lat, lon, tuple(zooms), raio_m, mtime)
+
+# --- PRÉ-CARGA ---
+def _download(sessao, url, destino):
+    resposta = sessao.get(url, timeout=DOWNLOAD_TIMEOUT)
+    resposta.raise_for_status()
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    temporario = f"{destino}.tmp"
+    with open(temporario, "wb") as f:
+        f.write(resposta.content)
+    os.replace(temporario, destino)  # Nunca deixa um tile pela metade no cache
+    return resposta.content
+
+def _css_refs(css):
+    """URLs relativas referenciadas pelo CSS (imagens do Leaflet), sem data URIs."""
+    refs = re.findall(r"url\(\s*['\"]?([^'\")]+)['\"]?\s*\)", css)
+    return sorted({r for r in refs if not r.startswith(("data:", "http:", "https:", "#"))})
+
+def prefetch(lat, lon, zooms=MAP_ZOOMS, raio_m=MAP_RADIUS_M):
+    """
+    Baixa o que falta (tiles da área + Leaflet e suas imagens) e grava o manifesto lido por is_cached.
+    Devolve {"baixados", "existentes", "falhas"}.
+    """
+    import requests
+    resumo = {"baixados": 0, "existentes": 0, "falhas": 0}
+    js, css = _leaflet_urls()
+    arquivos = [(url, _lib_path(url)) for url in (js, css)]
+    arquivos += [(TILE_URL.format(z=z, x=x, y=y), _tile_path(z, x, y)) for z, x, y in area_tiles(lat, lon, zooms, raio_m)]
+    with requests.Session() as sessao:
+        for url, destino in arquivos:
+            if os.path.exists(destino):
+                resumo["existentes"] += 1
+                continue
+            try:
+                conteudo = _download(sessao, url, destino)
+                resumo["baixados"] += 1
+            except Exception as e:
+                logger.warning("Falha ao baixar %s: %s", url, e)
+                resumo["falhas"] += 1
+                continue
+            if url == css:
+                for ref in _css_refs(conteudo.decode("utf-8", "replace")):
+                    absoluta = urljoin(css, ref)
+                    if not os.path.exists(_lib_path(absoluta)):
+                        try:
+                            _download(sessao, absoluta, _lib_path(absoluta))
+                        except Exception as e:
+                            logger.warning("Falha ao baixar %s: %s", absoluta, e)
+    manifesto = {"lat": lat, "lon": lon, "zooms": list(zooms), "raio_m": raio_m, "leaflet": [js, css], **resumo}
+    os.makedirs(MAP_DIR, exist_ok=True)
+    with open(f"{MANIFEST}.tmp", "w", encoding="utf-8") as f:
+        json.dump(manifesto, f, indent=2)
+    os.replace(f"{MANIFEST}.tmp", MANIFEST)
+    return resumo
+
+# --- HTML DO MAPA ---
+def _inline_leaflet(html):
+    """Troca as tags do Leaflet na CDN pelo conteúdo local (JS e CSS embutidos; imagens do CSS via static/)."""
+    js, css = _leaflet_urls()
+    with open(_lib_path(js), encoding="utf-8") as f:
+        codigo = f.read()
+    with open(_lib_path(css), encoding="utf-8") as f:
+        estilo = f.read()
+    for ref in _css_refs(estilo):
+        estilo = estilo.replace(ref, _static_url(_lib_path(urljoin(css, ref))))
+    html = re.sub(r"<script[^>]*src=\"" + re.escape(js) + r"\"[^>]*>\s*</script>", lambda _: f"<script>{codigo}</script>", html)
+    return re.sub(r"<link[^>]*href=\"" + re.escape(css) + r"\"[^>]*/?>", lambda _: f"<style>{estilo}</style>", html)
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def map_html(lat, lon, zoom, popup, tooltip, offline):
+    """HTML completo do mapa (gerado uma vez por entradas). offline: tiles e Leaflet do cache em static/mapa/."""
+    import folium
+    opcoes = {}
+    if offline:
+        # Limita zoom e arrasto à área em cache (fora dela não há tiles)
+        (sul, oeste), (norte, leste) = area_bounds(lat, lon)
+        opcoes = dict(min_zoom=min(MAP_ZOOMS), max_zoom=max(MAP_ZOOMS), max_bounds=True,
+                      min_lat=sul, max_lat=norte, min_lon=oeste, max_lon=leste)
+    mapa = folium.Map(location=[lat, lon], zoom_start=zoom, tiles=None, **opcoes)
+    tiles = _static_url(os.path.join(MAP_DIR, "tiles")) + "/{z}/{y}/{x}.jpg" if offline else TILE_URL
+    folium.TileLayer(tiles=tiles, attr=TILE_ATTR, **({"min_zoom": opcoes["min_zoom"], "max_zoom": opcoes["max_zoom"]} if offline else {})).add_to(mapa)
+    folium.Marker([lat, lon], popup=popup, tooltip=tooltip).add_to(mapa)
+    # O mapa só usa o Leaflet: jQuery, Bootstrap e ícones do folium ficam de fora (menos peso, nada externo)
+    mapa.default_js = [(nome, url) for nome, url in folium.Map.default_js if nome == "leaflet"]
+    mapa.default_css = [(nome, url) for nome, url in folium.Map.default_css if nome == "leaflet_css"]
+    html = mapa.get_root().render()
+    return _inline_leaflet(html) if offline else html
+
+def render_map(lat, lon, zoom=17, popup=None, tooltip=None, height=520):
+    """Mostra o mapa do site: offline quando o cache está completo, senão com tiles online."""
+    import streamlit.components.v1 as components
+    offline = is_cached(lat, lon)
+    components.html(map_html(lat, lon, zoom, popup, tooltip, offline), height=height)
+    if not offline:
+        st.caption("🌐 Mapa carregado da internet. Para uso sem internet, rode `python maptiles.py` e publique static/mapa/.")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if len(sys.argv) == 3:
+        lat, lon = float(sys.argv[1]), float(sys.argv[2])
+    else:
+        from app import LAT as lat, LON as lon
+    print(f"{len(area_tiles(lat, lon))} tiles (zoom {min(MAP_ZOOMS)}-{max(MAP_ZOOMS)}, raio {MAP_RADIUS_M} m) em {MAP_DIR}")
+    print(prefetch(lat, lon))
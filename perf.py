@@ -0,0 +1,330 @@
+import streamlit as st
+import os
+import io
+import json
+import time
+import logging
+import pstats
+import cProfile
+import threading
+import functools
+from contextlib import contextmanager
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# --- INSTRUMENTAÇÃO: BYTES ENVIADOS AO NAVEGADOR E TEMPO POR SEÇÃO ---
+# Cada mensagem que o Streamlit manda para o navegador (gráfico, tabela, markdown, imagem...) passa
+# pelo contexto da sessão; medimos o tamanho de cada uma e atribuímos à seção aberta no momento.
+# Uso:
+#     perf.start_rerun()                     # início do main.py
+#     perf.step("dashboard.kpis")            # marca sequencial: fecha a etapa anterior do mesmo nível
+#     with perf.section("pagina.dashboard"): # bloco aninhado
+#         ...
+#     perf.finish_rerun()                    # fim do main.py (loga e confere o orçamento)
+# Reexecuções de st.fragment não passam pelo main.py e não são medidas.
+PAYLOAD_BUDGET_KB = float(os.environ.get("PAYLOAD_BUDGET_KB", "3072"))  # por execução completa
+SECTION_BUDGET_MS = float(os.environ.get("SECTION_BUDGET_MS", "1500"))  # por seção/etapa
+PERF_LOG = os.environ.get("PERF_LOG", "0") == "1"  # 1 = loga o resumo de toda execução (não só estouros)
+PERF_JSONL = os.environ.get("PERF_JSONL")  # Arquivo .jsonl: uma linha por execução (seções, elementos e trechos)
+PERF_PROM_FILE = os.environ.get("PERF_PROM_FILE")  # Arquivo .prom (textfile collector do Prometheus)
+
+logger = logging.getLogger("portal.perf")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(levelname)s: %(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO if PERF_LOG else logging.WARNING)
+
+def _element_type(msg):
+    """Tipo do elemento de uma ForwardMsg (plotly_chart, arrow_data_frame, markdown...)."""
+    if msg.HasField("delta"):
+        tipo = msg.delta.WhichOneof("type")
+        if tipo == "new_element":
+            return msg.delta.new_element.WhichOneof("type") or tipo
+        return tipo or "delta"
+    return msg.WhichOneof("type") or "outro"
+
+class RerunStats:
+    """Medições de uma execução do script: bytes por tipo de elemento e (ms, bytes) por seção."""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.bytes_total = 0
+        self.elementos = {}  # tipo -> [quantidade, bytes]
+        self.secoes = {}     # nome -> [ms, bytes]
+        self.ativo = True
+        self.medir_bytes = True  # False se o medidor de mensagens não pôde ser instalado (ou falhou)
+        self.trechos = {}    # trace -> [chamadas, ms]
+        self.perfil = None   # cProfile opcional desta execução
+        # Pilha de níveis: cada nível guarda a etapa (step) aberta nele
+        self._niveis = [{"passo": None}]
+
+    def record(self, msg):
+        tamanho = msg.ByteSize()
+        self.bytes_total += tamanho
+        contagem = self.elementos.setdefault(_element_type(msg), [0, 0])
+        contagem[0] += 1
+        contagem[1] += tamanho
+
+    def _abrir(self, nome):
+        return (nome, time.perf_counter(), self.bytes_total)
+
+    def _fechar(self, aberto):
+        nome, t0, b0 = aberto
+        ms = (time.perf_counter() - t0) * 1000
+        acumulado = self.secoes.setdefault(nome, [0.0, 0])
+        acumulado[0] += ms
+        acumulado[1] += self.bytes_total - b0
+
+    def step(self, nome):
+        nivel = self._niveis[-1]
+        if nivel["passo"] is not None:
+            self._fechar(nivel["passo"])
+        nivel["passo"] = self._abrir(nome)
+
+    def push(self, nome):
+        self._niveis.append({"passo": None, "secao": self._abrir(nome)})
+
+    def pop(self):
+        nivel = self._niveis.pop()
+        if nivel["passo"] is not None:
+            self._fechar(nivel["passo"])
+        self._fechar(nivel["secao"])
+
+    def finish(self):
+        while len(self._niveis) > 1:
+            self.pop()
+        if self._niveis[0]["passo"] is not None:
+            self._fechar(self._niveis[0]["passo"])
+            self._niveis[0]["passo"] = None
+        self.ativo = False
+        self.total_ms = (time.perf_counter() - self.inicio) * 1000
+
+    def alerts(self):
+        """Estouros do orçamento (payload total e tempo por seção)."""
+        alertas = []
+        if self.bytes_total / 1024 > PAYLOAD_BUDGET_KB:
+            alertas.append(f"payload {self.bytes_total / 1024:,.0f} KB > orçamento {PAYLOAD_BUDGET_KB:,.0f} KB")
+        for nome, (ms, _) in self.secoes.items():
+            if ms > SECTION_BUDGET_MS:
+                alertas.append(f"seção {nome} {ms:,.0f} ms > orçamento {SECTION_BUDGET_MS:,.0f} ms")
+        return alertas
+
+    def summary(self):
+        return {
+            "total_ms": round(self.total_ms, 1),
+            "kb": round(self.bytes_total / 1024, 1),
+            "bytes_medidos": self.medir_bytes,
+            "elementos": {k: {"qtd": q, "kb": round(b / 1024, 1)} for k, (q, b) in sorted(self.elementos.items(), key=lambda i: -i[1][1])},
+            "secoes": {k: {"ms": round(ms, 1), "kb": round(b / 1024, 1)} for k, (ms, b) in self.secoes.items()},
+            "trechos": {k: {"n": n, "ms": round(ms, 1)} for k, (n, ms) in sorted(self.trechos.items(), key=lambda i: -i[1][1])},
+            "alertas": self.alerts(),
+        }
+
+def _current():
+    ctx = get_script_run_ctx()
+    stats = getattr(ctx, "_portal_perf_stats", None) if ctx is not None else None
+    return stats if stats is not None and stats.ativo else None
+
+# --- RASTREAMENTO DE TRECHOS (trace) ---
+# Mede trechos quentes (carga, limpeza, filtros, agregações, figuras, gravação) em qualquer thread.
+# Acumula no processo (exportável como Prometheus) e, no script, também na execução atual.
+#     with perf.trace("dashboard.filtro"): ...
+#     @perf.traced("utils.load_data_from_github")
+class _Metricas:
+    """Contagem, tempo total e máximo por trecho, acumulados no processo."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.dados = {}  # nome -> [chamadas, segundos, máximo]
+
+    def add(self, nome, segundos):
+        with self.lock:
+            m = self.dados.setdefault(nome, [0, 0.0, 0.0])
+            m[0] += 1
+            m[1] += segundos
+            m[2] = max(m[2], segundos)
+
+    def snapshot(self):
+        with self.lock:
+            return {k: list(v) for k, v in self.dados.items()}
+
+METRICAS = _Metricas()
+
+@contextmanager
+def trace(nome):
+    """Mede o bloco como o trecho `nome`."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        segundos = time.perf_counter() - inicio
+        METRICAS.add(nome, segundos)
+        stats = _current()
+        if stats is not None:
+            t = stats.trechos.setdefault(nome, [0, 0.0])
+            t[0] += 1
+            t[1] += segundos * 1000
+
+def traced(nome=None):
+    """Decorador: mede cada chamada da função (nome padrão: modulo.funcao)."""
+    def decorador(func):
+        rotulo = nome or f"{func.__module__}.{func.__name__}"
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with trace(rotulo):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorador
+
+def metrics_text():
+    """Métricas do processo no formato texto do Prometheus."""
+    linhas = [
+        "# HELP portal_trace_calls_total Chamadas por trecho.",
+        "# TYPE portal_trace_calls_total counter",
+    ]
+    dados = METRICAS.snapshot()
+    for nome, (n, _, _) in sorted(dados.items()):
+        linhas.append(f'portal_trace_calls_total{{trace="{nome}"}} {n}')
+    linhas += ["# HELP portal_trace_seconds_total Tempo acumulado por trecho.", "# TYPE portal_trace_seconds_total counter"]
+    for nome, (_, total, _) in sorted(dados.items()):
+        linhas.append(f'portal_trace_seconds_total{{trace="{nome}"}} {total:.6f}')
+    linhas += ["# HELP portal_trace_seconds_max Maior duração observada por trecho.", "# TYPE portal_trace_seconds_max gauge"]
+    for nome, (_, _, maximo) in sorted(dados.items()):
+        linhas.append(f'portal_trace_seconds_max{{trace="{nome}"}} {maximo:.6f}')
+    return "\n".join(linhas) + "\n"
+
+_arquivo_lock = threading.Lock()
+
+def _export(resumo):
+    """Grava o resumo em PERF_JSONL e as métricas em PERF_PROM_FILE (quando configurados)."""
+    with _arquivo_lock:
+        if PERF_JSONL:
+            with open(PERF_JSONL, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"ts": time.time(), **resumo}, ensure_ascii=False) + "\n")
+        if PERF_PROM_FILE:
+            tmp = f"{PERF_PROM_FILE}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(metrics_text())
+            os.replace(tmp, PERF_PROM_FILE)
+
+# O medidor de bytes substitui ScriptRunContext._enqueue, que é PRIVADO do Streamlit: se ele não existir
+# (ou mudar) nesta versão, a execução segue medida só em tempo; se o medidor falhar, a mensagem é enviada
+# normalmente e a contagem de bytes é desligada. O original é devolvido em finish_rerun.
+def _restore_enqueue(ctx):
+    """Devolve o _enqueue original ao contexto (sem efeito se o medidor não estiver instalado)."""
+    original = getattr(ctx, "_portal_perf_enqueue_original", None)
+    if original is not None:
+        ctx._enqueue = original
+        ctx._portal_perf_enqueue_original = None
+
+def _install_enqueue(ctx):
+    """Instala o medidor de mensagens no contexto. Retorna False se não houver onde instalá-lo."""
+    _restore_enqueue(ctx)  # sobra de uma execução interrompida antes do finish_rerun
+    if not hasattr(ctx, "_enqueue") or not callable(ctx._enqueue):
+        return False
+    enqueue_original = ctx._enqueue
+    def enqueue_medido(msg):
+        stats = getattr(ctx, "_portal_perf_stats", None)
+        if stats is not None and stats.ativo and stats.medir_bytes:
+            try:
+                stats.record(msg)
+            except Exception as e:
+                stats.medir_bytes = False
+                logger.warning("Contagem de bytes desligada nesta execução: %s", e)
+        enqueue_original(msg)
+    try:
+        ctx._enqueue = enqueue_medido
+    except (AttributeError, TypeError):
+        return False
+    ctx._portal_perf_enqueue_original = enqueue_original
+    return True
+
+def start_rerun():
+    """Começa a medir esta execução (instala o medidor de mensagens no contexto da sessão)."""
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return None
+    stats = RerunStats()
+    stats.medir_bytes = _install_enqueue(ctx)
+    ctx._portal_perf_stats = stats
+    # Perfil (cProfile) de uma única execução, pedido pelo painel de diagnóstico
+    if st.session_state.pop("_perf_perfilar", False):
+        stats.perfil = cProfile.Profile()
+        stats.perfil.enable()
+    return stats
+
+def step(nome):
+    """Fecha a etapa anterior (do mesmo nível) e abre `nome`. Sem efeito fora de uma execução medida."""
+    stats = _current()
+    if stats is not None:
+        stats.step(nome)
+
+@contextmanager
+def section(nome):
+    """Mede o bloco como uma seção; etapas (step) dentro dele ficam aninhadas."""
+    stats = _current()
+    if stats is None:
+        yield
+        return
+    stats.push(nome)
+    try:
+        yield
+    finally:
+        if stats.ativo and len(stats._niveis) > 1:
+            stats.pop()
+
+def finish_rerun():
+    """
+    Encerra a medição, loga o resumo e guarda em st.session_state['_perf_ultima'].
+    Não cria elementos na página (pode rodar depois de st.stop()/st.rerun()).
+    """
+    ctx = get_script_run_ctx()
+    if ctx is not None:
+        _restore_enqueue(ctx)
+    stats = _current()
+    if stats is None:
+        return None
+    stats.finish()
+    if stats.perfil is not None:
+        stats.perfil.disable()
+        saida = io.StringIO()
+        pstats.Stats(stats.perfil, stream=saida).sort_stats("cumulative").print_stats(40)
+        st.session_state["_perf_perfil"] = saida.getvalue()
+    resumo = stats.summary()
+    st.session_state["_perf_ultima"] = resumo
+    try:
+        _export(resumo)
+    except OSError as e:
+        logger.warning("Falha ao exportar métricas: %s", e)
+    secoes = ", ".join(f"{k} {v['ms']:.0f}ms/{v['kb']:.0f}KB" for k, v in resumo["secoes"].items())
+    logger.info("execução %.0f ms, %.1f KB enviados | %s", resumo["total_ms"], resumo["kb"], secoes)
+    for alerta in resumo["alertas"]:
+        logger.warning("orçamento excedido: %s", alerta)
+    return resumo
+
+# --- PAINEL DE DIAGNÓSTICO (ADMIN) ---
+def render_debug_panel():
+    """Expander com a execução anterior: seções, trechos, elementos, perfil e exportações."""
+    ultima = st.session_state.get("_perf_ultima")
+    with st.expander("🛠️ Diagnóstico de desempenho"):
+        if not ultima:
+            st.caption("Nenhuma execução medida ainda.")
+        else:
+            st.caption(f"Execução anterior: {ultima['total_ms']:.0f} ms, {ultima['kb']:,.0f} KB enviados")
+            if not ultima.get("bytes_medidos", True):
+                st.caption("Bytes não medidos nesta execução (medidor de mensagens indisponível).")
+            st.markdown("**Seções**")
+            st.dataframe([{"seção": k, **v} for k, v in ultima["secoes"].items()], hide_index=True, width="stretch")
+            if ultima.get("trechos"):
+                st.markdown("**Trechos (trace)**")
+                st.dataframe([{"trecho": k, **v} for k, v in ultima["trechos"].items()], hide_index=True, width="stretch")
+            st.markdown("**Elementos enviados**")
+            st.dataframe([{"elemento": k, **v} for k, v in ultima["elementos"].items()], hide_index=True, width="stretch")
+        if st.button("🔬 Perfilar próxima execução (cProfile)"):
+            st.session_state["_perf_perfilar"] = True
+            st.rerun()
+        perfil = st.session_state.get("_perf_perfil")
+        if perfil:
+            st.download_button("📥 Perfil da última captura (.txt)", perfil, file_name="perfil.txt", mime="text/plain")
+            st.code(perfil[:6000], language=None)
+        st.download_button("📥 Métricas do processo (Prometheus)", metrics_text, file_name="metrics.prom", mime="text/plain")
@@ -0,0 +1,349 @@
+import streamlit as st
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import tempfile
+import threading
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import xlsxwriter
+from fpdf import FPDF
+from pandas.api.types import is_bool_dtype, is_datetime64_any_dtype, is_integer_dtype, is_numeric_dtype
+import utils
+
+# ================= RELATÓRIO PDF DE VOOS ==================
+# Colunas da tabela: (Título, Largura em mm, Alinhamento)
+PDF_COLUNAS = [("Data", 30, "C"), ("Operador", 70, "L"), ("Tipo", 30, "C"), ("Voos", 30, "R"), ("Rotas", 30, "R")]
+PDF_LOTE = 500  # Linhas processadas por vez (evita montar o dataset inteiro em objetos Python)
+
+def _latin1(texto):
+    """O FPDF só escreve latin-1: substitui caracteres fora da tabela (ex: emojis)."""
+    return str(texto).encode("latin-1", "replace").decode("latin-1")
+
+def _fmt_int(valor):
+    return f"{int(valor):,.0f}".replace(",", ".")
+
+class RelatorioVoosPDF(FPDF):
+    """Documento com cabeçalho da tabela e rodapé repetidos em todas as páginas."""
+
+    def __init__(self, subtitulo=""):
+        super().__init__(orientation="P", unit="mm", format="A4")
+        self.subtitulo = subtitulo
+        self.alias_nb_pages()
+        self.set_auto_page_break(auto=True, margin=15)
+
+    def header(self):
+        self.set_font("Arial", "B", 14)
+        self.cell(0, 10, _latin1("Relatório de Voos - Casas Bahia"), ln=1)
+        if self.subtitulo:
+            self.set_font("Arial", "", 9)
+            self.cell(0, 6, _latin1(self.subtitulo), ln=1)
+        self.ln(2)
+        self.set_font("Arial", "B", 10)
+        self.set_fill_color(0, 82, 204)
+        self.set_text_color(255, 255, 255)
+        for titulo, largura, _ in PDF_COLUNAS:
+            self.cell(largura, 8, titulo, border=1, align="C", fill=1)
+        self.ln()
+        self.set_text_color(0, 0, 0)
+        self.set_font("Arial", "", 9)
+
+    def footer(self):
+        self.set_y(-12)
+        self.set_font("Arial", "I", 8)
+        self.cell(0, 6, _latin1(f"Desenvolvido por Clayton S. Silva  |  Página {self.page_no()}/{{nb}}"), align="C")
+
+    def linha(self, valores, negrito=False, fill=False):
+        self.set_font("Arial", "B" if negrito else "", 9)
+        if fill:
+            self.set_fill_color(230, 238, 250)
+        for (_, largura, alinhamento), valor in zip(PDF_COLUNAS, valores):
+            self.cell(largura, 7, _latin1(valor), border=1, align=alinhamento, fill=1 if fill else 0)
+        self.ln()
+
+def build_flights_pdf(df, start=None, end=None, operadores=None, path=None, batch_size=PDF_LOTE):
+    """
+    Gera o relatório PDF de voos (tabela paginada com subtotais por operador) e grava em arquivo.
+    df deve estar ordenado por Data (ver app.set_df_voos). Retorna o caminho do arquivo gerado.
+    """
+    base = utils.slice_by_date(df, start, end)
+    operador = base["Operador"].fillna("Não Informado").astype(str).str.strip()
+    if operadores:
+        mask = operador.isin(operadores)
+        base, operador = base[mask], operador[mask]
+
+    # Agrupa por operador mantendo a ordem cronológica dentro de cada grupo (ordenação estável)
+    base = base.assign(Operador=operador).sort_values("Operador", kind="mergesort")
+    subtotais = base.groupby("Operador", sort=False).agg(Registros=("Data", "size"), Voos=("Voos", "sum"), Rotas=("Rotas", "sum"))
+
+    if start is not None or end is not None:
+        inicio = pd.Timestamp(start).strftime("%d/%m/%Y") if start is not None else "início"
+        fim = pd.Timestamp(end).strftime("%d/%m/%Y") if end is not None else "hoje"
+        subtitulo = f"Período: {inicio} a {fim}  |  Registros: {len(base)}"
+    else:
+        subtitulo = f"Período: todo o histórico  |  Registros: {len(base)}"
+
+    pdf = RelatorioVoosPDF(subtitulo)
+    pdf.add_page()
+
+    atual = None
+    for pos in range(0, len(base), batch_size):
+        lote = base.iloc[pos:pos + batch_size]
+        colunas = (
+            lote["Data"].dt.strftime("%d/%m/%Y").fillna("-"),
+            lote["Operador"],
+            lote["Tipo"].fillna("").astype(str).str.strip(),
+            lote["Voos"].fillna(0),
+            lote["Rotas"].fillna(0),
+        )
+        for data, op, tipo, voos, rotas in zip(*colunas):
+            if op != atual:
+                if atual is not None:
+                    _linha_subtotal(pdf, atual, subtotais.loc[atual])
+                atual = op
+            pdf.linha([data, op, tipo, _fmt_int(voos), _fmt_int(rotas)])
+    if atual is not None:
+        _linha_subtotal(pdf, atual, subtotais.loc[atual])
+
+    pdf.ln(2)
+    pdf.linha(["TOTAL GERAL", f"{subtotais['Registros'].sum()} registros", "", _fmt_int(subtotais["Voos"].sum()), _fmt_int(subtotais["Rotas"].sum())], negrito=True, fill=True)
+
+    if path is None:
+        fd, path = tempfile.mkstemp(suffix=".pdf", prefix="relatorio_voos_")
+        os.close(fd)
+    # Grava direto no arquivo (evita a cópia extra da string completa + encode em memória)
+    pdf.output(path, "F")
+    return path
+
+def _linha_subtotal(pdf, operador, total):
+    pdf.linha(["Subtotal", operador, f"{int(total['Registros'])} registros", _fmt_int(total["Voos"]), _fmt_int(total["Rotas"])], negrito=True, fill=True)
+
+# ================= EXPORTAÇÃO EXCEL ==================
+EXCEL_LOTE = 5000  # Linhas convertidas por vez
+EXCEL_EPOCH = pd.Timestamp("1899-12-30")  # Dia zero do calendário do Excel
+
+def _excel_column_kind(df, col):
+    """Classifica a coluna: ('data' | 'pct' | 'int' | 'num' | 'texto')."""
+    serie = df[col]
+    if is_datetime64_any_dtype(serie):
+        return "data"
+    if is_bool_dtype(serie) or not is_numeric_dtype(serie):
+        return "texto"
+    if "%" in str(col) or "PCT" in str(col).upper():
+        return "pct"
+    if is_integer_dtype(serie):
+        return "int"
+    valores = serie.to_numpy(dtype="float64", na_value=np.nan)
+    valores = valores[~np.isnan(valores)]
+    return "int" if np.array_equal(valores, np.round(valores)) else "num"
+
+def _excel_batch_values(lote, kind):
+    """Converte uma coluna do lote para lista Python (None = célula vazia)."""
+    if kind == "data":
+        # Datas viram número de série do Excel (vetorizado), formatadas pela coluna
+        serie = (lote - EXCEL_EPOCH) / pd.Timedelta(days=1)
+        valores = serie.to_numpy(dtype="float64", na_value=np.nan)
+    elif kind != "texto":
+        valores = lote.to_numpy(dtype="float64", na_value=np.nan)
+    else:
+        return [None if pd.isna(v) else str(v) for v in lote.tolist()]
+    return [None if v != v else v for v in valores.tolist()]
+
+def export_excel(df, path, sheet_name="Relatorio"):
+    """
+    Grava o DataFrame em .xlsx usando o XlsxWriter em modo de memória constante:
+    cada linha vai direto para o disco e os formatos (data, inteiro, %) são definidos por coluna.
+    """
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+    ws = workbook.add_worksheet(sheet_name)
+    formatos = {
+        "data": workbook.add_format({"num_format": "dd/mm/yyyy"}),
+        "int": workbook.add_format({"num_format": "#,##0"}),
+        "num": workbook.add_format({"num_format": "#,##0.00"}),
+        "pct": workbook.add_format({"num_format": '0.00"%"'}),
+        "texto": None,
+    }
+    cabecalho = workbook.add_format({"bold": True, "font_color": "#FFFFFF", "bg_color": "#0052CC"})
+
+    colunas = list(df.columns)
+    tipos = [_excel_column_kind(df, c) for c in colunas]
+    escritores = [ws.write_string if t == "texto" else ws.write_number for t in tipos]
+    fmts = [formatos[t] for t in tipos]
+
+    for j, (col, tipo) in enumerate(zip(colunas, tipos)):
+        ws.set_column(j, j, max(12, min(len(str(col)) + 4, 40)), formatos[tipo])
+        ws.write_string(0, j, str(col), cabecalho)
+
+    linha = 1
+    for pos in range(0, len(df), EXCEL_LOTE):
+        lote = df.iloc[pos:pos + EXCEL_LOTE]
+        valores = [_excel_batch_values(lote[c], t) for c, t in zip(colunas, tipos)]
+        for registro in zip(*valores):
+            for j, v in enumerate(registro):
+                if v is not None:
+                    escritores[j](linha, j, v, fmts[j])
+            linha += 1
+
+    workbook.close()
+    return path
+
+# ================= FILA DE RELATÓRIOS (SEGUNDO PLANO) ==================
+# Relatórios são gerados em threads fora do script do Streamlit e guardados em disco.
+# A chave (tipo, filtros, versão dos dados) faz com que supervisores pedindo o mesmo
+# relatório reaproveitem o mesmo arquivo em vez de gerá-lo novamente.
+REPORT_CACHE_DIR = os.environ.get("REPORT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "portal_relatorios"))
+REPORT_TTL = int(os.environ.get("REPORT_TTL", 3600))  # segundos até o arquivo expirar
+REPORT_WORKERS = 2
+REPORT_POLL_SECONDS = 2
+
+class ReportQueue:
+    """Pool de threads + registro de jobs + cache de artefatos em disco com expiração (TTL)."""
+
+    def __init__(self, cache_dir=REPORT_CACHE_DIR, ttl=REPORT_TTL, max_workers=REPORT_WORKERS):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="relatorio")
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self._ultima_limpeza = 0.0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(kind, params, data_version):
+        """Chave determinística do relatório (tipo + filtros + versão dos dados)."""
+        raw = json.dumps([kind, params, data_version], sort_keys=True, default=str)
+        return f"{kind}_{hashlib.sha1(raw.encode('utf-8')).hexdigest()[:20]}"
+
+    def path(self, key, ext):
+        return os.path.join(self.cache_dir, f"{key}{ext}")
+
+    def _fresh(self, path):
+        return os.path.exists(path) and time.time() - os.path.getmtime(path) < self.ttl
+
+    def status(self, key, ext):
+        """Retorna ('pronto', caminho), ('processando', None), ('erro', mensagem) ou (None, None)."""
+        self.evict_expired()
+        path = self.path(key, ext)
+        if self._fresh(path):
+            return "pronto", path
+        with self.lock:
+            fut = self.jobs.get(key)
+        if fut is None:
+            return None, None
+        if not fut.done():
+            return "processando", None
+        if fut.exception() is not None:
+            return "erro", str(fut.exception())
+        return None, None
+
+    def submit(self, key, ext, builder):
+        """Agenda builder(caminho) no pool. Pedidos repetidos da mesma chave não geram trabalho duplicado."""
+        path = self.path(key, ext)
+        with self.lock:
+            fut = self.jobs.get(key)
+            if self._fresh(path) or (fut is not None and not fut.done()):
+                return
+            self.jobs[key] = self.executor.submit(self._run, builder, path)
+
+    @staticmethod
+    def _run(builder, path):
+        # Grava em arquivo temporário e renomeia: quem lê nunca vê um arquivo pela metade
+        raiz, ext = os.path.splitext(path)
+        tmp = f"{raiz}.{threading.get_ident()}.tmp{ext}"
+        try:
+            builder(tmp)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return path
+
+    def evict_expired(self, force=False):
+        """Remove artefatos vencidos (no máximo uma varredura por minuto)."""
+        agora = time.time()
+        if not force and agora - self._ultima_limpeza < 60:
+            return
+        self._ultima_limpeza = agora
+        for nome in os.listdir(self.cache_dir):
+            caminho = os.path.join(self.cache_dir, nome)
+            try:
+                if agora - os.path.getmtime(caminho) >= self.ttl:
+                    os.remove(caminho)
+            except OSError:
+                pass
+        with self.lock:
+            for key in [k for k, f in self.jobs.items() if f.done()]:
+                del self.jobs[key]
+
+@st.cache_resource
+def get_report_queue():
+    """Uma fila por processo, compartilhada por todas as sessões."""
+    return ReportQueue()
+
+def _read_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+def report_panel(kind, params, data_version, ext, builder, file_name, mime,
+                 label_gerar="⚙️ Gerar Relatório", label_baixar="⬇️ Baixar", key=None):
+    """
+    Componente de relatório em segundo plano: botão para gerar, status enquanto processa
+    e botão de download quando o arquivo está pronto.
+    builder(caminho) deve gravar o arquivo e não pode chamar comandos do Streamlit.
+    """
+    fila = get_report_queue()
+    job = fila.make_key(kind, params, data_version)
+    estado, info = fila.status(job, ext)
+
+    if estado == "pronto":
+        # Leitura adiada: o arquivo só é lido quando o usuário clica em baixar
+        st.download_button(label_baixar, data=lambda: _read_bytes(info), file_name=file_name, mime=mime, key=key and f"{key}_baixar")
+    elif estado == "processando":
+        _poll_report(job, ext)
+    else:
+        if estado == "erro":
+            st.error(f"Erro ao gerar o relatório: {info}")
+        if st.button(label_gerar, key=key and f"{key}_gerar"):
+            fila.submit(job, ext, builder)
+            st.rerun()
+
+@st.fragment(run_every=REPORT_POLL_SECONDS)
+def _poll_report(job, ext):
+    # Reexecuta só este trecho a cada poucos segundos; quando o job termina, atualiza a página inteira
+    estado, _ = get_report_queue().status(job, ext)
+    if estado == "processando":
+        st.info("⏳ Gerando relatório em segundo plano... você pode continuar navegando.")
+    else:
+        st.rerun()
+
+# ================= BACKUP DO BANCO LOCAL (SQLITE) ==================
+# O backup é gerado apenas quando o usuário clica em baixar: o banco local é copiado como está, pela API
+# de backup online do SQLite (só leitura, sem reserializar a base em memória). As gravações mantêm o banco
+# atualizado; a cópia fica no cache de relatórios por versão dos dados.
+def sqlite_backup(db_path, data_version):
+    """Retorna o caminho de uma cópia do banco local (em cache por versão dos dados)."""
+    os.makedirs(REPORT_CACHE_DIR, exist_ok=True)
+    nome = os.path.splitext(os.path.basename(db_path))[0]
+    destino = os.path.join(REPORT_CACHE_DIR, f"backup_{nome}_{data_version}.db")
+    if os.path.exists(destino) and time.time() - os.path.getmtime(destino) < REPORT_TTL:
+        return destino
+
+    tmp = f"{destino}.{threading.get_ident()}.tmp"
+    try:
+        with closing(sqlite3.connect(tmp)) as copia:
+            if os.path.exists(db_path):
+                with closing(sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)) as origem:
+                    origem.backup(copia)
+        os.replace(tmp, destino)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return destino
+
+def sqlite_backup_bytes(db_path, data_version):
+    """Conteúdo do backup, para uso como `data` (callable) do st.download_button."""
+    return _read_bytes(sqlite_backup(db_path, data_version))
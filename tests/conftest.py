@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+# Os módulos do portal ficam na raiz do repositório (sem pacote instalável)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture(autouse=True)
+def _sessao_limpa():
+    """Cada teste parte de st.session_state e caches de recursos vazios."""
+    import streamlit as st
+    st.session_state.clear()
+    st.cache_resource.clear()
+    yield
+    st.session_state.clear()
+    st.cache_resource.clear()
@@ -0,0 +1,126 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+import anomalies
+
+def _dados(seed=1, dias=400):
+    """Base diária por transportadora com alguns dias de malha muito acima (ou abaixo) do habitual."""
+    rng = np.random.default_rng(seed)
+    linhas = []
+    for dia in pd.date_range("2023-01-01", periods=dias):
+        for transportadora in ("A", "B", "C"):
+            total = int(rng.integers(50, 300))
+            sorteio = rng.random()
+            p = 0.3 if sorteio < 0.02 else 0.0 if sorteio > 0.99 else 0.05
+            malha = int(rng.binomial(total, p))
+            linhas.append((dia, transportadora, "OP", total - malha, malha))
+    return pd.DataFrame(linhas, columns=["DATA", "TRANSPORTADORA", "OPERAÇÃO", "LIBERADOS", "MALHA"])
+
+def _cauda(k, n, p, alta):
+    termos = range(k, n + 1) if alta else range(0, k + 1)
+    return min(1.0, sum(math.comb(n, j) * p ** j * (1 - p) ** (n - j) for j in termos))
+
+def _anomalias_por_laco(df):
+    """Mesmas regras do motor, grupo a grupo e dia a dia, sem vetorização."""
+    a = 1 - 0.5 ** (1 / anomalies.MEIA_VIDA_DIAS)
+    diario = (df.assign(TOTAL=df["LIBERADOS"] + df["MALHA"])
+              .groupby(["DATA", "TRANSPORTADORA", "OPERAÇÃO"])[["MALHA", "TOTAL"]].sum().reset_index())
+    encontradas = []
+    for (transportadora, operacao), grupo in diario[diario["TOTAL"] > 0].groupby(["TRANSPORTADORA", "OPERAÇÃO"]):
+        media = var = malha_acum = total_acum = 0.0
+        contagem = 0
+        for dia, k, n in grupo[["DATA", "MALHA", "TOTAL"]].itertuples(index=False):
+            taxa = k / n
+            esperada = malha_acum / total_acum if total_acum > 0 else taxa
+            z = (taxa - media) / math.sqrt(var) if var > 0 else 0.0
+            if contagem >= anomalies.MIN_HISTORICO and abs(z) >= anomalies.Z_LIMITE:
+                alta = taxa > esperada
+                p_valor = _cauda(int(k), int(n), esperada, alta)
+                if p_valor < anomalies.ALPHA:
+                    encontradas.append((dia, transportadora, operacao, "alta" if alta else "baixa", p_valor))
+            if contagem == 0:
+                media, var, malha_acum, total_acum = taxa, 0.0, float(k), float(n)
+            else:
+                diff = taxa - media
+                media, var = media + a * diff, (1 - a) * (var + diff * a * diff)
+                malha_acum, total_acum = (1 - a) * malha_acum + k, (1 - a) * total_acum + n
+            contagem += 1
+    return encontradas
+
+def _motor(df):
+    motor = anomalies.AnomalyEngine()
+    assert motor.observe(df)
+    return motor
+
+def test_engine_matches_a_per_group_loop():
+    df = _dados()
+    motor = _motor(df).frame()
+    esperado = sorted(_anomalias_por_laco(df))
+    assert len(esperado) > 0
+    obtido = sorted(motor[["DATA", "TRANSPORTADORA", "OPERAÇÃO", "DIRECAO", "P_VALOR"]].itertuples(index=False, name=None))
+    assert [e[:4] for e in obtido] == [e[:4] for e in esperado]
+    np.testing.assert_allclose([e[4] for e in obtido], [e[4] for e in esperado], rtol=1e-9, atol=1e-15)
+
+def test_observing_only_new_rows_matches_a_full_pass():
+    df = _dados()
+    motor = anomalies.AnomalyEngine()
+    # Cortes por linha: vários caem no meio de um dia (linhas novas do último dia já processado)
+    cortes = [0, 100, 181, 182, 500, 700, 1000, len(df)]
+    for inicio, fim in zip(cortes[:-1], cortes[1:]):
+        assert motor.observe(df.iloc[inicio:fim])
+    pd.testing.assert_frame_equal(motor.frame(), _motor(df).frame())
+
+def test_new_row_can_make_a_zero_total_day_count():
+    df = _dados(dias=60)
+    vazio = pd.DataFrame([(pd.Timestamp("2023-03-02"), "A", "OP", 0, 0)], columns=df.columns)
+    motor = _motor(pd.concat([df, vazio], ignore_index=True))
+    extra = vazio.assign(LIBERADOS=10, MALHA=8)
+    assert motor.observe(extra)
+    pd.testing.assert_frame_equal(motor.frame(), _motor(pd.concat([df, vazio, extra], ignore_index=True)).frame())
+
+def test_rows_of_an_older_day_ask_for_a_rebuild():
+    df = _dados()
+    motor = _motor(df[df["DATA"] < "2023-12-01"])
+    anomalias = motor.frame()
+    assert not motor.observe(df.iloc[:3].assign(MALHA=99))
+    pd.testing.assert_frame_equal(motor.frame(), anomalias)
+    assert motor.observe(df[df["DATA"] >= "2023-12-01"])
+
+def test_advance_engine_processes_only_the_saved_rows():
+    df = _dados()
+    parte = df[df["DATA"] < "2023-12-01"]
+    v1 = anomalies.get_engine(parte, "v1")
+    anomalias_v1 = v1.frame()
+
+    v2 = anomalies.advance_engine("v1", "v2", df.iloc[len(parte):])   # Cópia de v1 + linhas gravadas
+    assert v2 is not v1 and anomalies.get_engine(None, "v2") is v2    # Sem reler a base
+    pd.testing.assert_frame_equal(v1.frame(), anomalias_v1)
+    pd.testing.assert_frame_equal(v2.frame(), _motor(df).frame())
+
+    # Edição de dados antigos (novos=None) ou linhas de dias já processados: v3 é montado do zero
+    editado = df.assign(MALHA=df["MALHA"].where(df.index != 5, 99))
+    assert anomalies.advance_engine("v2", "v3", None) is None
+    assert anomalies.advance_engine("v2", "v3", df.iloc[:3]) is None
+    v3 = anomalies.get_engine(editado, "v3")
+    pd.testing.assert_frame_equal(v3.frame(), _motor(editado).frame())
+    pd.testing.assert_frame_equal(v2.frame(), _motor(df).frame())
+
+def _pvalor_bilateral(k, n, p):
+    return min(1.0, 2 * min(_cauda(k, n, p, True), _cauda(k, n, p, False)))
+
+def test_binomial_pvalues_match_math_comb(monkeypatch):
+    rng = np.random.default_rng(7)
+    n = np.r_[0, 1, 1, 5, rng.integers(1, 400, 300)]
+    k = np.r_[0, 0, 1, 5, [int(rng.integers(0, m + 1)) for m in n[4:]]]
+    monkeypatch.setattr(anomalies, "SORTEIO_LOTE", 5_000)   # Força vários blocos
+    for p in (0.02, 0.1, 0.5):
+        obtido = anomalies.binomial_pvalues(k, n, p)
+        esperado = [_pvalor_bilateral(int(a), int(b), p) for a, b in zip(k, n)]
+        np.testing.assert_allclose(obtido, esperado, rtol=1e-9, atol=1e-15)
+
+def test_binomial_pvalues_degenerate_inputs():
+    assert anomalies.binomial_pvalues([], [], 0.1).tolist() == []
+    assert anomalies.binomial_pvalues([1, 3], [4, 9], 0.0).tolist() == [1.0, 1.0]
+    assert anomalies.binomial_pvalues([1, 3], [4, 9], 1.0).tolist() == [1.0, 1.0]
@@ -0,0 +1,40 @@
+import os
+import sqlite3
+from contextlib import closing
+
+import reports
+
+def _banco(caminho, linhas):
+    with closing(sqlite3.connect(caminho)) as conn, conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS voos (Data TEXT, Operador TEXT, Voos INTEGER)")
+        conn.execute("CREATE TABLE IF NOT EXISTS metas (operador TEXT, mes TEXT, meta REAL)")
+        conn.executemany("INSERT INTO voos VALUES (?, ?, ?)", linhas)
+        conn.execute("INSERT INTO metas VALUES ('ANA', '2024-01', 100)")
+
+def _tabelas(caminho):
+    with closing(sqlite3.connect(caminho)) as conn:
+        nomes = [n for (n,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name")]
+        return {n: conn.execute(f"SELECT * FROM {n}").fetchall() for n in nomes}
+
+def test_backup_copies_the_live_database_without_touching_it(tmp_path, monkeypatch):
+    monkeypatch.setattr(reports, "REPORT_CACHE_DIR", str(tmp_path / "cache"))
+    origem = str(tmp_path / "voos.db")
+    _banco(origem, [("01/01/2024", "ANA", 3), ("02/01/2024", "BRUNO", 1)])
+    antes, mtime = _tabelas(origem), os.stat(origem).st_mtime_ns
+
+    copia = reports.sqlite_backup(origem, "v1")
+
+    assert _tabelas(copia) == antes
+    assert os.stat(origem).st_mtime_ns == mtime and _tabelas(origem) == antes
+    assert not [f for f in os.listdir(tmp_path / "cache") if f.endswith(".tmp")]
+
+def test_backup_is_cached_per_data_version(tmp_path, monkeypatch):
+    monkeypatch.setattr(reports, "REPORT_CACHE_DIR", str(tmp_path / "cache"))
+    origem = str(tmp_path / "voos.db")
+    _banco(origem, [("01/01/2024", "ANA", 3)])
+    v1 = reports.sqlite_backup(origem, "v1")
+    _banco(origem, [("03/01/2024", "ANA", 5)])   # Gravação seguinte: nova versão dos dados
+
+    assert reports.sqlite_backup(origem, "v1") == v1 and len(_tabelas(v1)["voos"]) == 1
+    assert len(_tabelas(reports.sqlite_backup(origem, "v2"))["voos"]) == 2
+    assert reports.sqlite_backup_bytes(origem, "v2").startswith(b"SQLite format 3")
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import utils
+
+def _voos(seed=0, linhas=500):
+    rng = np.random.default_rng(seed)
+    datas = pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 90 * 86400, linhas), unit="s")
+    df = pd.DataFrame({"Data": datas, "Voos": rng.integers(1, 10, linhas)})
+    df.loc[rng.choice(linhas, 20, replace=False), "Data"] = pd.NaT
+    return utils.sort_by_date(df)
+
+def _mascara(df, start, end):
+    dia = df["Data"].dt.normalize()
+    mascara = dia.notna()
+    if start is not None:
+        mascara &= dia >= pd.Timestamp(start).normalize()
+    if end is not None:
+        mascara &= dia <= pd.Timestamp(end).normalize()
+    return df[mascara]
+
+def test_sort_by_date_parses_text_and_puts_missing_dates_last():
+    df = pd.DataFrame({"Data": ["03/02/2024", "", "01/02/2024", "02/02/2024"], "Voos": [3, 0, 1, 2]})
+    ordenado = utils.sort_by_date(df)
+    assert ordenado["Voos"].tolist() == [1, 2, 3, 0]
+    assert ordenado["Data"].iloc[-1] is pd.NaT
+
+@pytest.mark.parametrize("start, end", [
+    (None, None),
+    ("2024-01-01", "2024-03-30"),   # Limites exatos da base
+    ("2024-02-10", "2024-02-10"),   # Um dia: inclui as horas do dia
+    ("2024-01-20 15:00", "2024-01-25 08:00"),   # Horas nos limites contam como o dia inteiro
+    (None, "2024-01-31"),
+    ("2024-03-01", None),
+    ("2023-01-01", "2023-12-31"),   # Antes da base
+    ("2025-01-01", "2025-12-31"),   # Depois da base
+    ("2024-02-20", "2024-02-10"),   # Fim antes do início
+])
+def test_slice_by_date_matches_a_boolean_mask(start, end):
+    df = _voos()
+    recorte = utils.slice_by_date(df, start, end)
+    pd.testing.assert_frame_equal(recorte, _mascara(df, start, end))
+
+def test_slice_by_date_accepts_dates_and_other_columns():
+    df = _voos().rename(columns={"Data": "DATA"})
+    recorte = utils.slice_by_date(df, pd.Timestamp("2024-02-01").date(), pd.Timestamp("2024-02-29").date(), col="DATA")
+    esperado = _mascara(df.rename(columns={"DATA": "Data"}), "2024-02-01", "2024-02-29").rename(columns={"Data": "DATA"})
+    pd.testing.assert_frame_equal(recorte, esperado)
+
+def test_slice_by_date_empty_frame():
+    vazio = pd.DataFrame({"Data": pd.Series([], dtype="datetime64[ns]")})
+    assert utils.slice_by_date(vazio, "2024-01-01", "2024-01-31").empty
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+import app
+import utils
+
+def test_efficiency_rows_normalize_labels_and_count_active_shifts():
+    df = pd.DataFrame({
+        "Data": pd.to_datetime(["2024-01-01", "2024-01-01", "2024-01-02"]),
+        "Operador": [" ANA ", None, "BRUNO"],
+        "Tipo": ["mapeamento", None, " Inspeção"],
+        "Rotas": ["3", None, 2],
+        "Voos": [2, "x", 0],
+    })
+    linhas = app.efficiency_rows(df)
+    assert linhas["Operador"].tolist() == ["ANA", "Não Informado", "BRUNO"]
+    assert linhas["Tipo"].tolist() == ["MAPEAMENTO", "-", "INSPEÇÃO"]
+    assert linhas[["Rotas", "Voos", "Escalas", "Ativas"]].values.tolist() == [[3, 2, 1, 1], [0, 0, 1, 0], [2, 0, 1, 0]]
+
+def test_efficiency_metrics_with_zero_denominators():
+    totais = pd.DataFrame({"Rotas": [10, 4, 0, 3], "Voos": [4, 0, 0, 3], "Escalas": [5, 2, 0, 3], "Ativas": [3, 0, 0, 2]})
+    tabela = app.efficiency_metrics(totais)
+    assert tabela["Rotas_por_Voo"].tolist()[::3] == [2.5, 1.0]
+    assert tabela["Pct_Ativos"].tolist()[::3] == [60.0, 66.7]
+    assert tabela["Voos_por_Dia"].tolist()[::3] == [1.33, 1.5]
+    # Sem voos, escalas ou dias ativos a métrica fica vazia (não infinita nem zero)
+    assert tabela.loc[[1, 2], ["Rotas_por_Voo", "Voos_por_Dia"]].isna().all().all()
+    assert np.isnan(tabela.loc[2, "Pct_Ativos"]) and tabela.loc[1, "Pct_Ativos"] == 0
+    assert list(totais.columns) == ["Rotas", "Voos", "Escalas", "Ativas"]   # A tabela recebida não muda
+
+def test_efficiency_index_totals_match_a_groupby():
+    rng = np.random.default_rng(0)
+    n = 400
+    df = pd.DataFrame({
+        "Data": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 120, n), unit="D"),
+        "Operador": rng.choice(["ANA", "BRUNO"], n),
+        "Tipo": rng.choice(["A", "B"], n),
+        "Rotas": rng.integers(0, 5, n),
+        "Voos": rng.integers(0, 4, n),
+    })
+    indice = app.efficiency_index(df, utils.compute_data_version(df))
+    por_operador = indice.by_group("2024-02-01", "2024-03-31").groupby(level="Operador").sum()
+
+    linhas = app.efficiency_rows(df)
+    linhas = linhas[(linhas["Data"] >= "2024-02-01") & (linhas["Data"] <= "2024-03-31")]
+    esperado = linhas.groupby("Operador")[list(app.EFICIENCIA_COLS)].sum().astype("float64")
+    pd.testing.assert_frame_equal(por_operador, esperado, check_names=False)
+    pd.testing.assert_frame_equal(app.efficiency_metrics(por_operador), app.efficiency_metrics(esperado), check_names=False)
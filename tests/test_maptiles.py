@@ -0,0 +1,51 @@
+import math
+
+import pytest
+
+import maptiles
+
+def _tile_osm(lat, lon, z):
+    """Fórmula da wiki do OpenStreetMap (slippy map tilenames)."""
+    n = 2 ** z
+    lat_rad = math.radians(lat)
+    return int((lon + 180) / 360 * n), int((1 - math.log(math.tan(lat_rad) + 1 / math.cos(lat_rad)) / math.pi) / 2 * n)
+
+@pytest.mark.parametrize("lat, lon, z, esperado", [
+    (51.5074, -0.1278, 10, (511, 340)),     # Londres
+    (0.0, 0.0, 1, (1, 1)),
+    (0.0, 0.0, 0, (0, 0)),
+    (85.0, -180.0, 3, (0, 0)),
+    (-85.0, 179.999, 3, (7, 7)),
+    (89.9, 180.0, 4, (15, 0)),               # Fora do intervalo: fica no último tile
+])
+def test_tile_xy_known_tiles(lat, lon, z, esperado):
+    assert maptiles.tile_xy(lat, lon, z) == esperado
+
+@pytest.mark.parametrize("z", range(12, 20))
+def test_tile_xy_matches_the_osm_formula(z):
+    for lat, lon in [(-22.6238754, -43.2217511), (40.7128, -74.0060), (-33.8688, 151.2093)]:
+        assert maptiles.tile_xy(lat, lon, z) == _tile_osm(lat, lon, z)
+
+def test_area_bounds_span_the_radius():
+    (sul, oeste), (norte, leste) = maptiles.area_bounds(-22.62, -43.22, 1000)
+    assert (norte - sul) * 111_320 == pytest.approx(2000)
+    assert (leste - oeste) * 111_320 * math.cos(math.radians(-22.62)) == pytest.approx(2000)
+
+@pytest.mark.parametrize("raio_m", [50, 800, 3000])
+def test_area_tiles_cover_the_area(raio_m):
+    lat, lon = -22.6238754, -43.2217511
+    (sul, oeste), (norte, leste) = maptiles.area_bounds(lat, lon, raio_m)
+    tiles = maptiles.area_tiles(lat, lon, maptiles.MAP_ZOOMS, raio_m)
+    assert len(tiles) == len(set(tiles))
+    for z in maptiles.MAP_ZOOMS:
+        do_zoom = {(x, y) for zz, x, y in tiles if zz == z}
+        # Qualquer ponto da área (cantos, centro e uma grade) cai em um tile listado
+        for i in range(11):
+            for j in range(11):
+                ponto = (sul + (norte - sul) * i / 10, oeste + (leste - oeste) * j / 10)
+                assert maptiles.tile_xy(*ponto, z) in do_zoom
+        # E só os tiles do retângulo que contém a área
+        xs, ys = zip(*do_zoom)
+        assert len(do_zoom) == (max(xs) - min(xs) + 1) * (max(ys) - min(ys) + 1)
+        assert (min(xs), min(ys)) == maptiles.tile_xy(norte, oeste, z)
+        assert (max(xs), max(ys)) == maptiles.tile_xy(sul, leste, z)
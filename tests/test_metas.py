@@ -0,0 +1,63 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+import utils
+
+def _dias_por_laco(inicio, fim, weekmask):
+    dias, dia = 0, inicio
+    while dia <= fim:
+        dias += weekmask[dia.weekday()] == "1"
+        dia += timedelta(days=1)
+    return dias
+
+@pytest.mark.parametrize("weekmask", ["1111111", "1111100", "0000011", "1010101"])
+@pytest.mark.parametrize("inicio, fim", [
+    (date(2024, 2, 1), date(2024, 2, 29)),    # Fevereiro bissexto
+    (date(2023, 2, 1), date(2023, 2, 28)),
+    (date(2024, 12, 30), date(2025, 1, 5)),   # Virada do ano
+    (date(2024, 3, 9), date(2024, 3, 9)),     # Um sábado
+    (date(2024, 3, 10), date(2024, 3, 1)),    # Fim antes do início
+])
+def test_working_days_match_a_day_by_day_count(inicio, fim, weekmask):
+    assert app.working_days(inicio, fim, weekmask) == _dias_por_laco(inicio, fim, weekmask)
+
+def _indice(voos):
+    df = pd.DataFrame(voos, columns=["Data", "Operador", "Voos"]).assign(Data=lambda d: pd.to_datetime(d["Data"]), Rotas=0)
+    return utils.PrefixSumIndex(df, "Data", ("Operador",), ("Rotas", "Voos"))
+
+METAS = pd.DataFrame({"operador": ["ANA", "ANA", "BRUNO"], "mes": ["2024-01", "2024-03", "2024-05"], "meta": [100.0, 120.0, 80.0]})
+
+def test_goals_use_the_latest_goal_up_to_the_month():
+    metas = app.goals_for_month(METAS, ["ANA", "BRUNO", "CARLA"], "2024-04")
+    assert metas.tolist() == [120.0, app.META_PADRAO, app.META_PADRAO]
+    assert app.goals_for_month(METAS, ["ANA", "BRUNO"], "2024-05").tolist() == [120.0, 80.0]
+
+def test_monthly_progress_projects_the_current_pace():
+    # Março/2024: 21 dias úteis; até 15/03 (sexta), 11 dias úteis decorridos
+    voos = [("2024-02-29", "ANA", 50), ("2024-03-01", "ANA", 11), ("2024-03-14", "ANA", 11),
+            ("2024-03-20", "ANA", 5), ("2024-04-01", "ANA", 50), ("2024-03-05", "BRUNO", 0)]
+    tabela, dias_mes, decorridos = app.monthly_progress(_indice(voos), ["ANA", "BRUNO", "CARLA"], "2024-03", METAS,
+                                                         date(2024, 3, 15), "1111100")
+    assert (dias_mes, decorridos) == (21, 11)
+    realizado = np.array([27.0, 0.0, 0.0])   # Voos de março, inclusive os após "hoje"
+    assert tabela["Realizado"].tolist() == realizado.tolist()
+    assert tabela["Projeção"].tolist() == np.round(realizado + realizado / 11 * 10).tolist()
+    assert tabela["Meta"].tolist() == [120.0, app.META_PADRAO, app.META_PADRAO]
+    assert tabela["% da Meta"].round(6).tolist() == pytest.approx([27 / 120 * 100, 0, 0])
+
+@pytest.mark.parametrize("hoje, decorridos", [(date(2024, 2, 20), 0), (date(2024, 4, 2), 21)])
+def test_monthly_progress_before_and_after_the_month(hoje, decorridos):
+    tabela, dias_mes, n = app.monthly_progress(_indice([("2024-03-04", "ANA", 10)]), ["ANA"], "2024-03",
+                                               METAS.iloc[0:0], hoje, "1111100")
+    assert (dias_mes, n) == (21, decorridos)
+    # Sem dias decorridos não há ritmo; com o mês encerrado a projeção é o realizado
+    assert tabela["Projeção"].tolist() == [10.0]
+
+def test_monthly_progress_zero_goal():
+    metas = pd.DataFrame({"operador": ["ANA"], "mes": ["2024-03"], "meta": [0.0]})
+    tabela, _, _ = app.monthly_progress(_indice([("2024-03-04", "ANA", 10)]), ["ANA"], "2024-03", metas, date(2024, 3, 31), "1111111")
+    assert tabela["% da Meta"].tolist() == [0.0]
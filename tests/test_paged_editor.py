@@ -0,0 +1,83 @@
+import pandas as pd
+import streamlit as st
+
+import utils
+
+def _base():
+    return pd.DataFrame({
+        "Data": pd.to_datetime(["2024-01-01", "2024-01-02", "2024-01-03", "2024-01-04", "2024-01-05", "2024-01-06"]),
+        "Operador": ["ANA", "BRUNO", "ANA", "CARLA", "BRUNO", "ANA"],
+        "Voos": [1, 2, 3, 4, 5, 6],
+    }, index=[10, 11, 12, 20, 21, 22])
+
+def _dobrar(key, editor_key, rotulos, widget):
+    """Simula o on_change do st.data_editor de uma página com as alterações `widget`."""
+    st.session_state[editor_key] = widget
+    utils._fold_editor_changes(key, editor_key, rotulos)
+
+def test_changes_from_several_pages_accumulate_by_label():
+    estado = utils._editor_state("ed", "v1")
+    # Página 1 (rótulos 10, 11, 12): edita a 1ª linha, inclui uma e exclui a 3ª
+    _dobrar("ed", "ed_v1_0", [10, 11, 12], {
+        "edited_rows": {"0": {"Voos": 7}}, "added_rows": [{"Operador": "EVA", "Voos": 1}], "deleted_rows": [2]})
+    # Página 2 (rótulos 20, 21 e a linha nova no fim): edita a nova, edita 21 duas vezes, exclui 20
+    _dobrar("ed", "ed_v1_1", [20, 21, "novo-1"], {
+        "edited_rows": {"2": {"Voos": 9}, "1": {"Voos": 50}}, "added_rows": [], "deleted_rows": [0]})
+    _dobrar("ed", "ed_v1_2", [20, 21, "novo-1"], {
+        "edited_rows": {"1": {"Operador": "DIEGO"}}, "added_rows": [], "deleted_rows": []})
+
+    assert estado["edited_rows"] == {10: {"Voos": 7}, 21: {"Voos": 50, "Operador": "DIEGO"}}
+    assert estado["added_rows"] == {"novo-1": {"Operador": "EVA", "Voos": 9}}
+    assert estado["deleted_rows"] == {12, 20}
+    assert estado["geracao"] == 3
+
+def test_deleting_an_unsaved_row_drops_it_and_edits_of_deleted_rows():
+    estado = utils._editor_state("ed", "v1")
+    _dobrar("ed", "ed_v1_0", [10, 11], {"edited_rows": {"1": {"Voos": 3}}, "added_rows": [{"Voos": 1}], "deleted_rows": []})
+    _dobrar("ed", "ed_v1_1", [10, 11, "novo-1"], {"edited_rows": {}, "added_rows": [], "deleted_rows": [1, 2]})
+    assert estado["edited_rows"] == {} and estado["added_rows"] == {} and estado["deleted_rows"] == {11}
+
+def test_editor_state_restarts_with_a_new_data_version():
+    utils._editor_state("ed", "v1")["deleted_rows"].add(10)
+    assert utils._editor_state("ed", "v2")["deleted_rows"] == set()
+
+def test_apply_row_changes_matches_label_updates():
+    base = _base()
+    changes = {
+        "edited_rows": {10: {"Voos": 7}, 21: {"Operador": "DIEGO", "Data": "2024-02-01"}, 99: {"Voos": 1}},
+        "added_rows": [{"Data": "2024-03-01", "Operador": "EVA", "Voos": 8}],
+        "deleted_rows": [12, 20, 98],
+    }
+    novo, resumo = utils.apply_row_changes(base, changes)
+
+    esperado = base.drop(index=[12, 20])
+    esperado.loc[10, "Voos"] = 7
+    esperado.loc[21, ["Operador", "Data"]] = ["DIEGO", pd.Timestamp("2024-02-01")]
+    esperado.loc[23] = [pd.Timestamp("2024-03-01"), "EVA", 8]
+    pd.testing.assert_frame_equal(novo.sort_index(), esperado.sort_index())
+    assert resumo == {"editadas": 2, "novas": 1, "removidas": 2, "rejeitadas": 0}
+
+def test_apply_row_changes_runs_prepare_only_on_changed_rows():
+    vistas = []
+
+    def prepare(linhas):
+        vistas.append(sorted(map(str, linhas.index)))
+        return linhas
+
+    utils.apply_row_changes(_base(), {"edited_rows": {11: {"Voos": 0}}, "added_rows": [{"Voos": 1}], "deleted_rows": [10]}, prepare)
+    assert vistas == [["11", "23"]]
+
+def test_apply_row_changes_keeps_rows_that_prepare_rejects():
+    base = _base()
+
+    def prepare(linhas):
+        linhas["Data"] = pd.to_datetime(linhas["Data"], errors="coerce")
+        return linhas.dropna(subset=["Data"])   # Como o dashboard: DATA apagada descarta a linha
+
+    changes = {"edited_rows": {10: {"Data": None}, 11: {"Voos": 9}}, "added_rows": [{"Voos": 1}], "deleted_rows": []}
+    novo, resumo = utils.apply_row_changes(base, changes, prepare)
+
+    esperado = base.copy()
+    esperado.loc[11, "Voos"] = 9
+    pd.testing.assert_frame_equal(novo.sort_index(), esperado.sort_index())
+    assert resumo == {"editadas": 1, "novas": 0, "removidas": 0, "rejeitadas": 2}
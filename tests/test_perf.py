@@ -0,0 +1,64 @@
+from types import SimpleNamespace
+
+import pytest
+
+import perf
+
+class _Msg:
+    def __init__(self, tamanho):
+        self.tamanho = tamanho
+
+    def ByteSize(self):
+        return self.tamanho
+
+    def HasField(self, campo):
+        return False
+
+    def WhichOneof(self, campo):
+        return "markdown"
+
+@pytest.fixture
+def ctx(monkeypatch):
+    enviadas = []
+    contexto = SimpleNamespace(_enqueue=enviadas.append, enviadas=enviadas)
+    monkeypatch.setattr(perf, "get_script_run_ctx", lambda: contexto)
+    return contexto
+
+def test_conta_bytes_e_devolve_o_enqueue(ctx):
+    original = ctx._enqueue
+    stats = perf.start_rerun()
+    ctx._enqueue(_Msg(100))
+    ctx._enqueue(_Msg(24))
+    resumo = perf.finish_rerun()
+    assert ctx._enqueue is original
+    assert len(ctx.enviadas) == 2
+    assert stats.bytes_total == 124
+    assert resumo["bytes_medidos"] and resumo["elementos"]["markdown"]["qtd"] == 2
+
+def test_execucao_interrompida_nao_empilha_medidores(ctx):
+    original = ctx._enqueue
+    perf.start_rerun()  # sem finish_rerun: st.rerun()/erro antes do fim
+    stats = perf.start_rerun()
+    ctx._enqueue(_Msg(10))
+    assert stats.bytes_total == 10
+    perf.finish_rerun()
+    assert ctx._enqueue is original
+
+def test_falha_do_medidor_nao_perde_a_mensagem(ctx):
+    stats = perf.start_rerun()
+    quebrada = _Msg(10)
+    quebrada.ByteSize = lambda: 1 / 0
+    ctx._enqueue(quebrada)
+    ctx._enqueue(_Msg(10))
+    assert len(ctx.enviadas) == 2
+    assert not stats.medir_bytes and stats.bytes_total == 0
+    assert perf.finish_rerun()["bytes_medidos"] is False
+
+def test_sem_enqueue_mede_so_o_tempo(monkeypatch):
+    contexto = SimpleNamespace()
+    monkeypatch.setattr(perf, "get_script_run_ctx", lambda: contexto)
+    stats = perf.start_rerun()
+    perf.step("pagina")
+    resumo = perf.finish_rerun()
+    assert not stats.medir_bytes and not hasattr(contexto, "_enqueue")
+    assert "pagina" in resumo["secoes"]
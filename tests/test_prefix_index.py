@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import utils
+
+VALORES = ["Rotas", "Voos"]
+
+def _dados(seed=0, linhas=2000, inicio="2023-03-01", dias=500, operadores=("ANA", "BRUNO", "CARLA")):
+    rng = np.random.default_rng(seed)
+    datas = pd.Timestamp(inicio) + pd.to_timedelta(rng.integers(0, dias, linhas), unit="D")
+    return pd.DataFrame({
+        "Data": datas + pd.to_timedelta(rng.integers(0, 86400, linhas), unit="s"),  # Com hora: soma pelo dia
+        "Operador": rng.choice(list(operadores), linhas),
+        "Local": rng.choice(["Pátio", "Hangar"], linhas),
+        "Rotas": rng.integers(0, 10, linhas),
+        "Voos": rng.integers(1, 30, linhas),
+    })
+
+def _recorte(df, start, end, where=None):
+    """Linhas no intervalo [start, end] de dias (inclusivo) que atendem a where, por varredura."""
+    dia = df["Data"].dt.normalize()
+    mascara = (dia >= pd.Timestamp(start)) & (dia <= pd.Timestamp(end))
+    for col, aceitos in (where or {}).items():
+        mascara &= df[col].isin(aceitos)
+    return df[mascara]
+
+INTERVALOS = [
+    ("2023-03-01", "2024-07-13"),   # Toda a base
+    ("2023-06-10", "2023-06-10"),   # Um dia
+    ("2023-12-15", "2024-02-20"),   # Atravessa o ano
+    ("2022-01-01", "2023-03-05"),   # Começa antes da base
+    ("2024-07-01", "2025-01-01"),   # Termina depois da base
+    ("2021-01-01", "2021-12-31"),   # Fora da base
+    ("2024-01-10", "2024-01-01"),   # Vazio (fim antes do início)
+]
+
+@pytest.mark.parametrize("start, end", INTERVALOS)
+@pytest.mark.parametrize("where", [None, {"Operador": ["ANA"]}, {"Operador": ["ANA", "CARLA"], "Local": ["Hangar"]}])
+def test_total_and_by_group_match_a_scan(start, end, where):
+    df = _dados()
+    indice = utils.PrefixSumIndex(df, "Data", ["Operador", "Local"], VALORES)
+    recorte = _recorte(df, start, end, where)
+
+    total = indice.total(start, end, where)
+    assert total.tolist() == recorte[VALORES].sum().astype("float64").tolist()
+
+    por_grupo = indice.by_group(start, end, where)
+    esperado = recorte.groupby(["Operador", "Local"])[VALORES].sum()
+    por_grupo = por_grupo[(por_grupo != 0).any(axis=1)]
+    pd.testing.assert_frame_equal(por_grupo.sort_index(), esperado.astype("float64").sort_index(), check_names=False)
+
+def test_total_by_years():
+    df = _dados()
+    indice = utils.PrefixSumIndex(df, "Data", ["Operador"], VALORES)
+    esperado = _recorte(df, "2023-05-01", "2024-05-31")
+    esperado = esperado[esperado["Data"].dt.year.isin([2024])][VALORES].sum()
+    assert indice.total("2023-05-01", "2024-05-31", years=[2024]).tolist() == esperado.astype("float64").tolist()
+
+@pytest.mark.parametrize("grain", ["D", "W", "M"])
+@pytest.mark.parametrize("start, end", [("2023-03-01", "2024-07-13"), ("2023-12-13", "2024-02-07")])
+def test_series_matches_aggregate_by_grain(grain, start, end):
+    df = _dados()
+    indice = utils.PrefixSumIndex(df, "Data", ["Operador"], VALORES)
+    serie = indice.series(grain, start, end)
+
+    recorte = _recorte(df, start, end)
+    esperado = utils.aggregate_by_grain(recorte, grain, VALORES, ["Operador"])
+    # O índice devolve todos os períodos (zerados quando não há linhas); a varredura, só os que têm dados
+    serie = serie[(serie[VALORES] != 0).any(axis=1)]
+    chave = ["Operador", "Data"]
+    pd.testing.assert_frame_equal(
+        serie.sort_values(chave).reset_index(drop=True)[chave + VALORES],
+        esperado.sort_values(chave).reset_index(drop=True)[chave + VALORES].astype({c: "float64" for c in VALORES}),
+    )
+
+@pytest.mark.parametrize("novas", [
+    dict(seed=1, linhas=5, inicio="2024-07-13", dias=1),                        # Um voo no último dia
+    dict(seed=2, linhas=50, inicio="2024-07-20", dias=30),                      # Dias após o fim
+    dict(seed=3, linhas=50, inicio="2022-12-01", dias=60),                      # Dias antes do início
+    dict(seed=4, linhas=50, inicio="2023-08-01", dias=30, operadores=("DIEGO",)),  # Grupo novo
+])
+def test_add_matches_a_rebuild(novas):
+    df = _dados()
+    extra = _dados(**novas)
+    indice = utils.PrefixSumIndex(df, "Data", ["Operador", "Local"], VALORES)
+    antes = indice.acumulado.copy()
+
+    somado = indice.add(extra)
+    refeito = utils.PrefixSumIndex(pd.concat([df, extra], ignore_index=True), "Data", ["Operador", "Local"], VALORES)
+
+    assert (indice.acumulado == antes).all()  # O índice original não muda
+    for start, end in INTERVALOS + [("2022-12-01", "2024-08-31")]:
+        pd.testing.assert_frame_equal(somado.by_group(start, end).sort_index(), refeito.by_group(start, end).sort_index())
+    pd.testing.assert_frame_equal(
+        somado.series("M").sort_values(["Operador", "Local", "Data"]).reset_index(drop=True),
+        refeito.series("M").sort_values(["Operador", "Local", "Data"]).reset_index(drop=True),
+    )
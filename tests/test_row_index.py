@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import utils
+
+COLS = ["Data", "Operador", "Rotas", "Voos"]
+KEY = ["Data", "Operador"]
+
+def _base(rng, linhas=300):
+    dias = pd.date_range("2024-01-01", periods=120)
+    df = pd.DataFrame({
+        "Data": rng.choice(dias, linhas),
+        "Operador": rng.choice(["ANA", "BRUNO", "CARLA", "DIEGO", "EVA"], linhas),
+        "Rotas": rng.integers(1, 20, linhas).astype("float64"),
+        "Voos": rng.integers(1, 40, linhas).astype("float64"),
+    })
+    return df.drop_duplicates(KEY).sort_values("Data", kind="stable").reset_index(drop=True)
+
+def _novo(rng, base):
+    """Mistura linhas idênticas, chaves existentes com valores novos, chaves novas e repetidas no arquivo."""
+    iguais = base.sample(20, random_state=1)
+    alteradas = base.sample(15, random_state=2).assign(Voos=lambda d: d["Voos"] + 100)
+    novas = pd.DataFrame({
+        "Data": pd.date_range("2024-06-01", periods=10),
+        "Operador": rng.choice(["ANA", "FABIO"], 10),
+        "Rotas": 1.0, "Voos": 2.0,
+    })
+    repetida = novas.iloc[[0]].assign(Voos=99.0)  # Mesma chave duas vezes no arquivo: vale a última
+    return pd.concat([iguais, alteradas, novas, repetida], ignore_index=True)
+
+def _ordenado(df):
+    return df[COLS].sort_values(COLS).reset_index(drop=True)
+
+def test_fingerprints_normalize_like_the_base():
+    base = pd.DataFrame({"Data": pd.to_datetime(["2024-01-05 10:30"]), "Operador": ["ANA"], "Voos": [3]})
+    texto = pd.DataFrame({"Data": ["05/01/2024"], "Operador": ["  ANA "], "Voos": ["3.0"]})
+    indice = utils.RowIndex.build(base, ["Data", "Operador"], ["Data", "Operador", "Voos"])
+    chaves, linhas = indice.fingerprints(texto)
+    assert (chaves == indice.chaves).all() and (linhas == indice.linhas).all()
+
+def test_lookup_returns_last_occurrence():
+    df = pd.DataFrame({"Operador": ["ANA", "BRUNO", "ANA"], "Voos": [1, 2, 3]})
+    indice = utils.RowIndex.build(df, ["Operador"], ["Operador", "Voos"])
+    consulta = utils.row_fingerprints(pd.DataFrame({"Operador": ["ANA", "CARLA", "BRUNO"]}), ["Operador"], indice.kinds)
+    assert indice.lookup(consulta).tolist() == [2, -1, 1]
+
+def test_upsert_by_key_matches_pandas():
+    rng = np.random.default_rng(0)
+    base = _base(rng)
+    novo = _novo(rng, base)
+    st.session_state["b"] = base
+
+    combinado, indice, resumo = utils.upsert_rows("b", novo, key_cols=KEY, sort_col="Data")
+
+    esperado = pd.concat([base, novo], ignore_index=True).drop_duplicates(KEY, keep="last")
+    pd.testing.assert_frame_equal(_ordenado(combinado), _ordenado(esperado))
+    assert combinado["Data"].is_monotonic_increasing
+    ultimas = novo.drop_duplicates(KEY, keep="last")
+    novas = len(ultimas.merge(base[KEY], on=KEY, how="left", indicator=True).query("_merge == 'left_only'"))
+    atualizadas = len(ultimas) - novas - len(ultimas.merge(base, on=COLS))
+    assert resumo == {"novas": novas, "atualizadas": atualizadas, "ignoradas": len(novo) - novas - atualizadas}
+    # O índice devolvido está alinhado à nova base, como se fosse recalculado do zero
+    refeito = utils.RowIndex.build(combinado, KEY, COLS)
+    assert (indice.chaves == refeito.chaves).all() and (indice.linhas == refeito.linhas).all()
+
+def test_upsert_without_key_ignores_exact_duplicates():
+    rng = np.random.default_rng(1)
+    base = _base(rng)
+    novo = _novo(rng, base)
+    st.session_state["b"] = base
+
+    combinado, indice, resumo = utils.upsert_rows("b", novo)
+
+    esperado = pd.concat([base, novo], ignore_index=True).drop_duplicates(COLS)
+    pd.testing.assert_frame_equal(_ordenado(combinado), _ordenado(esperado))
+    assert resumo["atualizadas"] == 0 and resumo["novas"] == len(esperado) - len(base)
+    refeito = utils.RowIndex.build(combinado, COLS, COLS)
+    assert (indice.linhas == refeito.linhas).all()
+
+def test_upsert_nothing_new_keeps_the_base():
+    rng = np.random.default_rng(2)
+    base = _base(rng)
+    st.session_state["b"] = base
+    combinado, _, resumo = utils.upsert_rows("b", base.sample(30, random_state=3), key_cols=KEY)
+    assert combinado is base and resumo == {"novas": 0, "atualizadas": 0, "ignoradas": 30}
@@ -0,0 +1,78 @@
+import os
+import subprocess
+import threading
+
+import pandas as pd
+import pytest
+
+import utils
+
+@pytest.mark.parametrize("conteudo", [b"", b"DATA,MALHA\n01/01/2024,3\n", os.urandom(70_000)], ids=["vazio", "csv", "binario"])
+def test_blob_sha_matches_git_hash_object(conteudo):
+    git = subprocess.run(["git", "hash-object", "--stdin"], input=conteudo, capture_output=True, check=True)
+    assert utils.blob_sha(conteudo) == git.stdout.decode().strip()
+
+def test_read_and_write_return_blob_shas(tmp_path):
+    storage = utils.LocalStorage(str(tmp_path))
+    assert storage.read("dados/voos.csv") is None
+    sha = storage.write("dados/voos.csv", b"a,b\n1,2\n", "primeira")
+    assert storage.read("dados/voos.csv") == (b"a,b\n1,2\n", sha) and sha == utils.blob_sha(b"a,b\n1,2\n")
+
+def test_stale_sha_raises_conflict(tmp_path):
+    storage = utils.LocalStorage(str(tmp_path))
+    sha = storage.write("voos.csv", b"v1", "v1")
+    storage.write("voos.csv", b"v2", "v2", sha=sha)
+    with pytest.raises(utils.StorageConflict):
+        storage.write("voos.csv", b"v3", "v3", sha=sha)   # Lido antes da v2
+    with pytest.raises(utils.StorageConflict):
+        storage.write("novo.csv", b"x", "x", sha=sha)     # SHA de um arquivo que não existe
+    assert storage.read("voos.csv")[0] == b"v2"
+    storage.write("voos.csv", b"v4", "sem sha sobrescreve")
+    assert storage.read("voos.csv")[0] == b"v4"
+
+def test_rate_limit_raises_until_the_window_resets(tmp_path, monkeypatch):
+    agora = [1_000.0]
+    monkeypatch.setattr(utils.time, "time", lambda: agora[0])
+    storage = utils.LocalStorage(str(tmp_path), rate_limit=3, rate_window=3600)
+    storage.write("voos.csv", b"v1", "v1")
+    storage.read("voos.csv")
+    storage.read("voos.csv")
+    with pytest.raises(utils.StorageRateLimited) as erro:
+        storage.read("voos.csv")
+    assert erro.value.reset_at == 1_000.0 + 3600
+    with pytest.raises(utils.StorageRateLimited):
+        storage.write("voos.csv", b"v2", "v2")
+    assert storage.calls == 5
+    agora[0] += 3600
+    assert storage.read("voos.csv")[0] == b"v1"
+
+def test_concurrent_writes_do_not_lose_updates(tmp_path):
+    storage = utils.LocalStorage(str(tmp_path), latency_ms=1)
+    storage.write("contador.txt", b"0", "início")
+    conflitos = []
+
+    def incrementar(vezes):
+        for _ in range(vezes):
+            while True:   # Como uma sessão: relê e tenta de novo após um conflito
+                conteudo, sha = storage.read("contador.txt")
+                try:
+                    storage.write("contador.txt", str(int(conteudo) + 1).encode(), "+1", sha=sha)
+                    break
+                except utils.StorageConflict:
+                    conflitos.append(1)
+
+    threads = [threading.Thread(target=incrementar, args=(10,)) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert storage.read("contador.txt")[0] == b"80"
+    assert not [f for f in os.listdir(tmp_path) if f.endswith(".tmp")]
+
+def test_load_and_save_through_the_local_backend(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "STORAGE_BACKEND", "local")
+    monkeypatch.setenv("PORTAL_STORAGE_DIR", str(tmp_path))
+    df = pd.DataFrame({"Data": ["01/01/2024", "02/01/2024"], "Voos": [1, 2]})
+    assert utils.save_data_to_github(df, utils.resolve_storage_path("file_path_drones"))
+    pd.testing.assert_frame_equal(utils.load_data_from_github("file_path_drones"), df)
+    assert os.path.exists(tmp_path / "voos.csv")
@@ -1,8 +1,218 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import io
-import plotly.express as px
-from github import Github, GithubException
+import copy
+import os
+import json
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from pandas.api.types import is_datetime64_any_dtype, is_numeric_dtype
+import perf
+
+# Dependências pesadas (PyGithub, Plotly) são importadas dentro das funções que as usam,
+# para não pesar no carregamento de páginas que não precisam delas.
+
+# --- BACKENDS DE ARMAZENAMENTO (GITHUB OU LOCAL) ---
+# As bases (CSV) são lidas e gravadas por um backend com a semântica da API de conteúdo do GitHub:
+# cada versão tem um SHA de blob e uma gravação com SHA desatualizado é recusada (conflito).
+# PORTAL_STORAGE=local troca o GitHub por um diretório local (testes de carga, benchmarks, CI sem rede),
+# com latência e limite de requisições simulados:
+#     PORTAL_STORAGE_DIR (padrão .storage), PORTAL_STORAGE_LATENCY_MS, PORTAL_STORAGE_RATE_LIMIT (req/hora)
+# Arquivos grandes: a leitura é feita em streaming (sem montar o base64 inteiro em memória) e, acima de
+# LARGE_FILE_BYTES, a gravação usa a API de blobs/árvores do git. Caminhos terminados em .gz
+# (ex.: file_path = "dados_logistica.csv.gz") são gravados e lidos comprimidos com gzip.
+STORAGE_BACKEND = os.environ.get("PORTAL_STORAGE", "github")
+LARGE_FILE_BYTES = int(os.environ.get("LARGE_FILE_BYTES", str(1024 * 1024)))  # limite do base64 na API de conteúdo
+GITHUB_API_URL = "https://api.github.com"
+STREAM_CHUNK = 1024 * 1024
+DEFAULT_STORAGE_PATHS = {"file_path": "dados_logistica.csv", "file_path_drones": "voos.csv", "file_path_metas": "metas.csv"}
+
+class StorageError(Exception):
+    """Falha de leitura/gravação no backend de armazenamento."""
+
+class StorageConflict(StorageError):
+    """O arquivo mudou desde a leitura (SHA diferente): recarregue e tente de novo."""
+
+class StorageRateLimited(StorageError):
+    """Limite de requisições atingido; `reset_at` é o horário (epoch) de liberação."""
+
+    def __init__(self, message, reset_at):
+        super().__init__(message)
+        self.reset_at = reset_at
+
+def blob_sha(content):
+    """SHA do blob no git (o mesmo que a API do GitHub devolve): sha1('blob <tamanho>\\0' + conteúdo)."""
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+class GitHubStorage:
+    """
+    Arquivos de um repositório do GitHub. Arquivos pequenos usam a API de conteúdo; os grandes
+    (acima de 1 MB a API não devolve o conteúdo) são baixados em streaming pela API de blobs
+    e gravados com blob + árvore + commit.
+    """
+
+    def __init__(self, creds):
+        from github import Github
+        self.token = creds["token"]
+        self.api_url = creds.get("api_url", GITHUB_API_URL)
+        self.repo = Github(self.token).get_repo(creds["repo"])
+        self.branch = creds.get("branch", "main")
+
+    def _contents(self, path, ref=None):
+        from github import GithubException
+        try:
+            return self.repo.get_contents(path, ref=ref or self.branch)
+        except GithubException as e:
+            if e.status == 404:
+                return None
+            raise StorageError(str(e)) from e
+
+    def _stream_blob(self, sha):
+        """Resposta HTTP com o conteúdo bruto do blob, lida aos poucos (file-like)."""
+        import requests
+        resposta = requests.get(
+            f"{self.api_url}/repos/{self.repo.full_name}/git/blobs/{sha}",
+            headers={"Authorization": f"token {self.token}", "Accept": "application/vnd.github.raw"},
+            stream=True, timeout=60,
+        )
+        if resposta.status_code != 200:
+            resposta.close()
+            raise StorageError(f"Falha ao baixar o blob {sha}: HTTP {resposta.status_code}")
+        resposta.raw.decode_content = True
+        return resposta.raw
+
+    def open(self, path):
+        """(arquivo binário para leitura, sha) ou None se o arquivo não existe. Feche o arquivo após o uso."""
+        contents = self._contents(path)
+        if contents is None:
+            return None
+        if contents.encoding == "base64" and contents.content:
+            return io.BytesIO(contents.decoded_content), contents.sha
+        return self._stream_blob(contents.sha), contents.sha
+
+    def read(self, path):
+        """(conteúdo em bytes, sha) ou None se o arquivo não existe."""
+        arquivo = self.open(path)
+        if arquivo is None:
+            return None
+        stream, sha = arquivo
+        with stream:
+            return stream.read(), sha
+
+    def _write_large(self, path, content, message, sha):
+        """Grava pela API de dados do git (blob > árvore > commit > ref), sem o limite da API de conteúdo."""
+        import base64
+        from github import InputGitTreeElement
+        ref = self.repo.get_git_ref(f"heads/{self.branch}")
+        head = self.repo.get_git_commit(ref.object.sha)
+        if sha is not None:
+            atual = self._contents(path, ref=head.sha)
+            if atual is None or atual.sha != sha:
+                raise StorageConflict(f"{path} foi alterado por outra gravação")
+        blob = self.repo.create_git_blob(base64.b64encode(content).decode("ascii"), "base64")
+        tree = self.repo.create_git_tree([InputGitTreeElement(path, "100644", "blob", sha=blob.sha)], base_tree=head.tree)
+        commit = self.repo.create_git_commit(message, tree, [head])
+        ref.edit(commit.sha)  # sem force: falha (422) se o branch avançou nesse meio tempo
+        return blob.sha
+
+    def write(self, path, content, message, sha=None):
+        """
+        Grava `content` (bytes) e devolve o novo sha. Com `sha`, só grava se o arquivo ainda estiver
+        nessa versão (StorageConflict caso contrário); sem `sha`, sobrescreve a versão atual.
+        """
+        from github import GithubException
+        try:
+            if len(content) > LARGE_FILE_BYTES:
+                return self._write_large(path, content, message, sha)
+            if sha is None:
+                atual = self._contents(path)
+                if atual is None:
+                    resultado = self.repo.create_file(path, f"Criando: {message}", content, branch=self.branch)
+                    return resultado["content"].sha
+                sha = atual.sha
+            resultado = self.repo.update_file(path, message, content, sha, branch=self.branch)
+            return resultado["content"].sha
+        except GithubException as e:
+            if e.status in (409, 422):
+                raise StorageConflict(f"{path} foi alterado por outra gravação") from e
+            if e.status in (403, 429) and e.headers and e.headers.get("x-ratelimit-remaining") == "0":
+                raise StorageRateLimited("Limite da API do GitHub atingido", float(e.headers.get("x-ratelimit-reset", 0))) from e
+            raise StorageError(str(e)) from e
+
+class LocalStorage:
+    """
+    Substituto local do GitHub: mesmos SHAs e conflitos, com latência e limite de requisições
+    simulados. Seguro entre threads (várias sessões gravando ao mesmo tempo).
+    """
+
+    def __init__(self, root, latency_ms=0, rate_limit=0, rate_window=3600):
+        self.root = root
+        self.latency = latency_ms / 1000
+        self.rate_limit = rate_limit    # requisições por janela (0 = sem limite)
+        self.rate_window = rate_window  # segundos
+        self.lock = threading.Lock()
+        self.calls = 0
+        self._janela = (time.time(), 0)  # (início da janela, requisições nela)
+
+    def _request(self):
+        with self.lock:
+            self.calls += 1
+            if self.rate_limit:
+                inicio, usadas = self._janela
+                agora = time.time()
+                if agora - inicio >= self.rate_window:
+                    inicio, usadas = agora, 0
+                if usadas >= self.rate_limit:
+                    raise StorageRateLimited("Limite de requisições do armazenamento local atingido", inicio + self.rate_window)
+                self._janela = (inicio, usadas + 1)
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _file(self, path):
+        return os.path.join(self.root, path.lstrip("/"))
+
+    def _read(self, path):
+        try:
+            with open(self._file(path), "rb") as f:
+                content = f.read()
+        except FileNotFoundError:
+            return None
+        return content, blob_sha(content)
+
+    def read(self, path):
+        self._request()
+        return self._read(path)
+
+    def open(self, path):
+        self._request()
+        destino = self._file(path)
+        try:
+            f = open(destino, "rb")
+        except FileNotFoundError:
+            return None
+        # Mesmo descritor para o hash e para a leitura: uma gravação concorrente (os.replace) não o afeta
+        h = hashlib.sha1(b"blob %d\0" % os.fstat(f.fileno()).st_size)
+        for bloco in iter(lambda: f.read(STREAM_CHUNK), b""):
+            h.update(bloco)
+        f.seek(0)
+        return f, h.hexdigest()
+
+    def write(self, path, content, message, sha=None):
+        self._request()
+        destino = self._file(path)
+        with self.lock:
+            atual = self._read(path)
+            if sha is not None and (atual is None or atual[1] != sha):
+                raise StorageConflict(f"{path} foi alterado por outra gravação")
+            os.makedirs(os.path.dirname(destino) or ".", exist_ok=True)
+            tmp = f"{destino}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(content)
+            os.replace(tmp, destino)
+        return blob_sha(content)
 
 def get_github_connection():
     """Verifica se existem credenciais do GitHub configuradas."""
@@ -13,62 +223,682 @@ def get_github_connection():
         return None
     return None
 
-def load_data_from_github(file_path_key="file_path"):
+@st.cache_resource
+def _create_storage(backend, creds_key):
+    if backend == "local":
+        return LocalStorage(
+            os.environ.get("PORTAL_STORAGE_DIR", ".storage"),
+            latency_ms=float(os.environ.get("PORTAL_STORAGE_LATENCY_MS", "0")),
+            rate_limit=int(os.environ.get("PORTAL_STORAGE_RATE_LIMIT", "0")),
+        )
+    return GitHubStorage(dict(creds_key))
+
+def get_storage():
+    """Backend configurado (uma conexão por processo) ou None se não houver GitHub nem PORTAL_STORAGE=local."""
+    if STORAGE_BACKEND == "local":
+        return _create_storage("local", ())
+    creds = get_github_connection()
+    if not creds:
+        return None
+    return _create_storage("github", tuple(sorted(creds.items())))
+
+def resolve_storage_path(file_path_key="file_path"):
     """
-    Lê o arquivo CSV do repositório.
+    Caminho do arquivo no armazenamento.
     file_path_key: A chave dentro de st.secrets['github'] que contém o caminho do arquivo.
-                   Pode ser 'file_path' (logística) ou 'file_path_drones' (drones).
+                   Pode ser 'file_path' (logística), 'file_path_drones' (drones) ou 'file_path_metas' (metas dos drones).
+    """
+    creds = get_github_connection() or {}
+    target_path = creds.get(file_path_key)
+    if not target_path and file_path_key in ("file_path_drones", "file_path_metas"):
+        # Fallback para lógica antiga de drones se a chave específica não existir (mesma pasta da logística)
+        base_path = creds.get("file_path", "")
+        nome = DEFAULT_STORAGE_PATHS[file_path_key]
+        if "/" in base_path:
+            directory = base_path.rsplit("/", 1)[0]
+            target_path = f"{directory}/{nome}"
+        else:
+            target_path = nome
+    elif not target_path:
+        target_path = creds.get("file_path")
+    return target_path or DEFAULT_STORAGE_PATHS.get(file_path_key, "dados.csv")
+
+@perf.traced("utils.load_data_from_github")
+def load_data_from_github(file_path_key="file_path"):
+    """
+    Lê o arquivo CSV do armazenamento (GitHub ou local, ver get_storage).
+    file_path_key: 'file_path' (logística) ou 'file_path_drones' (drones); ver resolve_storage_path.
     """
-    creds = get_github_connection()
-    if not creds: return None
-    
     try:
-        g = Github(creds["token"])
-        repo = g.get_repo(creds["repo"])
-        
-        # Resolve o caminho do arquivo
-        target_path = creds.get(file_path_key)
-        if not target_path and file_path_key == "file_path_drones":
-             # Fallback para lógica antiga de drones se a chave específica não existir
-             base_path = creds.get("file_path", "")
-             if "/" in base_path:
-                 directory = base_path.rsplit("/", 1)[0]
-                 target_path = f"{directory}/voos.csv"
-             else:
-                 target_path = "voos.csv"
-        elif not target_path:
-            target_path = creds.get("file_path")
-
-        contents = repo.get_contents(target_path, ref=creds.get("branch", "main"))
-        df = pd.read_csv(io.StringIO(contents.decoded_content.decode("utf-8")))
-        return df
+        storage = get_storage()
+        if storage is None:
+            return None
+        path = resolve_storage_path(file_path_key)
+        arquivo = storage.open(path)
+        if arquivo is None:
+            return None
+        stream, _ = arquivo
+        # O CSV é decodificado (e descomprimido) aos poucos, direto do stream
+        with stream:
+            return pd.read_csv(stream, encoding="utf-8", compression="gzip" if path.endswith(".gz") else None)
     except Exception:
         return None
 
+@perf.traced("utils.save_data_to_github")
 def save_data_to_github(df, target_path, commit_message="Atualizando dados"):
-    """Salva o DataFrame no GitHub."""
-    creds = get_github_connection()
-    if not creds: return False
-    
+    """Salva o DataFrame no armazenamento (GitHub ou local)."""
     try:
-        g = Github(creds["token"])
-        repo = g.get_repo(creds["repo"])
-        branch = creds.get("branch", "main")
-        csv_content = df.to_csv(index=False)
-        
-        try:
-            contents = repo.get_contents(target_path, ref=branch)
-            repo.update_file(contents.path, commit_message, csv_content, contents.sha, branch=branch)
-        except GithubException:
-            repo.create_file(target_path, f"Criando: {commit_message}", csv_content, branch=branch)
+        storage = get_storage()
+        if storage is None:
+            return False
+        buffer = io.BytesIO()
+        # mtime fixo: o mesmo conteúdo gera o mesmo gzip (e o mesmo SHA)
+        compressao = {"method": "gzip", "mtime": 0} if target_path.endswith(".gz") else None
+        df.to_csv(buffer, index=False, encoding="utf-8", compression=compressao)
+        storage.write(target_path, buffer.getvalue(), commit_message)
         return True
     except Exception as e:
         st.error(f"Erro ao salvar no GitHub: {e}")
         return False
 
+# --- ÍNDICE TEMPORAL (FILTROS DE DATA POR BUSCA BINÁRIA) ---
+def sort_by_date(df, col="Data"):
+    """Ordena o DataFrame pela coluna de data (estável, datas vazias no final)."""
+    if col not in df.columns:
+        return df
+    if not is_datetime64_any_dtype(df[col]):
+        df = df.copy()
+        df[col] = pd.to_datetime(df[col], dayfirst=True, errors="coerce")
+    return df.sort_values(col, kind="mergesort", na_position="last").reset_index(drop=True)
+
+def slice_by_date(df, start=None, end=None, col="Data"):
+    """
+    Recorta um DataFrame JÁ ORDENADO por `col` no intervalo [start, end] (dias inclusivos).
+    Usa busca binária sobre a coluna datetime64, evitando criar objetos `date` linha a linha.
+    """
+    if df.empty or col not in df.columns:
+        return df
+    datas = df[col]
+    i = 0 if start is None else datas.searchsorted(pd.Timestamp(start).normalize(), side="left")
+    if end is None:
+        # NaT fica no final da ordenação: corta antes dele
+        j = datas.searchsorted(pd.NaT, side="left")
+    else:
+        j = datas.searchsorted(pd.Timestamp(end).normalize() + pd.Timedelta(days=1), side="left")
+    return df.iloc[i:j]
+
+# --- GRANULARIDADE ADAPTATIVA (GRÁFICOS DE SÉRIE TEMPORAL) ---
+# Períodos longos não mandam uma barra por dia ao navegador: a granularidade sobe (dia > semana > mês...)
+# até o nº de barras (períodos x séries) caber no limite, e os rótulos por barra somem em gráficos densos.
+MAX_CHART_POINTS = int(os.environ.get("MAX_CHART_POINTS", "400"))
+MAX_LABELED_POINTS = 120
+GRAIN_LABELS = {"D": "Dia", "W": "Semana", "M": "Mês", "Q": "Trimestre", "Y": "Ano"}
+GRAIN_TICKFORMAT = {"D": "%d/%m/%Y", "W": "%d/%m/%Y", "M": "%m/%Y", "Q": "%m/%Y", "Y": "%Y"}
+
+MAX_CHART_FACETS = 12  # Painéis (facet_col) por gráfico
+
+def format_period(datas, grain):
+    """Rótulo curto do período de cada data (início do período): 15/03/2024, JAN/2024, T1/2024, 2024."""
+    if grain == "Q":
+        return "T" + datas.dt.quarter.astype(str) + "/" + datas.dt.year.astype(str)
+    formatos = {"D": "%d/%m/%Y", "W": "%d/%m/%Y", "M": "%b/%Y", "Y": "%Y"}
+    return datas.dt.strftime(formatos[grain]).str.upper()
+
+def choose_time_grain(start, end, n_series=1, grains=("D", "W", "M"), max_points=MAX_CHART_POINTS):
+    """Menor granularidade de `grains` cujo nº de barras (períodos x séries) cabe em max_points."""
+    if start is None or end is None or pd.isna(start) or pd.isna(end):
+        return grains[0]
+    for grain in grains:
+        if len(pd.period_range(start, end, freq=grain)) * max(n_series, 1) <= max_points:
+            return grain
+    return grains[-1]
+
+def aggregate_by_grain(df, grain, value_cols, group_cols=(), col="Data"):
+    """Soma `value_cols` por período (rotulado pela data de início) e por `group_cols`."""
+    periodo = df[col].dt.to_period(grain).dt.start_time.rename(col)
+    return df.groupby([periodo, *group_cols])[list(value_cols)].sum().reset_index()
+
+@perf.traced("utils.chart_series")
+def chart_series(df, value_cols, group_cols=(), col="Data", grains=("D", "W", "M"), max_points=MAX_CHART_POINTS):
+    """
+    Dados prontos para um gráfico temporal: escolhe a granularidade pelo período e pelo nº de séries
+    e agrega. Devolve (df_agregado, grain, mostrar_rotulos).
+    """
+    if df.empty:
+        return df[[col, *group_cols, *value_cols]].copy(), grains[0], True
+    n_series = df[list(group_cols)].drop_duplicates().shape[0] if group_cols else 1
+    grain = choose_time_grain(df[col].min(), df[col].max(), n_series, grains, max_points)
+    agregado = aggregate_by_grain(df, grain, value_cols, group_cols, col)
+    return agregado, grain, len(agregado) <= MAX_LABELED_POINTS
+
+# --- VERSÃO DOS DADOS (CHAVE DE CACHE) ---
+@perf.traced("utils.compute_data_version")
+def compute_data_version(df):
+    """Impressão digital do conteúdo do DataFrame: muda sempre que qualquer valor muda."""
+    h = hashlib.sha1("|".join(map(str, df.columns)).encode("utf-8"))
+    if not df.empty:
+        h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()[:16]
+
+def get_data_version(key):
+    """
+    Versão do DataFrame guardado em st.session_state[key].
+    Calculada uma única vez por objeto: qualquer alteração cria um novo DataFrame na sessão.
+    """
+    df = st.session_state.get(key)
+    if df is None:
+        return "vazio"
+    cache = st.session_state.get(f"_versao_{key}")
+    if cache is None or cache[0] is not df:
+        cache = (df, compute_data_version(df))
+        st.session_state[f"_versao_{key}"] = cache
+    return cache[1]
+
+# --- ÍNDICE DE LINHAS (DEDUPLICAÇÃO E UPSERT NA IMPORTAÇÃO) ---
+# Impressão digital (hash uint64) das colunas-chave normalizadas de cada linha, mantida junto com a base da
+# sessão. Uma importação só calcula o hash das linhas recebidas e consulta o índice; a base não é re-hasheada
+# nem deduplicada inteira. Sem key_cols, a chave é a linha inteira (duplicata exata); com key_cols, uma linha
+# com a mesma chave e outros valores substitui a existente (upsert).
+ROW_INDEX_SHARED = 16  # Índices mantidos por processo (por versão dos dados), reaproveitados entre sessões
+
+def fingerprint_kinds(df, cols):
+    """Tipo de normalização de cada coluna ("data", "numero" ou "texto"), tirado da base de referência."""
+    kinds = {}
+    for col in cols:
+        if is_datetime64_any_dtype(df[col]):
+            kinds[col] = "data"
+        elif is_numeric_dtype(df[col]) and not df[col].isna().all():
+            kinds[col] = "numero"
+        else:
+            kinds[col] = "texto"
+    return kinds
+
+def row_fingerprints(df, cols, kinds=None):
+    """
+    Hash por linha das colunas `cols` normalizadas: datas pelo dia, números como float, texto sem espaços
+    nas pontas (vazio = ""). Passe os `kinds` da base para que um arquivo novo seja normalizado do mesmo jeito.
+    """
+    kinds = kinds or fingerprint_kinds(df, cols)
+    normalizado = {}
+    for col in cols:
+        serie = df[col]
+        if kinds[col] == "data":
+            if not is_datetime64_any_dtype(serie):
+                serie = pd.to_datetime(serie, dayfirst=True, errors="coerce")
+            normalizado[col] = serie.dt.normalize().astype("datetime64[ns]")
+        elif kinds[col] == "numero":
+            normalizado[col] = pd.to_numeric(serie, errors="coerce").astype("float64")
+        else:
+            normalizado[col] = serie.astype(str).str.strip().where(serie.notna(), "")
+    return pd.util.hash_pandas_object(pd.DataFrame(normalizado, index=df.index), index=False).to_numpy()
+
+class RowIndex:
+    """Impressões digitais da chave e da linha inteira, na ordem das linhas da base."""
+
+    def __init__(self, key_cols, value_cols, kinds, chaves, linhas):
+        self.key_cols = list(key_cols)
+        self.value_cols = list(value_cols)
+        self.kinds = kinds
+        self.chaves = chaves
+        self.linhas = linhas
+        self._tabela = None
+
+    @classmethod
+    def build(cls, df, key_cols, value_cols):
+        kinds = fingerprint_kinds(df, value_cols)
+        linhas = row_fingerprints(df, value_cols, kinds)
+        chaves = linhas if list(key_cols) == list(value_cols) else row_fingerprints(df, key_cols, kinds)
+        return cls(key_cols, value_cols, kinds, chaves, linhas)
+
+    def fingerprints(self, df):
+        """(chaves, linhas) de um DataFrame novo, normalizado como a base."""
+        linhas = row_fingerprints(df, self.value_cols, self.kinds)
+        chaves = linhas if self.key_cols == self.value_cols else row_fingerprints(df, self.key_cols, self.kinds)
+        return chaves, linhas
+
+    def lookup(self, chaves):
+        """Posição na base de cada chave (-1 se não existe; chave repetida na base: a última ocorrência)."""
+        if self._tabela is None:
+            ultimas = ~pd.Index(self.chaves[::-1]).duplicated()[::-1]
+            self._tabela = (pd.Index(self.chaves[ultimas]), np.flatnonzero(ultimas))
+        tabela, posicoes = self._tabela
+        encontradas = tabela.get_indexer(chaves)
+        return np.where(encontradas >= 0, posicoes[encontradas], -1)
+
+@st.cache_resource
+def _shared_row_indexes():
+    return OrderedDict()
+
+def get_row_index(key, key_cols, value_cols):
+    """Índice da base em st.session_state[key]: um por objeto na sessão, compartilhado por versão entre sessões."""
+    df = st.session_state.get(key)
+    assinatura = (tuple(key_cols), tuple(value_cols))
+    cache = st.session_state.get(f"_indice_{key}")
+    if cache is not None and cache[0] is df and cache[1] == assinatura:
+        return cache[2]
+    compartilhados = _shared_row_indexes()
+    chave = (get_data_version(key), assinatura)
+    indice = compartilhados.get(chave)
+    if indice is None:
+        with perf.trace("utils.row_index.build"):
+            indice = RowIndex.build(df, key_cols, value_cols)
+        compartilhados[chave] = indice
+        while len(compartilhados) > ROW_INDEX_SHARED:
+            compartilhados.popitem(last=False)
+    st.session_state[f"_indice_{key}"] = (df, assinatura, indice)
+    return indice
+
+def remember_row_index(key, indice):
+    """Associa `indice` (já alinhado às linhas) à base atual em st.session_state[key], sem recalcular."""
+    st.session_state[f"_indice_{key}"] = (st.session_state[key], (tuple(indice.key_cols), tuple(indice.value_cols)), indice)
+
+@perf.traced("utils.upsert_rows")
+def upsert_rows(key, df_new, key_cols=None, sort_col=None):
+    """
+    Incorpora df_new à base st.session_state[key] consultando o índice de linhas.
+    key_cols=None: ignora linhas idênticas a alguma existente. Com key_cols: mesma chave e valores
+    diferentes substitui a linha existente. Com sort_col, a base resultante sai ordenada (estável, vazios no fim).
+    Devolve (nova base, índice alinhado a ela, {"novas": n, "atualizadas": n, "ignoradas": n}).
+    A base não é alterada: grave o resultado e chame remember_row_index(key, índice).
+    """
+    df_full = st.session_state[key]
+    value_cols = [c for c in df_new.columns if c in df_full.columns]
+    key_cols = list(key_cols) if key_cols else value_cols
+    df_new = df_new[value_cols]
+    indice = get_row_index(key, key_cols, value_cols)
+
+    novas_chaves, novas_linhas = indice.fingerprints(df_new)
+    # Repetidas dentro do próprio arquivo: vale a última
+    unicas = ~pd.Index(novas_chaves[::-1]).duplicated()[::-1]
+    posicoes = indice.lookup(novas_chaves)
+    existentes = posicoes >= 0
+    iguais = existentes & (indice.linhas[np.maximum(posicoes, 0)] == novas_linhas)
+    inserir = unicas & ~existentes
+    atualizar = unicas & existentes & ~iguais
+    resumo = {"novas": int(inserir.sum()), "atualizadas": int(atualizar.sum())}
+    resumo["ignoradas"] = len(df_new) - resumo["novas"] - resumo["atualizadas"]
+    if not (inserir.any() or atualizar.any()):
+        return df_full, indice, resumo
+
+    # Linhas atualizadas saem da base e entram de novo com os valores recebidos
+    manter = np.ones(len(df_full), dtype=bool)
+    manter[posicoes[atualizar]] = False
+    entram = inserir | atualizar
+    combinado = pd.concat([df_full[manter], df_new[entram]], ignore_index=True)
+    chaves = np.concatenate([indice.chaves[manter], novas_chaves[entram]])
+    linhas = np.concatenate([indice.linhas[manter], novas_linhas[entram]])
+    if sort_col:
+        ordem = np.argsort(combinado[sort_col].to_numpy(), kind="stable")  # NaT vai para o fim
+        combinado = combinado.iloc[ordem].reset_index(drop=True)
+        chaves, linhas = chaves[ordem], linhas[ordem]
+    return combinado, RowIndex(key_cols, value_cols, indice.kinds, chaves, linhas), resumo
+
+# --- ÍNDICE DE SOMAS ACUMULADAS (TOTAIS POR PERÍODO) ---
+# Totais diários por grupo (ex.: transportadora × operação) acumulados ao longo de um eixo contínuo de dias.
+# O total de qualquer intervalo é a diferença de duas posições do acumulado, sem varrer as linhas da base:
+# período atual, período anterior e mesmo período do ano anterior custam o mesmo.
+class PrefixSumIndex:
+    """Somas acumuladas por (grupo, dia) das colunas `value_cols`."""
+
+    def __init__(self, df, date_col, group_cols, value_cols):
+        self.date_col = date_col
+        self.group_cols = list(group_cols)
+        self.value_cols = list(value_cols)
+        self.grupos = None
+        self.inicio, self.dias = pd.Timestamp("1970-01-01"), 0
+        self.acumulado = np.zeros((0, 1, len(self.value_cols)))
+        self._accumulate(self._daily(df))
+
+    def _daily(self, df):
+        """Totais diários de df, indexados por (grupos..., dia)."""
+        datas = df[self.date_col].dt.normalize()
+        validas = datas.notna()
+        valores = df.loc[validas, self.value_cols].apply(pd.to_numeric, errors="coerce").fillna(0)
+        return valores.groupby([df.loc[validas, c] for c in self.group_cols] + [datas[validas]]).sum()
+
+    def _accumulate(self, diario):
+        """Soma totais diários ao acumulado, ampliando grupos e eixo de dias quando preciso."""
+        novos_grupos = diario.index.droplevel(-1).unique()
+        if self.grupos is None or not self.dias:
+            self.grupos = novos_grupos
+        if diario.empty:
+            return
+        dias_novos = diario.index.get_level_values(-1)
+        inicio, fim = dias_novos.min(), dias_novos.max()
+        if self.dias:
+            inicio, fim = min(inicio, self.inicio), max(fim, self.inicio + pd.Timedelta(days=self.dias - 1))
+            grupos = self.grupos.append(novos_grupos.difference(self.grupos))
+        else:
+            grupos = self.grupos
+        dias = (fim - inicio).days + 1
+        # Volta aos totais diários, soma os novos e acumula de novo: custo por grupo × dia, não por linha da base
+        diarios = np.zeros((len(grupos), dias + 1, len(self.value_cols)))
+        if self.dias:
+            desloc = (self.inicio - inicio).days
+            diarios[:len(self.grupos), desloc + 1:desloc + 1 + self.dias] = np.diff(self.acumulado, axis=1)
+        linhas = grupos.get_indexer(diario.index.droplevel(-1))
+        colunas = (dias_novos - inicio).days.to_numpy() + 1
+        np.add.at(diarios, (linhas, colunas), diario.to_numpy(dtype="float64"))
+        self.grupos, self.inicio, self.dias = grupos, inicio, dias
+        self.acumulado = diarios.cumsum(axis=1)
+
+    def add(self, df):
+        """Novo índice com as linhas de df somadas (ex.: um voo registrado), sem reler a base. O atual não muda."""
+        novo = copy.copy(self)
+        novo._accumulate(novo._daily(df))
+        return novo
+
+    def _posicao(self, data, fim=False):
+        """Posição no acumulado: soma dos dias anteriores a `data` (ou até `data`, inclusive, se fim=True)."""
+        dias = (pd.Timestamp(data).normalize() - self.inicio).days + (1 if fim else 0)
+        return min(max(dias, 0), self.dias)
+
+    def _intervalos(self, start, end, years):
+        """Intervalos [início, fim] de dias: o período, recortado pelos anos selecionados (se houver)."""
+        start = pd.Timestamp(start) if start is not None else self.inicio
+        end = pd.Timestamp(end) if end is not None else self.inicio + pd.Timedelta(days=self.dias)
+        if years is None:
+            return [(start, end)]
+        return [(max(start, pd.Timestamp(int(a), 1, 1)), min(end, pd.Timestamp(int(a), 12, 31)))
+                for a in sorted(set(map(int, years)))]
+
+    def _mascara(self, where):
+        """Grupos que atendem a where = {coluna: valores aceitos}."""
+        mascara = np.ones(len(self.grupos), dtype=bool)
+        for col, aceitos in (where or {}).items():
+            nivel = self.grupos.get_level_values(col) if self.grupos.nlevels > 1 else self.grupos
+            mascara &= np.asarray(nivel.isin(list(aceitos)))
+        return mascara
+
+    def by_group(self, start=None, end=None, where=None, years=None):
+        """Totais por grupo no intervalo [start, end] (dias inclusivos), opcionalmente só nos anos `years`."""
+        totais = np.zeros((len(self.grupos), len(self.value_cols)))
+        for inicio, fim in self._intervalos(start, end, years):
+            lo, hi = self._posicao(inicio), self._posicao(fim, fim=True)
+            if hi > lo:
+                totais += self.acumulado[:, hi] - self.acumulado[:, lo]
+        mascara = self._mascara(where)
+        return pd.DataFrame(totais[mascara], index=self.grupos[mascara], columns=self.value_cols)
+
+    def series(self, grain, start=None, end=None, where=None):
+        """
+        Totais por grupo e período (grain: "W", "M"...) no intervalo [start, end], em formato longo
+        (colunas dos grupos, date_col = início do período, value_cols). Só diferenças do acumulado.
+        """
+        start = pd.Timestamp(start).normalize() if start is not None else self.inicio
+        end = pd.Timestamp(end).normalize() if end is not None else self.inicio + pd.Timedelta(days=max(self.dias - 1, 0))
+        periodos = pd.period_range(start, end, freq=grain) if end >= start else pd.PeriodIndex([], freq=grain)
+        mascara = self._mascara(where)
+        grupos = self.grupos[mascara]
+        if not len(grupos) or not len(periodos):
+            return pd.DataFrame(columns=[*self.group_cols, self.date_col, *self.value_cols])
+        inicios = np.maximum(periodos.start_time.normalize(), start)
+        fins = np.minimum(periodos.end_time.normalize(), end)
+        lo = np.clip((inicios - self.inicio).days.to_numpy(), 0, self.dias)
+        hi = np.clip((fins - self.inicio).days.to_numpy() + 1, 0, self.dias)
+        acumulado = self.acumulado[mascara]
+        totais = acumulado[:, np.maximum(hi, lo)] - acumulado[:, lo]   # (grupos, períodos, valores)
+        chaves = grupos if grupos.nlevels > 1 else [(g,) for g in grupos]
+        indice = pd.MultiIndex.from_tuples([(*g, p) for g in chaves for p in periodos.start_time], names=[*self.group_cols, self.date_col])
+        return pd.DataFrame(totais.reshape(-1, len(self.value_cols)), index=indice, columns=self.value_cols).reset_index()
+
+    def total(self, start=None, end=None, where=None, years=None):
+        """Totais (Series por coluna) do intervalo, somados sobre os grupos que atendem a `where`."""
+        return self.by_group(start, end, where, years).sum()
+
+PREFIX_INDEX_SHARED = 8  # Índices mantidos por processo (por versão dos dados e colunas)
+
+@st.cache_resource
+def _shared_prefix_indexes():
+    return OrderedDict()
+
+def _remember_prefix_index(chave, indice):
+    compartilhados = _shared_prefix_indexes()
+    compartilhados[chave] = indice
+    compartilhados.move_to_end(chave)
+    while len(compartilhados) > PREFIX_INDEX_SHARED:
+        compartilhados.popitem(last=False)
+
+def prefix_sum_index(df, data_version, date_col, group_cols, value_cols, prepare=None):
+    """
+    Índice de somas acumuladas de df, montado uma vez por versão dos dados (e colunas) e compartilhado entre sessões.
+    prepare(df) (opcional) deriva as colunas do índice e só roda ao montar; as mesmas colunas pedem o mesmo prepare.
+    """
+    chave = (data_version, date_col, tuple(group_cols), tuple(value_cols))
+    indice = _shared_prefix_indexes().get(chave)
+    if indice is None:
+        with perf.trace("utils.prefix_sum_index.build"):
+            indice = PrefixSumIndex(prepare(df) if prepare else df, date_col, group_cols, value_cols)
+        _remember_prefix_index(chave, indice)
+    return indice
+
+def advance_prefix_index(old_version, new_version, novos, date_col, group_cols, value_cols, prepare=None):
+    """
+    Índice da nova versão = índice da anterior + linhas `novos` (inclusões, como um registro de voo).
+    Se o índice anterior não está em memória, nada é feito: a próxima leitura monta o índice completo.
+    """
+    antigo = _shared_prefix_indexes().get((old_version, date_col, tuple(group_cols), tuple(value_cols)))
+    if antigo is not None:
+        with perf.trace("utils.prefix_sum_index.add"):
+            _remember_prefix_index((new_version, date_col, tuple(group_cols), tuple(value_cols)), antigo.add(prepare(novos) if prepare else novos))
+
+# --- CACHE DE FIGURAS (GRÁFICOS PLOTLY) ---
+FIGURE_CACHE_SIZE = 256  # Figuras mantidas por processo (as menos usadas saem primeiro)
+
+class FigureCache:
+    """LRU de figuras Plotly por (gráfico, filtros/tema, versão dos dados), compartilhado entre sessões."""
+
+    def __init__(self, max_size=FIGURE_CACHE_SIZE):
+        self.max_size = max_size
+        self.figures = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(chart_id, params, data_version):
+        return json.dumps([chart_id, params, data_version], sort_keys=True, default=str)
+
+    def get(self, key):
+        with self.lock:
+            fig = self.figures.get(key)
+            if fig is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.figures.move_to_end(key)
+            return fig
+
+    def put(self, key, fig):
+        with self.lock:
+            self.figures[key] = fig
+            self.figures.move_to_end(key)
+            while len(self.figures) > self.max_size:
+                self.figures.popitem(last=False)
+
+@st.cache_resource
+def get_figure_cache():
+    """Um cache por processo."""
+    return FigureCache()
+
+def cached_figure(chart_id, params, data_version, builder):
+    """
+    Devolve a figura do gráfico `chart_id`, chamando builder() só quando a combinação
+    (params, data_version) ainda não foi montada. `params` deve conter apenas o que o gráfico usa
+    (filtros, tema...), assim um widget só invalida os gráficos que dependem dele.
+    A figura é compartilhada: não altere o objeto devolvido.
+    """
+    cache = get_figure_cache()
+    key = cache.make_key(chart_id, params, data_version)
+    fig = cache.get(key)
+    if fig is None:
+        with perf.trace(f"figura.{chart_id}"):
+            fig = builder()
+        cache.put(key, fig)
+    return fig
+
+# --- EDITOR PAGINADO (st.data_editor COM RECORTE NO SERVIDOR) ---
+# Só a página atual vai ao navegador: busca, ordenação e recorte são feitos aqui, sobre o DataFrame da sessão.
+# Cada edição é incorporada (on_change) a um change set da sessão, por rótulo do índice, e o editor é
+# recriado com a página já corrigida; assim as alterações de várias páginas/buscas se acumulam até salvar.
+EDITOR_PAGE_SIZES = (50, 100, 250, 500)
+
+def _editor_state(key, version):
+    """Change set pendente do editor `key`; recomeça quando a versão dos dados muda (ex.: após salvar)."""
+    estado = st.session_state.get(f"_{key}_alteracoes")
+    if estado is None or estado["versao"] != version:
+        estado = {"versao": version, "geracao": 0, "proximo": 1,
+                  "edited_rows": {}, "added_rows": {}, "deleted_rows": set()}
+        st.session_state[f"_{key}_alteracoes"] = estado
+    return estado
+
+def _fold_editor_changes(key, editor_key, rotulos):
+    """on_change: move as alterações do widget (posições da página) para o change set (rótulos)."""
+    estado = st.session_state[f"_{key}_alteracoes"]
+    widget = st.session_state.get(editor_key, {})
+    for pos, valores in widget.get("edited_rows", {}).items():
+        rotulo = rotulos[int(pos)]
+        if rotulo in estado["added_rows"]:
+            estado["added_rows"][rotulo].update(valores)
+        else:
+            estado["edited_rows"].setdefault(rotulo, {}).update(valores)
+    for valores in widget.get("added_rows", []):
+        estado["added_rows"][f"novo-{estado['proximo']}"] = dict(valores)
+        estado["proximo"] += 1
+    for pos in widget.get("deleted_rows", []):
+        rotulo = rotulos[int(pos)]
+        if estado["added_rows"].pop(rotulo, None) is None:
+            estado["deleted_rows"].add(rotulo)
+            estado["edited_rows"].pop(rotulo, None)
+    estado["geracao"] += 1  # novo widget, sem alterações, com a página já corrigida
+
+def _set_cells(frame, alteracoes):
+    """Aplica {rótulo: {coluna: valor}} em `frame` (valores do editor: datas ISO, números, texto)."""
+    for rotulo, valores in alteracoes.items():
+        for col, valor in valores.items():
+            if col not in frame.columns:
+                continue
+            if is_datetime64_any_dtype(frame[col]):
+                valor = pd.to_datetime(valor, errors="coerce")
+            try:
+                frame.at[rotulo, col] = valor
+            except (TypeError, ValueError):
+                frame[col] = frame[col].astype(object)
+                frame.at[rotulo, col] = valor
+
+def paged_editor(df, key, version, column_config=None, search_cols=None, page_size=100):
+    """
+    st.data_editor paginado sobre `df` (rótulos do índice únicos). Devolve o change set pendente:
+    {"edited_rows": {rótulo: {coluna: valor}}, "added_rows": [{coluna: valor}], "deleted_rows": [rótulo]}
+    (ver apply_row_changes). `version` identifica os dados: quando muda, as alterações pendentes são descartadas.
+    """
+    estado = _editor_state(key, version)
+    colunas_texto = search_cols or [c for c in df.columns if not is_datetime64_any_dtype(df[c])]
+
+    c1, c2, c3, c4 = st.columns([3, 2, 1, 1])
+    busca = c1.text_input("🔎 Buscar", key=f"{key}_busca", placeholder="Texto em qualquer coluna")
+    ordenar = c2.selectbox("Ordenar por", ["(padrão)", *df.columns], key=f"{key}_ordenar")
+    decrescente = c3.toggle("Decrescente", key=f"{key}_desc")
+    tamanho = c4.selectbox("Linhas/página", EDITOR_PAGE_SIZES, index=EDITOR_PAGE_SIZES.index(page_size) if page_size in EDITOR_PAGE_SIZES else 1, key=f"{key}_tamanho")
+
+    view = df.drop(index=list(estado["deleted_rows"]), errors="ignore")
+    if busca:
+        termo = busca.strip()
+        mask = pd.Series(False, index=view.index)
+        for col in colunas_texto:
+            mask |= view[col].astype(str).str.contains(termo, case=False, regex=False, na=False)
+        view = view[mask]
+    if ordenar != "(padrão)":
+        view = view.sort_values(ordenar, ascending=not decrescente, kind="mergesort", na_position="last")
+    elif decrescente:
+        view = view.iloc[::-1]
+
+    paginas = max(1, -(-len(view) // tamanho))
+    pagina_atual = min(st.session_state.get(f"{key}_pagina", 1), paginas)
+    pagina_atual = st.number_input(f"Página (de {paginas})", min_value=1, max_value=paginas, value=pagina_atual, step=1, key=f"{key}_pagina_{paginas}")
+    st.session_state[f"{key}_pagina"] = pagina_atual
+    pagina = view.iloc[(pagina_atual - 1) * tamanho: pagina_atual * tamanho].copy()
+
+    # Página com as alterações pendentes + linhas novas ainda não salvas (no fim de cada página)
+    _set_cells(pagina, {r: v for r, v in estado["edited_rows"].items() if r in pagina.index})
+    if estado["added_rows"]:
+        novas = pd.DataFrame.from_dict(estado["added_rows"], orient="index").reindex(columns=df.columns)
+        for col in df.columns:
+            if is_datetime64_any_dtype(df[col]):
+                novas[col] = pd.to_datetime(novas[col], errors="coerce")
+        pagina = pd.concat([pagina, novas])
+
+    editor_key = f"{key}_{version}_{estado['geracao']}"
+    # Índice posicional no navegador (exigido para incluir linhas); os rótulos vão para o callback
+    st.data_editor(
+        pagina.reset_index(drop=True),
+        num_rows="dynamic",
+        width="stretch",
+        hide_index=True,
+        key=editor_key,
+        column_config=column_config,
+        on_change=_fold_editor_changes,
+        args=(key, editor_key, list(pagina.index)),
+    )
+
+    n_editadas, n_novas, n_removidas = len(estado["edited_rows"]), len(estado["added_rows"]), len(estado["deleted_rows"])
+    st.caption(f"{len(view):,} linha(s) encontrada(s)".replace(",", ".") + f" · página {pagina_atual} de {paginas}")
+    if n_editadas or n_novas or n_removidas:
+        c_info, c_desc = st.columns([4, 1])
+        c_info.caption(f"✏️ Alterações pendentes: {n_editadas} editada(s), {n_novas} nova(s), {n_removidas} excluída(s)")
+        if c_desc.button("↩️ Descartar", key=f"{key}_descartar"):
+            st.session_state.pop(f"_{key}_alteracoes", None)
+            st.rerun()
+
+    return {
+        "edited_rows": dict(estado["edited_rows"]),
+        "added_rows": list(estado["added_rows"].values()),
+        "deleted_rows": list(estado["deleted_rows"]),
+    }
+
+def apply_row_changes(df_full, changes, prepare=None):
+    """
+    Aplica um change set por rótulo (ver paged_editor) em df_full. Só as linhas editadas e novas passam
+    por prepare(linhas) (limpeza/validação, pode descartar linhas). As novas recebem rótulos após o maior
+    existente. Uma linha editada que prepare descarta (ex.: DATA apagada) mantém o registro original; uma nova
+    é só ignorada. Devolve (nova base, {"editadas": n, "novas": n, "removidas": n, "rejeitadas": n}), contando só
+    o que foi aplicado; a ordenação fica a cargo de quem chama.
+    """
+    removidas = set(changes.get("deleted_rows", [])) & set(df_full.index)
+    editadas = {r: v for r, v in changes.get("edited_rows", {}).items() if r in df_full.index and r not in removidas and v}
+    novas = [linha for linha in changes.get("added_rows", []) if linha]
+
+    partes = []
+    if editadas:
+        linhas = df_full.loc[list(editadas)].astype(object)
+        _set_cells(linhas, editadas)
+        partes.append(linhas)
+    if novas:
+        inicio = int(df_full.index.max()) + 1 if len(df_full) else 0
+        partes.append(pd.DataFrame(novas, index=range(inicio, inicio + len(novas))).reindex(columns=df_full.columns))
+
+    alteradas = df_full.iloc[0:0]
+    if partes:
+        alteradas = pd.concat(partes)
+        if prepare is not None:
+            alteradas = prepare(alteradas)
+        for col in alteradas.columns.intersection(df_full.columns):
+            try:
+                alteradas[col] = alteradas[col].astype(df_full[col].dtype)
+            except (TypeError, ValueError):
+                pass
+
+    aplicadas = set(editadas) & set(alteradas.index)
+    novas_aplicadas = len(alteradas) - len(aplicadas)
+    base = df_full.drop(index=list(removidas | aplicadas))
+    df_novo = pd.concat([base, alteradas]) if not alteradas.empty else base
+    return df_novo, {"editadas": len(aplicadas), "novas": novas_aplicadas, "removidas": len(removidas),
+                     "rejeitadas": len(editadas) - len(aplicadas) + len(novas) - novas_aplicadas}
+
 # --- GERENCIADOR DE TEMAS E CORES (COMPARTILHADO) ---
 def get_theme_colors(theme="Padrão"):
     """Retorna a lista de cores baseada no tema escolhido."""
+    import plotly.express as px
     themes = {
         "Padrão": px.colors.qualitative.Alphabet + px.colors.qualitative.Dark24,
         "Vibrante": px.colors.qualitative.Bold + px.colors.qualitative.Prism,
@@ -0,0 +1,83 @@
+import streamlit as st
+import os
+import sys
+import time
+import threading
+import importlib
+import logging
+
+# --- PRÉ-AQUECIMENTO (WARM-UP) DO PORTAL ---
+# Executado uma vez por processo, em segundo plano, para que o primeiro usuário não pague o custo
+# de importar as páginas, baixar as bases e montar os caches.
+# Cada página expõe warmup_steps() com etapas que usam o MESMO caminho de carregamento das sessões
+# (funções em st.cache_data/st.cache_resource, com a mesma chave de versão dos dados), então o que é
+# aquecido aqui (bases, índices de somas acumuladas, motor de anomalias...) é reaproveitado por elas.
+# Uso direto, para medir uma inicialização a frio: python warmup.py
+
+PAGE_MODULES = ["dashboard", "app"]
+# Ligado por padrão. Custo: logo após a partida o processo importa todas as páginas (o main.py só as
+# carregaria sob demanda) e monta bases e índices, usando memória e CPU mesmo que ninguém abra o módulo.
+# Ganho: o primeiro acesso a cada página depois de um deploy é tão rápido quanto os demais.
+# PORTAL_WARMUP=0 desliga (ex.: máquinas com pouca memória). WARMUP_INTERVAL > 0 repete a cada N segundos.
+WARMUP_ENABLED = os.environ.get("PORTAL_WARMUP", "1") == "1"
+WARMUP_INTERVAL = int(os.environ.get("WARMUP_INTERVAL", "0"))
+
+logger = logging.getLogger("portal.warmup")
+
+def _warm_plotly():
+    """Carrega o template usado nos gráficos e passa uma figura mínima pelo serializador JSON."""
+    import plotly.express as px
+    import plotly.io as pio
+    pio.templates["plotly_white"]
+    px.bar(x=["a"], y=[1], template="plotly_white").to_json()
+
+def warm_up():
+    """Executa todas as etapas e devolve {etapa: segundos}. Falhas são registradas e não interrompem as demais."""
+    tempos = {}
+
+    def medir(nome, func):
+        inicio = time.perf_counter()
+        try:
+            func()
+        except Exception as e:
+            logger.warning("Warm-up '%s' falhou: %s", nome, e)
+        tempos[nome] = time.perf_counter() - inicio
+
+    for module_name in PAGE_MODULES:
+        medir(f"import.{module_name}", lambda m=module_name: importlib.import_module(m))
+    medir("plotly.templates", _warm_plotly)
+    for module_name in PAGE_MODULES:
+        module = sys.modules.get(module_name)
+        if module is None or not hasattr(module, "warmup_steps"):
+            continue
+        for nome, func in module.warmup_steps():
+            medir(nome, func)
+
+    logger.info("Warm-up concluído em %.2fs: %s", sum(tempos.values()),
+                ", ".join(f"{k} {v:.2f}s" for k, v in tempos.items()))
+    return tempos
+
+def _loop(estado):
+    while True:
+        estado["status"] = "executando"
+        estado["tempos"] = warm_up()
+        estado["concluido_em"] = time.time()
+        estado["status"] = "pronto"
+        if WARMUP_INTERVAL <= 0:
+            break
+        time.sleep(WARMUP_INTERVAL)
+
+@st.cache_resource
+def start_warmup():
+    """Inicia o warm-up em uma thread de fundo (uma vez por processo) e devolve o estado compartilhado."""
+    estado = {"status": "desligado" if not WARMUP_ENABLED else "agendado", "tempos": {}, "concluido_em": None}
+    if WARMUP_ENABLED:
+        threading.Thread(target=_loop, args=(estado,), name="portal-warmup", daemon=True).start()
+    return estado
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    total = time.perf_counter()
+    for etapa, segundos in warm_up().items():
+        print(f"{etapa:<24} {segundos:8.3f}s")
+    print(f"{'total':<24} {time.perf_counter() - total:8.3f}s")